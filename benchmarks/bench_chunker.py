@@ -0,0 +1,92 @@
+"""Compare the native token-boundary chunker with the langchain splitter it replaced.
+
+Usage:
+    python benchmarks/bench_chunker.py --repeat 200 --max-tokens 1000
+"""
+
+import argparse
+import os
+import time
+
+from translation_agent.chunking import split_tokenized_text
+from translation_agent.tokenizer import TokenizedText
+from translation_agent.tokenizer import get_encoding
+from translation_agent.utils import calculate_chunk_size
+
+
+SAMPLE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "examples",
+    "sample-texts",
+    "sample-long1.txt",
+)
+
+
+def bench_native(text, max_tokens):
+    start = time.perf_counter()
+    tokenized_text = TokenizedText(text)
+    chunk_size = calculate_chunk_size(len(tokenized_text), max_tokens)
+    chunks = split_tokenized_text(tokenized_text, chunk_size)
+    return time.perf_counter() - start, chunks
+
+
+def bench_langchain(text, max_tokens):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    start = time.perf_counter()
+    encoding = get_encoding()
+    chunk_size = calculate_chunk_size(len(encoding.encode(text)), max_tokens)
+    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        model_name="gpt-4",
+        chunk_size=chunk_size,
+        chunk_overlap=0,
+    )
+    chunks = text_splitter.split_text(text)
+    return time.perf_counter() - start, chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=200,
+        help="How many copies of sample-long1.txt to concatenate.",
+    )
+    parser.add_argument("--max-tokens", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(SAMPLE_PATH, encoding="utf-8") as file:
+        text = file.read() * args.repeat
+
+    get_encoding()  # load the BPE file outside the timed region
+
+    print(f"Text: {len(text):,} characters")
+    splitters = [("native", bench_native)]
+    try:
+        import langchain_text_splitters  # noqa: F401
+
+        splitters.append(("langchain", bench_langchain))
+    except ImportError:
+        print("langchain-text-splitters is not installed; skipping it")
+
+    results = {}
+    for name, bench in splitters:
+        timings = []
+        for _ in range(args.rounds):
+            elapsed, chunks = bench(text, args.max_tokens)
+            timings.append(elapsed)
+        results[name] = min(timings)
+        print(
+            f"{name:>10}: {min(timings):8.3f} s (best of {args.rounds}), "
+            f"{len(chunks)} chunks"
+        )
+
+    if "langchain" in results:
+        print(f"speedup: {results['langchain'] / results['native']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
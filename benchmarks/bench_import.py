@@ -0,0 +1,64 @@
+"""Measure how long a fresh interpreter takes to import translation_agent.
+
+Usage:
+    python benchmarks/bench_import.py --rounds 10 --max-ms 150
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+STATEMENTS = [
+    "import translation_agent",
+    "from translation_agent import translate",
+    "from translation_agent import atranslate",
+]
+
+
+def time_import(statement):
+    # No API key, as in a fresh serverless environment; importing must not need one
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], env=env, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        default=None,
+        help="Exit with an error if importing the package takes longer than this.",
+    )
+    args = parser.parse_args()
+
+    baseline = statistics.median(
+        time_import("pass") for _ in range(args.rounds)
+    )
+    print(f"{'interpreter startup':>42}: {baseline * 1000:8.1f} ms")
+
+    package_ms = None
+    for statement in STATEMENTS:
+        elapsed = statistics.median(
+            time_import(statement) for _ in range(args.rounds)
+        )
+        elapsed_ms = (elapsed - baseline) * 1000
+        if package_ms is None:
+            package_ms = elapsed_ms
+        print(f"{statement:>42}: {elapsed_ms:8.1f} ms over startup")
+
+    if args.max_ms is not None and package_ms > args.max_ms:
+        sys.exit(
+            f"import translation_agent took {package_ms:.1f} ms, "
+            f"more than {args.max_ms} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""Benchmark the chunker, the multichunk stages and translate offline against a simulated LLM.
+
+Every request goes to a FakeBackend that sleeps for a latency drawn from a distribution, plus
+the completion tokens divided by --tokens-per-second, and fails with a retryable error at
+--error-rate. Results for the same arguments are comparable across commits: save them with
+--output and pass the file to --compare on another commit.
+
+Usage:
+    python benchmarks/bench_pipeline.py --chunks 1 10 100 1000 --latency-ms 200
+    python benchmarks/bench_pipeline.py --output before.json
+    python benchmarks/bench_pipeline.py --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import time
+import tracemalloc
+
+from translation_agent.async_utils import atranslate
+from translation_agent.backends import FakeBackend
+from translation_agent.backends import use_backend
+from translation_agent.context import FullDocumentContext
+from translation_agent.context import NeighbourChunksContext
+from translation_agent.context import PrefixCachingContext
+from translation_agent.metrics import collect_metrics
+from translation_agent.ratelimit import RateLimiter
+from translation_agent.ratelimit import set_rate_limiter
+from translation_agent.tokenizer import TokenizedText
+from translation_agent.tokenizer import count_tokens
+from translation_agent.tokenizer import get_encoding
+from translation_agent.utils import multichunk_translation
+from translation_agent.utils import split_source_text
+from translation_agent.utils import translate
+
+
+SAMPLE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "examples",
+    "sample-texts",
+    "sample-long1.txt",
+)
+
+CONTEXT_POLICIES = {
+    "full": FullDocumentContext,
+    "neighbours": NeighbourChunksContext,
+    "prefix": PrefixCachingContext,
+}
+
+# The text to translate in chunk prompts, and the source text in one-chunk prompts
+_TAGGED_TEXT = re.compile(
+    r"<(TRANSLATE_THIS|SOURCE_TEXT)>\n?(.*?)\n?</\1>", re.DOTALL
+)
+
+SCENARIOS = ("chunker", "multichunk", "translate")
+METRICS = ("wall_seconds", "requests", "prompt_tokens", "peak_mib")
+
+
+def respond_with_source(messages, model):
+    """Answer with a text as long as the text to translate, like a real translation would be."""
+
+    prompt = messages[-1]["content"]
+    matches = _TAGGED_TEXT.findall(prompt)
+    if not matches:
+        return prompt
+    # The chunk to translate comes after the document context in chunk prompts
+    _tag, text = min(matches, key=lambda match: match[0] != "TRANSLATE_THIS")
+    return text
+
+
+def latency_sampler(distribution, mean, rng):
+    if distribution == "constant":
+        return mean
+    if distribution == "uniform":
+        return lambda: rng.uniform(0, 2 * mean)
+    if distribution == "exponential":
+        return lambda: rng.expovariate(1 / mean) if mean else 0.0
+    # Lognormal with the given mean and a long tail, as measured on hosted APIs
+    sigma = 0.8
+    return lambda: rng.lognormvariate(0, sigma) * mean / math.exp(sigma**2 / 2)
+
+
+def make_chunks(num_chunks, chunk_tokens):
+    with open(SAMPLE_PATH, encoding="utf-8") as file:
+        sample = file.read()
+    copies = 1 + num_chunks * chunk_tokens // count_tokens(sample)
+    chunks = split_source_text(TokenizedText(sample * copies), chunk_tokens)
+    return chunks[:num_chunks]
+
+
+def make_backend(args, seed):
+    rng = random.Random(seed)
+    return FakeBackend(
+        respond=respond_with_source,
+        latency=latency_sampler(args.latency, args.latency_ms / 1000, rng),
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        seed=seed,
+    )
+
+
+def run_scenario(scenario, chunks, args):
+    backend = make_backend(args, args.seed)
+    context_policy = CONTEXT_POLICIES[args.context]()
+    text = "".join(chunks)
+
+    def run():
+        if scenario == "chunker":
+            return len(
+                split_source_text(TokenizedText(text), args.chunk_tokens)
+            )
+        if scenario == "multichunk":
+            return len(
+                multichunk_translation(
+                    "English",
+                    "Spanish",
+                    chunks,
+                    max_workers=args.max_workers,
+                    context_policy=context_policy,
+                )
+            )
+        if args.use_async:
+            translation = asyncio.run(
+                atranslate(
+                    "English",
+                    "Spanish",
+                    text,
+                    "",
+                    max_tokens=args.chunk_tokens,
+                    max_workers=args.max_workers,
+                    context_policy=context_policy,
+                )
+            )
+        else:
+            translation = translate(
+                "English",
+                "Spanish",
+                text,
+                "",
+                max_tokens=args.chunk_tokens,
+                max_workers=args.max_workers,
+                context_policy=context_policy,
+            )
+        return len(translation)
+
+    if args.memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with use_backend(backend), collect_metrics() as collector:
+        run()
+    wall_seconds = time.perf_counter() - start
+    peak_bytes = 0
+    if args.memory:
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        "wall_seconds": wall_seconds,
+        "requests": len(backend.requests),
+        "prompt_tokens": collector.summary()["prompt_tokens"],
+        "peak_mib": peak_bytes / 2**20,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_row(scenario, num_chunks, result, baseline=None):
+    row = (
+        f"{scenario:>10} {num_chunks:>6} "
+        f"{result['wall_seconds']:10.3f} {result['requests']:9d} "
+        f"{result['prompt_tokens']:13,d} {result['peak_mib']:9.1f}"
+    )
+    if baseline is not None:
+        changes = []
+        for metric in METRICS:
+            if baseline[metric]:
+                ratio = result[metric] / baseline[metric] - 1
+                changes.append(f"{metric} {ratio:+.0%}")
+        row += "  " + ", ".join(changes)
+    print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--chunks",
+        type=int,
+        nargs="+",
+        default=[1, 10, 100, 1000],
+        help="Document sizes to run, in chunks.",
+    )
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS)
+    )
+    parser.add_argument("--chunk-tokens", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument(
+        "--latency",
+        choices=["constant", "uniform", "exponential", "lognormal"],
+        default="lognormal",
+        help="Distribution of the request latency, with --latency-ms as its mean.",
+    )
+    parser.add_argument(
+        "--tokens-per-second",
+        type=float,
+        default=None,
+        help="Simulated generation speed; by default completions take no time to generate.",
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        default=0.05,
+        help="Initial retry backoff in seconds for simulated errors.",
+    )
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument(
+        "--context", choices=sorted(CONTEXT_POLICIES), default="full"
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Run the translate scenario with atranslate.",
+    )
+    parser.add_argument(
+        "--no-memory",
+        dest="memory",
+        action="store_false",
+        help="Do not trace allocations. Peak memory is then reported as 0, and wall times "
+        "are not comparable with runs that traced them.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Save the results to a JSON file.")
+    parser.add_argument(
+        "--compare", help="Show the change from results saved with --output."
+    )
+    args = parser.parse_args()
+
+    get_encoding()  # load the BPE file outside the timed region
+    set_rate_limiter(RateLimiter(initial_backoff=args.backoff))
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            saved = json.load(file)
+        baseline = {
+            (result["scenario"], result["chunks"]): result
+            for result in saved["results"]
+        }
+        print(f"Comparing with {args.compare} ({saved['revision']})")
+
+    print(
+        f"{'scenario':>10} {'chunks':>6} {'wall (s)':>10} {'requests':>9} "
+        f"{'prompt tokens':>13} {'peak MiB':>9}"
+    )
+    results = []
+    for num_chunks in args.chunks:
+        chunks = make_chunks(num_chunks, args.chunk_tokens)
+        for scenario in args.scenarios:
+            result = run_scenario(scenario, chunks, args)
+            print_row(
+                scenario,
+                num_chunks,
+                result,
+                baseline.get((scenario, num_chunks)),
+            )
+            results.append(
+                {"scenario": scenario, "chunks": num_chunks, **result}
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "revision": git_revision(),
+                    "arguments": {
+                        key: value
+                        for key, value in vars(args).items()
+                        if key not in ("output", "compare")
+                    },
+                    "results": results,
+                },
+                file,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
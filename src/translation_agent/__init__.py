@@ -1 +1,35 @@
-from .utils import translate
+from typing import TYPE_CHECKING
+
+
+if TYPE_CHECKING:
+    from .async_utils import atranslate
+    from .async_utils import atranslate_stream
+    from .utils import translate
+    from .utils import translate_stream
+
+# Public names and the submodule defining each. Submodules are imported on first access, so that
+# importing the package stays cheap for short-lived processes.
+_LAZY_ATTRIBUTES = {
+    "atranslate": "async_utils",
+    "atranslate_stream": "async_utils",
+    "translate": "utils",
+    "translate_stream": "utils",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    import importlib
+
+    module = importlib.import_module(f".{_LAZY_ATTRIBUTES[name]}", __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,963 @@
+import asyncio
+import logging
+from contextlib import ExitStack
+from contextvars import Context
+from contextvars import copy_context
+from functools import partial
+from typing import TYPE_CHECKING
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TypeVar
+from typing import Union
+
+from .backends import Completion
+from .backends import CompletionBackend
+from .backends import cache_model_name
+from .backends import get_backend
+from .backends import use_backend
+from .context import ContextPolicy
+from .metrics import CallTimer
+from .metrics import MetricsCollector
+from .metrics import collect_metrics
+from .pipeline import ChunkPipeline
+from .ratelimit import get_rate_limiter
+from .routing import DEFAULT_MODEL
+from .routing import ModelRouter
+from .routing import record_usage
+from .tokenizer import TokenizedText
+from .tokenizer import count_tokens
+from .utils import MAX_CONCURRENT_REQUESTS
+from .utils import MAX_TOKENS_PER_CHUNK
+from .utils import chunk_improve_translation_prompt
+from .utils import chunk_initial_translation_prompt
+from .utils import chunk_reflect_on_translation_prompt
+from .utils import get_completion_cache
+from .utils import one_chunk_improve_translation_prompt
+from .utils import one_chunk_initial_translation_prompt
+from .utils import one_chunk_reflect_on_translation_prompt
+from .utils import openai_api_key
+from .utils import split_source_text
+
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    import openai
+
+    from .gates import QualityGate
+    from .glossary import Glossary
+    from .memory import TranslationMemory
+
+T = TypeVar("T")
+
+_async_client: Optional["openai.AsyncOpenAI"] = None
+
+
+def get_async_client() -> "openai.AsyncOpenAI":
+    """
+    Return the shared asynchronous OpenAI client, creating it on first use.
+
+    A single client is shared by every coroutine so that all in-flight requests reuse
+    one HTTP connection pool.
+
+    Returns:
+        openai.AsyncOpenAI: The shared client.
+    """
+
+    global _async_client
+    if _async_client is None:
+        import openai
+
+        # Retries are left to the rate limiter, which also backs off the other requests
+        _async_client = openai.AsyncOpenAI(
+            api_key=openai_api_key(), max_retries=0
+        )
+    return _async_client
+
+
+def set_async_client(client: Optional["openai.AsyncOpenAI"]) -> None:
+    """
+    Replace the shared asynchronous OpenAI client.
+
+    Args:
+        client (openai.AsyncOpenAI, optional): The client to use for all async completions.
+            Pass None to have a default client created again on next use. Create it with max_retries=0
+            unless the rate limiter is disabled, or every retry of the limiter repeats the client's own.
+    """
+
+    global _async_client
+    _async_client = client
+
+
+async def asend_request(
+    create: Callable[[], Awaitable[T]], system_message: str, prompt: str
+) -> T:
+    """Async version of utils.send_request."""
+
+    rate_limiter = get_rate_limiter()
+    if rate_limiter is None:
+        return await create()
+    return await rate_limiter.acall(
+        create, lambda: count_tokens(system_message) + count_tokens(prompt)
+    )
+
+
+async def aget_completion(
+    prompt: str,
+    system_message: str = "You are a helpful assistant.",
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.3,
+    json_mode: bool = False,
+    use_cache: bool = True,
+) -> Union[str, dict]:
+    """
+    Generate a completion asynchronously with the selected completion backend, the OpenAI API by default.
+
+    Args:
+        prompt (str): The user's prompt or query.
+        system_message (str, optional): The system message to set the context for the assistant.
+            Defaults to "You are a helpful assistant.".
+        model (str, optional): The name of the OpenAI model to use for generating the completion.
+            Defaults to "gpt-4-turbo".
+        temperature (float, optional): The sampling temperature for controlling the randomness of the generated text.
+            Defaults to 0.3.
+        json_mode (bool, optional): Whether to return the response in JSON format.
+            Defaults to False.
+        use_cache (bool, optional): Whether to consult and fill the completion cache installed with
+            utils.set_completion_cache. Defaults to True.
+
+    Returns:
+        Union[str, dict]: The generated completion.
+    """
+
+    timer = CallTimer(model)
+    backend = get_backend()
+    cache = get_completion_cache() if use_cache else None
+    if cache is not None:
+        cache_key = cache.make_key(
+            cache_model_name(backend, model),
+            temperature,
+            system_message,
+            prompt,
+            json_mode,
+        )
+        completion = cache.get(cache_key)
+        if completion is not None:
+            timer.finish(cache_hit=True)
+            return completion
+
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": prompt},
+    ]
+
+    async def create() -> Completion:
+        timer.sending()
+        return await backend.acomplete(messages, model, temperature, json_mode)
+
+    try:
+        response = await asend_request(create, system_message, prompt)
+    except Exception as error:
+        timer.finish(error=error)
+        raise
+    record_usage(response.usage)
+    timer.finish(response.usage)
+    completion = response.content
+
+    if cache is not None:
+        cache.set(cache_key, completion)
+
+    return completion
+
+
+async def aget_completion_stream(
+    prompt: str,
+    system_message: str = "You are a helpful assistant.",
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.3,
+    use_cache: bool = True,
+) -> AsyncIterator[str]:
+    """Async version of utils.get_completion_stream."""
+
+    timer = CallTimer(model)
+    backend = get_backend()
+    cache = get_completion_cache() if use_cache else None
+    if cache is not None:
+        cache_key = cache.make_key(
+            cache_model_name(backend, model),
+            temperature,
+            system_message,
+            prompt,
+            False,
+        )
+        completion = cache.get(cache_key)
+        if completion is not None:
+            timer.finish(cache_hit=True)
+            yield completion
+            return
+
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": prompt},
+    ]
+
+    async def start() -> AsyncIterator[str]:
+        timer.sending()
+        return await backend.astream(messages, model, temperature)
+
+    pieces = []
+    try:
+        deltas = await asend_request(start, system_message, prompt)
+        async for delta in deltas:
+            pieces.append(delta)
+            yield delta
+    except Exception as error:
+        timer.finish(error=error)
+        raise
+    # Backends returning a CompletionStream report the usage once it is exhausted
+    usage = getattr(deltas, "usage", None)
+    record_usage(usage)
+    timer.finish(usage)
+
+    if cache is not None:
+        cache.set(cache_key, "".join(pieces))
+
+
+async def acomplete_with_deltas(
+    prompt: str,
+    system_message: str,
+    model: str = DEFAULT_MODEL,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> str:
+    """Async version of utils.complete_with_deltas."""
+
+    if on_delta is None:
+        return await aget_completion(
+            prompt, system_message=system_message, model=model
+        )
+    pieces = []
+    async for delta in aget_completion_stream(
+        prompt, system_message=system_message, model=model
+    ):
+        pieces.append(delta)
+        on_delta(delta)
+    return "".join(pieces)
+
+
+async def gather_bounded(
+    funcs: List[Callable[[], Awaitable[T]]],
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+) -> List[T]:
+    """
+    Await a list of coroutine factories with a bounded number running at once.
+
+    Args:
+        funcs (List[Callable[[], Awaitable[T]]]): Zero-argument callables returning the awaitables to run.
+        max_workers (int, optional): The maximum number of awaitables in flight at once.
+            Defaults to MAX_CONCURRENT_REQUESTS.
+
+    Returns:
+        List[T]: The results, in the same order as the input callables.
+    """
+
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    async def run(func: Callable[[], Awaitable[T]]) -> T:
+        async with semaphore:
+            return await func()
+
+    return list(await asyncio.gather(*(run(func) for func in funcs)))
+
+
+async def aone_chunk_initial_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    model: str = DEFAULT_MODEL,
+    references: Optional[List[Tuple[str, str]]] = None,
+    terms: Optional[List[Tuple[str, str]]] = None,
+) -> str:
+    """Async version of utils.one_chunk_initial_translation."""
+
+    system_message, prompt = one_chunk_initial_translation_prompt(
+        source_lang, target_lang, source_text, references, terms
+    )
+
+    return await aget_completion(
+        prompt, system_message=system_message, model=model
+    )
+
+
+async def aone_chunk_reflect_on_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    translation_1: str,
+    country: str = "",
+    model: str = DEFAULT_MODEL,
+) -> str:
+    """Async version of utils.one_chunk_reflect_on_translation."""
+
+    system_message, prompt = one_chunk_reflect_on_translation_prompt(
+        source_lang, target_lang, source_text, translation_1, country
+    )
+
+    return await aget_completion(
+        prompt, system_message=system_message, model=model
+    )
+
+
+async def aone_chunk_improve_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    translation_1: str,
+    reflection: str,
+    model: str = DEFAULT_MODEL,
+    terms: Optional[List[Tuple[str, str]]] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> str:
+    """Async version of utils.one_chunk_improve_translation."""
+
+    system_message, prompt = one_chunk_improve_translation_prompt(
+        source_lang,
+        target_lang,
+        source_text,
+        translation_1,
+        reflection,
+        terms,
+    )
+
+    return await acomplete_with_deltas(prompt, system_message, model, on_delta)
+
+
+async def aone_chunk_translate_text(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    country: str = "",
+    quality_gate: Optional["QualityGate"] = None,
+    model_router: Optional[ModelRouter] = None,
+    translation_memory: Optional["TranslationMemory"] = None,
+    glossary: Optional["Glossary"] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> str:
+    """Async version of utils.one_chunk_translate_text."""
+
+    pipeline = ChunkPipeline(
+        source_lang,
+        target_lang,
+        source_text,
+        country,
+        model_router=model_router,
+        translation_memory=translation_memory,
+        glossary=glossary,
+    )
+    if pipeline.stored is not None:
+        return pipeline.deliver(pipeline.stored, on_delta)
+
+    with pipeline.measure("initial"):
+        translation_1 = await aone_chunk_initial_translation(
+            source_lang,
+            target_lang,
+            source_text,
+            model=pipeline.models["initial"],
+            references=pipeline.references,
+            terms=pipeline.terms,
+        )
+
+    reflection = None
+    if quality_gate is not None:
+        verdict = await quality_gate.aevaluate(
+            source_lang, target_lang, source_text, translation_1, country
+        )
+        if verdict.passed:
+            return pipeline.deliver(pipeline.store(translation_1), on_delta)
+        reflection = verdict.reflection
+
+    if reflection is None:
+        with pipeline.measure("reflect"):
+            reflection = await aone_chunk_reflect_on_translation(
+                source_lang,
+                target_lang,
+                source_text,
+                translation_1,
+                country,
+                model=pipeline.models["reflect"],
+            )
+
+    with pipeline.measure("improve"):
+        translation_2 = await aone_chunk_improve_translation(
+            source_lang,
+            target_lang,
+            source_text,
+            translation_1,
+            reflection,
+            model=pipeline.models["improve"],
+            terms=pipeline.terms,
+            on_delta=on_delta,
+        )
+
+    return pipeline.store(translation_2)
+
+
+async def achunk_initial_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    chunk_index: int,
+    context_policy: Optional[ContextPolicy] = None,
+    model: str = DEFAULT_MODEL,
+    references: Optional[List[Tuple[str, str]]] = None,
+    terms: Optional[List[Tuple[str, str]]] = None,
+) -> str:
+    """Async version of utils.chunk_initial_translation."""
+
+    system_message, prompt = chunk_initial_translation_prompt(
+        source_lang,
+        target_lang,
+        source_text_chunks,
+        chunk_index,
+        context_policy,
+        references,
+        terms,
+    )
+
+    return await aget_completion(
+        prompt, system_message=system_message, model=model
+    )
+
+
+async def achunk_reflect_on_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    chunk_index: int,
+    translation_1_chunk: str,
+    country: str = "",
+    context_policy: Optional[ContextPolicy] = None,
+    model: str = DEFAULT_MODEL,
+) -> str:
+    """Async version of utils.chunk_reflect_on_translation."""
+
+    system_message, prompt = chunk_reflect_on_translation_prompt(
+        source_lang,
+        target_lang,
+        source_text_chunks,
+        chunk_index,
+        translation_1_chunk,
+        country,
+        context_policy,
+    )
+
+    return await aget_completion(
+        prompt, system_message=system_message, model=model
+    )
+
+
+async def achunk_improve_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    chunk_index: int,
+    translation_1_chunk: str,
+    reflection_chunk: str,
+    context_policy: Optional[ContextPolicy] = None,
+    model: str = DEFAULT_MODEL,
+    terms: Optional[List[Tuple[str, str]]] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> str:
+    """Async version of utils.chunk_improve_translation."""
+
+    system_message, prompt = chunk_improve_translation_prompt(
+        source_lang,
+        target_lang,
+        source_text_chunks,
+        chunk_index,
+        translation_1_chunk,
+        reflection_chunk,
+        context_policy,
+        terms,
+    )
+
+    return await acomplete_with_deltas(prompt, system_message, model, on_delta)
+
+
+async def achunk_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    chunk_index: int,
+    country: str = "",
+    context_policy: Optional[ContextPolicy] = None,
+    quality_gate: Optional["QualityGate"] = None,
+    model_router: Optional[ModelRouter] = None,
+    translation_memory: Optional["TranslationMemory"] = None,
+    glossary: Optional["Glossary"] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> str:
+    """Async version of utils.chunk_translation."""
+
+    source_text_chunk = source_text_chunks[chunk_index]
+    pipeline = ChunkPipeline(
+        source_lang,
+        target_lang,
+        source_text_chunk,
+        country,
+        model_router=model_router,
+        translation_memory=translation_memory,
+        glossary=glossary,
+        chunk_index=chunk_index,
+    )
+    if pipeline.stored is not None:
+        return pipeline.deliver(pipeline.stored, on_delta)
+
+    with pipeline.measure("initial"):
+        translation_1_chunk = await achunk_initial_translation(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            chunk_index,
+            context_policy,
+            model=pipeline.models["initial"],
+            references=pipeline.references,
+            terms=pipeline.terms,
+        )
+
+    reflection_chunk = None
+    if quality_gate is not None:
+        verdict = await quality_gate.aevaluate(
+            source_lang,
+            target_lang,
+            source_text_chunk,
+            translation_1_chunk,
+            country,
+        )
+        if verdict.passed:
+            return pipeline.deliver(
+                pipeline.store(translation_1_chunk), on_delta
+            )
+        reflection_chunk = verdict.reflection
+
+    if reflection_chunk is None:
+        with pipeline.measure("reflect"):
+            reflection_chunk = await achunk_reflect_on_translation(
+                source_lang,
+                target_lang,
+                source_text_chunks,
+                chunk_index,
+                translation_1_chunk,
+                country,
+                context_policy,
+                model=pipeline.models["reflect"],
+            )
+
+    with pipeline.measure("improve"):
+        translation_2_chunk = await achunk_improve_translation(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            chunk_index,
+            translation_1_chunk,
+            reflection_chunk,
+            context_policy,
+            model=pipeline.models["improve"],
+            terms=pipeline.terms,
+            on_delta=on_delta,
+        )
+
+    return pipeline.store(translation_2_chunk)
+
+
+async def amultichunk_initial_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    context_policy: Optional[ContextPolicy] = None,
+    model: str = DEFAULT_MODEL,
+) -> List[str]:
+    """Async version of utils.multichunk_initial_translation."""
+
+    return await gather_bounded(
+        [
+            lambda i=i: achunk_initial_translation(
+                source_lang,
+                target_lang,
+                source_text_chunks,
+                i,
+                context_policy,
+                model=model,
+            )
+            for i in range(len(source_text_chunks))
+        ],
+        max_workers,
+    )
+
+
+async def amultichunk_reflect_on_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    translation_1_chunks: List[str],
+    country: str = "",
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    context_policy: Optional[ContextPolicy] = None,
+    model: str = DEFAULT_MODEL,
+) -> List[str]:
+    """Async version of utils.multichunk_reflect_on_translation."""
+
+    return await gather_bounded(
+        [
+            lambda i=i: achunk_reflect_on_translation(
+                source_lang,
+                target_lang,
+                source_text_chunks,
+                i,
+                translation_1_chunks[i],
+                country,
+                context_policy,
+                model=model,
+            )
+            for i in range(len(source_text_chunks))
+        ],
+        max_workers,
+    )
+
+
+async def amultichunk_improve_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    translation_1_chunks: List[str],
+    reflection_chunks: List[str],
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    context_policy: Optional[ContextPolicy] = None,
+    model: str = DEFAULT_MODEL,
+) -> List[str]:
+    """Async version of utils.multichunk_improve_translation."""
+
+    return await gather_bounded(
+        [
+            lambda i=i: achunk_improve_translation(
+                source_lang,
+                target_lang,
+                source_text_chunks,
+                i,
+                translation_1_chunks[i],
+                reflection_chunks[i],
+                context_policy,
+                model=model,
+            )
+            for i in range(len(source_text_chunks))
+        ],
+        max_workers,
+    )
+
+
+async def amultichunk_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    country: str = "",
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    on_chunk_complete: Optional[Callable[[int, str], None]] = None,
+    context_policy: Optional[ContextPolicy] = None,
+    quality_gate: Optional["QualityGate"] = None,
+    model_router: Optional[ModelRouter] = None,
+    translation_memory: Optional["TranslationMemory"] = None,
+    glossary: Optional["Glossary"] = None,
+) -> List[str]:
+    """
+    Async version of utils.multichunk_translation.
+
+    Each chunk runs through its own translate, reflect and improve pipeline, so a chunk
+    never waits for the slowest chunk of a stage.
+
+    Args:
+        source_lang (str): The source language of the text chunks.
+        target_lang (str): The target language for translation.
+        source_text_chunks (List[str]): The list of source text chunks to be translated.
+        country (str): Country specified for target language
+        max_workers (int): Maximum number of completion requests in flight at once.
+        on_chunk_complete (Callable[[int, str], None], optional): Called with the chunk index and
+            its improved translation as soon as that chunk is done.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context. Defaults to the full document.
+        quality_gate (QualityGate, optional): Checked after the initial translation. If it passes, the reflect and improve stages are skipped.
+        model_router (ModelRouter, optional): Chooses the model of each stage and records its latency and cost. Defaults to DEFAULT_MODEL for every stage.
+        translation_memory (TranslationMemory, optional): Exact matches are returned without requests, fuzzy matches are shown as references to the initial translation, and new translations are stored.
+        glossary (Glossary, optional): The glossary terms found in each chunk are added to its initial translation and improvement prompts.
+
+    Returns:
+        List[str]: The list of improved translations for each source text chunk.
+    """
+
+    async def run(chunk_index: int) -> str:
+        translation_2_chunk = await achunk_translation(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            chunk_index,
+            country,
+            context_policy,
+            quality_gate,
+            model_router,
+            translation_memory,
+            glossary,
+        )
+        if on_chunk_complete is not None:
+            on_chunk_complete(chunk_index, translation_2_chunk)
+        return translation_2_chunk
+
+    return await gather_bounded(
+        [lambda i=i: run(i) for i in range(len(source_text_chunks))],
+        max_workers,
+    )
+
+
+async def atranslate(
+    source_lang,
+    target_lang,
+    source_text,
+    country,
+    max_tokens=MAX_TOKENS_PER_CHUNK,
+    max_workers=MAX_CONCURRENT_REQUESTS,
+    context_policy=None,
+    quality_gate=None,
+    model_router=None,
+    backend=None,
+    translation_memory=None,
+    glossary=None,
+    on_metrics=None,
+):
+    """Asynchronously translate the source_text from source_lang to target_lang."""
+
+    with use_backend(backend), collect_metrics() as collector:
+        tokenized_text = TokenizedText(source_text)
+        num_tokens_in_text = len(tokenized_text)
+
+        logger.debug("Source text has %d tokens", num_tokens_in_text)
+
+        if num_tokens_in_text < max_tokens:
+            logger.info("Translating text as a single chunk")
+
+            final_translation = await aone_chunk_translate_text(
+                source_lang,
+                target_lang,
+                source_text,
+                country,
+                quality_gate,
+                model_router,
+                translation_memory,
+                glossary,
+            )
+
+        else:
+            logger.info("Translating text as multiple chunks")
+
+            source_text_chunks = split_source_text(tokenized_text, max_tokens)
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Chunk token counts: %s",
+                    tokenized_text.chunk_token_counts(source_text_chunks),
+                )
+
+            translation_2_chunks = await amultichunk_translation(
+                source_lang,
+                target_lang,
+                source_text_chunks,
+                country,
+                max_workers,
+                context_policy=context_policy,
+                quality_gate=quality_gate,
+                model_router=model_router,
+                translation_memory=translation_memory,
+                glossary=glossary,
+            )
+
+            final_translation = "".join(translation_2_chunks)
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Translation metrics: %s", collector.to_json())
+
+    if on_metrics is not None:
+        on_metrics(collector)
+
+    return final_translation
+
+
+_END_OF_CHUNK = object()
+
+
+async def astream_pipelines(
+    pipelines: List[Callable[..., Awaitable[str]]],
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    stream_tokens: bool = False,
+    context: Optional[Context] = None,
+) -> AsyncIterator[str]:
+    """Async version of utils.stream_pipelines, running the pipelines as tasks."""
+
+    outputs = [asyncio.Queue() for _ in pipelines]
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    async def run(index: int) -> None:
+        output = outputs[index]
+        try:
+            async with semaphore:
+                if stream_tokens:
+                    await pipelines[index](on_delta=output.put_nowait)
+                else:
+                    output.put_nowait(await pipelines[index]())
+        except Exception as error:  # noqa: BLE001 - re-raised by the consumer
+            output.put_nowait(error)
+        output.put_nowait(_END_OF_CHUNK)
+
+    if context is None:
+        context = copy_context()
+    # Each task runs in a copy of the context current when it is created
+    tasks = [
+        context.run(asyncio.ensure_future, run(i))
+        for i in range(len(pipelines))
+    ]
+    try:
+        for output in outputs:
+            while True:
+                item = await output.get()
+                if item is _END_OF_CHUNK:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+    finally:
+        # Stop the remaining pipelines if the caller abandons the stream
+        for task in tasks:
+            task.cancel()
+
+
+async def amultichunk_translation_stream(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    country: str = "",
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    context_policy: Optional[ContextPolicy] = None,
+    stream_tokens: bool = False,
+    quality_gate: Optional["QualityGate"] = None,
+    model_router: Optional[ModelRouter] = None,
+    translation_memory: Optional["TranslationMemory"] = None,
+    glossary: Optional["Glossary"] = None,
+    context: Optional[Context] = None,
+) -> AsyncIterator[str]:
+    """Async version of utils.multichunk_translation_stream."""
+
+    pipelines = [
+        partial(
+            achunk_translation,
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            i,
+            country,
+            context_policy,
+            quality_gate=quality_gate,
+            model_router=model_router,
+            translation_memory=translation_memory,
+            glossary=glossary,
+        )
+        for i in range(len(source_text_chunks))
+    ]
+    async for item in astream_pipelines(
+        pipelines, max_workers, stream_tokens, context
+    ):
+        yield item
+
+
+async def atranslate_stream(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    country: str,
+    max_tokens: int = MAX_TOKENS_PER_CHUNK,
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    context_policy: Optional[ContextPolicy] = None,
+    stream_tokens: bool = False,
+    quality_gate: Optional["QualityGate"] = None,
+    model_router: Optional[ModelRouter] = None,
+    backend: Optional[CompletionBackend] = None,
+    translation_memory: Optional["TranslationMemory"] = None,
+    glossary: Optional["Glossary"] = None,
+    on_metrics: Optional[Callable[[MetricsCollector], None]] = None,
+) -> AsyncIterator[str]:
+    """Async version of utils.translate_stream."""
+
+    # The backend and the metrics collector are set in a context of the stream's own,
+    # which its pipelines run in. The stream is suspended between items, and values set
+    # in the caller's context would leak to the caller's code meanwhile.
+    context = copy_context()
+    stack = ExitStack()
+    context.run(stack.enter_context, use_backend(backend))
+    collector = context.run(stack.enter_context, collect_metrics())
+    try:
+        tokenized_text = TokenizedText(source_text)
+        num_tokens_in_text = len(tokenized_text)
+
+        logger.debug("Source text has %d tokens", num_tokens_in_text)
+
+        if num_tokens_in_text < max_tokens:
+            logger.info("Translating text as a single chunk")
+
+            pipeline = partial(
+                aone_chunk_translate_text,
+                source_lang,
+                target_lang,
+                source_text,
+                country,
+                quality_gate=quality_gate,
+                model_router=model_router,
+                translation_memory=translation_memory,
+                glossary=glossary,
+            )
+            async for item in astream_pipelines(
+                [pipeline], 1, stream_tokens, context
+            ):
+                yield item
+
+        else:
+            logger.info("Translating text as multiple chunks")
+
+            source_text_chunks = split_source_text(tokenized_text, max_tokens)
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Chunk token counts: %s",
+                    tokenized_text.chunk_token_counts(source_text_chunks),
+                )
+
+            async for item in amultichunk_translation_stream(
+                source_lang,
+                target_lang,
+                source_text_chunks,
+                country,
+                max_workers,
+                context_policy,
+                stream_tokens,
+                quality_gate=quality_gate,
+                model_router=model_router,
+                translation_memory=translation_memory,
+                glossary=glossary,
+                context=context,
+            ):
+                yield item
+    finally:
+        context.run(stack.close)
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Translation metrics: %s", collector.to_json())
+
+    if on_metrics is not None:
+        on_metrics(collector)
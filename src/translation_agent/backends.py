@@ -0,0 +1,632 @@
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from abc import ABC
+from abc import abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+from typing import AsyncIterable
+from typing import AsyncIterator
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+
+if TYPE_CHECKING:
+    import openai
+
+
+Messages = List[Dict[str, str]]
+
+_STREAM_PIECE = re.compile(r"\s*\S+|\s+")
+# Asks for the usage of a streamed completion, which the server sends in a last chunk without choices
+_STREAM_OPTIONS = {"include_usage": True}
+
+
+@dataclass
+class PromptTokensDetails:
+    """
+    Breakdown of the prompt tokens of a completion.
+
+    Attributes:
+        cached_tokens (int): Prompt tokens served from the provider's prompt cache.
+    """
+
+    cached_tokens: int = 0
+
+
+@dataclass
+class Usage:
+    """
+    Token usage of a completion, with the attribute names of the OpenAI API.
+
+    Attributes:
+        prompt_tokens (int): Tokens in the request.
+        completion_tokens (int): Tokens in the completion.
+        total_tokens (int): The sum of both.
+        prompt_tokens_details (PromptTokensDetails, optional): The cached share of the prompt tokens,
+            if the server reported it.
+    """
+
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    prompt_tokens_details: Optional[PromptTokensDetails] = None
+
+
+@dataclass
+class Completion:
+    """
+    The result of a chat completion request.
+
+    Attributes:
+        content (str): The text of the completion.
+        usage (Usage, optional): The tokens used, or any object with the same attributes, such as the
+            usage of an OpenAI response. None if the server did not report it.
+    """
+
+    content: str
+    usage: Optional[Usage] = None
+
+
+class CompletionStream:
+    """
+    Iterates over the text of a streamed completion as it arrives.
+
+    Args:
+        chunks (Iterable[Tuple[Optional[str], object]]): The text delta and usage of each chunk of the
+            response, either of which may be None.
+
+    Attributes:
+        usage (Usage, optional): The tokens used, or any object with the same attributes. Servers
+            usually report it with the last chunk, so it is None until the stream is exhausted, and
+            after if the server did not report it.
+    """
+
+    def __init__(self, chunks: Iterable[Tuple[Optional[str], object]]):
+        self._chunks = iter(chunks)
+        self.usage = None
+
+    def __iter__(self) -> "CompletionStream":
+        return self
+
+    def __next__(self) -> str:
+        while True:
+            delta, usage = next(self._chunks)
+            if usage is not None:
+                self.usage = usage
+            if delta:
+                return delta
+
+
+class AsyncCompletionStream:
+    """Async version of CompletionStream."""
+
+    def __init__(self, chunks: AsyncIterable[Tuple[Optional[str], object]]):
+        self._chunks = chunks.__aiter__()
+        self.usage = None
+
+    def __aiter__(self) -> "AsyncCompletionStream":
+        return self
+
+    async def __anext__(self) -> str:
+        while True:
+            delta, usage = await self._chunks.__anext__()
+            if usage is not None:
+                self.usage = usage
+            if delta:
+                return delta
+
+
+class CompletionBackend(ABC):
+    """
+    Sends chat completion requests to a model provider.
+
+    Subclasses implement complete; the async and streaming methods default to wrappers around it.
+    Streaming methods must send the request before returning, so that the rate limiter wrapping
+    them covers the request.
+    """
+
+    # Prefixed to the model name in completion cache keys, so that backends do not share entries
+    cache_namespace = ""
+
+    @abstractmethod
+    def complete(
+        self,
+        messages: Messages,
+        model: str,
+        temperature: float,
+        json_mode: bool = False,
+    ) -> Completion:
+        """
+        Request a completion.
+
+        Args:
+            messages (List[Dict[str, str]]): The chat messages, as role and content.
+            model (str): The model name.
+            temperature (float): The sampling temperature.
+            json_mode (bool): Whether to ask for a JSON object.
+
+        Returns:
+            Completion: The completion.
+        """
+
+    async def acomplete(
+        self,
+        messages: Messages,
+        model: str,
+        temperature: float,
+        json_mode: bool = False,
+    ) -> Completion:
+        """Async version of complete. Defaults to running complete in a worker thread."""
+
+        return await asyncio.to_thread(
+            self.complete, messages, model, temperature, json_mode
+        )
+
+    def stream(
+        self, messages: Messages, model: str, temperature: float
+    ) -> Iterator[str]:
+        """
+        Request a completion and iterate over its text as it arrives.
+
+        Defaults to the whole completion in one piece.
+
+        Args:
+            messages (List[Dict[str, str]]): The chat messages, as role and content.
+            model (str): The model name.
+            temperature (float): The sampling temperature.
+
+        Returns:
+            Iterator[str]: Consecutive pieces of the completion. Return a CompletionStream to report
+                the tokens used.
+        """
+
+        completion = self.complete(messages, model, temperature)
+        return CompletionStream([(completion.content, completion.usage)])
+
+    async def astream(
+        self, messages: Messages, model: str, temperature: float
+    ) -> AsyncIterator[str]:
+        """Async version of stream. Defaults to the whole completion of acomplete in one piece."""
+
+        completion = await self.acomplete(messages, model, temperature)
+        return AsyncCompletionStream(
+            _aiterate([(completion.content, completion.usage)])
+        )
+
+
+async def _aiterate(
+    chunks: List[Tuple[Optional[str], object]],
+) -> AsyncIterator[Tuple[Optional[str], object]]:
+    for chunk in chunks:
+        yield chunk
+
+
+class OpenAIBackend(CompletionBackend):
+    """
+    Sends requests with the official openai package.
+
+    Args:
+        client (openai.OpenAI, optional): The client to use. Defaults to the shared client from utils.get_client.
+        async_client (openai.AsyncOpenAI, optional): The async client to use. Defaults to the shared client
+            from async_utils.get_async_client.
+    """
+
+    def __init__(
+        self,
+        client: Optional["openai.OpenAI"] = None,
+        async_client: Optional["openai.AsyncOpenAI"] = None,
+    ):
+        self.client = client
+        self.async_client = async_client
+
+    def _client(self) -> "openai.OpenAI":
+        from .utils import get_client
+
+        return self.client if self.client is not None else get_client()
+
+    def _async_client(self) -> "openai.AsyncOpenAI":
+        from .async_utils import get_async_client
+
+        if self.async_client is not None:
+            return self.async_client
+        return get_async_client()
+
+    @staticmethod
+    def _request(
+        messages: Messages, model: str, temperature: float, json_mode: bool
+    ) -> dict:
+        request = {
+            "model": model,
+            "temperature": temperature,
+            "top_p": 1,
+            "messages": messages,
+        }
+        if json_mode:
+            request["response_format"] = {"type": "json_object"}
+        return request
+
+    def complete(
+        self,
+        messages: Messages,
+        model: str,
+        temperature: float,
+        json_mode: bool = False,
+    ) -> Completion:
+        response = self._client().chat.completions.create(
+            **self._request(messages, model, temperature, json_mode)
+        )
+        return Completion(
+            response.choices[0].message.content,
+            getattr(response, "usage", None),
+        )
+
+    async def acomplete(
+        self,
+        messages: Messages,
+        model: str,
+        temperature: float,
+        json_mode: bool = False,
+    ) -> Completion:
+        response = await self._async_client().chat.completions.create(
+            **self._request(messages, model, temperature, json_mode)
+        )
+        return Completion(
+            response.choices[0].message.content,
+            getattr(response, "usage", None),
+        )
+
+    def stream(
+        self, messages: Messages, model: str, temperature: float
+    ) -> CompletionStream:
+        response = self._client().chat.completions.create(
+            **self._request(messages, model, temperature, False),
+            stream=True,
+            stream_options=_STREAM_OPTIONS,
+        )
+        return CompletionStream(_event_chunks(event) for event in response)
+
+    async def astream(
+        self, messages: Messages, model: str, temperature: float
+    ) -> AsyncCompletionStream:
+        response = await self._async_client().chat.completions.create(
+            **self._request(messages, model, temperature, False),
+            stream=True,
+            stream_options=_STREAM_OPTIONS,
+        )
+        return AsyncCompletionStream(_aevent_chunks(response))
+
+
+def _event_chunks(event) -> Tuple[Optional[str], object]:
+    delta = event.choices[0].delta.content if event.choices else None
+    return delta, getattr(event, "usage", None)
+
+
+async def _aevent_chunks(
+    response,
+) -> AsyncIterator[Tuple[Optional[str], object]]:
+    async for event in response:
+        yield _event_chunks(event)
+
+
+class BackendHTTPError(Exception):
+    """
+    An error response from an OpenAI-compatible server.
+
+    Attributes:
+        status_code (int): The HTTP status code, used by the rate limiter to decide on retries.
+        response (urllib.error.HTTPError): The error response, whose headers the rate limiter reads.
+    """
+
+    def __init__(self, status_code: int, message: str, response=None):
+        super().__init__(f"HTTP {status_code}: {message}")
+        self.status_code = status_code
+        self.response = response
+
+
+def _usage_from_json(usage: Optional[dict]) -> Optional[Usage]:
+    if not isinstance(usage, dict):
+        return None
+    prompt_tokens = usage.get("prompt_tokens", 0)
+    completion_tokens = usage.get("completion_tokens", 0)
+    details = usage.get("prompt_tokens_details")
+    return Usage(
+        prompt_tokens,
+        completion_tokens,
+        usage.get("total_tokens", prompt_tokens + completion_tokens),
+        PromptTokensDetails(details.get("cached_tokens") or 0)
+        if isinstance(details, dict)
+        else None,
+    )
+
+
+class OpenAICompatibleBackend(CompletionBackend):
+    """
+    Sends requests to any server implementing the OpenAI chat completions endpoint, such as vLLM,
+    a llama.cpp server or Ollama, using only the standard library.
+
+    Args:
+        base_url (str): The API base URL, for example "http://localhost:8080/v1".
+        api_key (str, optional): Sent as a bearer token if given.
+        timeout (float): The timeout of a request in seconds.
+        headers (Dict[str, str], optional): Extra headers to send with every request.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: Optional[str] = None,
+        timeout: float = 600.0,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+        self.cache_namespace = self.base_url
+
+    def _open(self, body: dict):
+        headers = {"Content-Type": "application/json", **self.headers}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(
+            f"{self.base_url}/chat/completions",
+            data=json.dumps(body).encode("utf-8"),
+            headers=headers,
+            method="POST",
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as error:
+            message = error.read().decode("utf-8", "replace")
+            raise BackendHTTPError(error.code, message, error) from error
+        except urllib.error.URLError as error:
+            raise ConnectionError(str(error.reason)) from error
+
+    def complete(
+        self,
+        messages: Messages,
+        model: str,
+        temperature: float,
+        json_mode: bool = False,
+    ) -> Completion:
+        body = OpenAIBackend._request(messages, model, temperature, json_mode)
+        with self._open(body) as response:
+            data = json.loads(response.read().decode("utf-8"))
+        return Completion(
+            data["choices"][0]["message"]["content"],
+            _usage_from_json(data.get("usage")),
+        )
+
+    def stream(
+        self, messages: Messages, model: str, temperature: float
+    ) -> Iterator[str]:
+        body = OpenAIBackend._request(messages, model, temperature, False)
+        body["stream"] = True
+        body["stream_options"] = _STREAM_OPTIONS
+        return CompletionStream(self._server_sent_chunks(self._open(body)))
+
+    @staticmethod
+    def _server_sent_chunks(
+        response,
+    ) -> Iterator[Tuple[Optional[str], Optional[Usage]]]:
+        with response:
+            for line in response:
+                line = line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:") :].strip()
+                if data == "[DONE]":
+                    return
+                chunk = json.loads(data)
+                choices = chunk.get("choices") or []
+                delta = (
+                    choices[0].get("delta", {}).get("content")
+                    if choices
+                    else None
+                )
+                yield delta, _usage_from_json(chunk.get("usage"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the tokens of a text without a tokenizer, at four characters per token."""
+    return (len(text) + 3) // 4
+
+
+def echo_prompt(messages: Messages, model: str) -> str:
+    """Respond with the last message, the default response of FakeBackend."""
+    return messages[-1]["content"]
+
+
+class FakeBackend(CompletionBackend):
+    """
+    A deterministic in-process backend for tests, load tests and offline benchmarks.
+
+    Usage is estimated with estimate_tokens. Failed requests are still recorded in `requests`.
+
+    Args:
+        respond (Callable[[List[Dict[str, str]], str], str]): Computes the completion from the messages
+            and the model name. Defaults to echo_prompt.
+        latency (Union[float, Callable[[], float]]): Seconds every request takes before its first
+            token, or a function drawing them from a distribution for each request.
+        tokens_per_second (float, optional): Simulated generation speed. Adds the completion tokens
+            divided by it to the latency of each request.
+        error_rate (float): Fraction of requests that fail with a retryable HTTP 503 error.
+        seed (int, optional): Seed of the random numbers deciding which requests fail.
+    """
+
+    cache_namespace = "fake"
+
+    def __init__(
+        self,
+        respond: Callable[[Messages, str], str] = echo_prompt,
+        latency: Union[float, Callable[[], float]] = 0.0,
+        tokens_per_second: Optional[float] = None,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.respond = respond
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.requests: List[dict] = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _complete(self, messages: Messages, model: str) -> Completion:
+        with self._lock:
+            self.requests.append({"model": model, "messages": messages})
+        content = self.respond(messages, model)
+        prompt_tokens = sum(
+            estimate_tokens(message["content"]) for message in messages
+        )
+        completion_tokens = estimate_tokens(content)
+        return Completion(
+            content,
+            Usage(
+                prompt_tokens,
+                completion_tokens,
+                prompt_tokens + completion_tokens,
+            ),
+        )
+
+    def _delay(self, completion: Completion) -> float:
+        delay = self.latency() if callable(self.latency) else self.latency
+        if self.tokens_per_second:
+            delay += (
+                completion.usage.completion_tokens / self.tokens_per_second
+            )
+        return delay
+
+    def _check_error(self) -> None:
+        if not self.error_rate:
+            return
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+        if failed:
+            raise BackendHTTPError(503, "simulated server error")
+
+    def complete(
+        self,
+        messages: Messages,
+        model: str,
+        temperature: float,
+        json_mode: bool = False,
+    ) -> Completion:
+        completion = self._complete(messages, model)
+        time.sleep(self._delay(completion))
+        self._check_error()
+        return completion
+
+    async def acomplete(
+        self,
+        messages: Messages,
+        model: str,
+        temperature: float,
+        json_mode: bool = False,
+    ) -> Completion:
+        completion = self._complete(messages, model)
+        await asyncio.sleep(self._delay(completion))
+        self._check_error()
+        return completion
+
+    def stream(
+        self, messages: Messages, model: str, temperature: float
+    ) -> CompletionStream:
+        completion = self.complete(messages, model, temperature)
+        return CompletionStream(self._stream_chunks(completion))
+
+    async def astream(
+        self, messages: Messages, model: str, temperature: float
+    ) -> AsyncCompletionStream:
+        completion = await self.acomplete(messages, model, temperature)
+        return AsyncCompletionStream(
+            _aiterate(self._stream_chunks(completion))
+        )
+
+    @staticmethod
+    def _stream_chunks(
+        completion: Completion,
+    ) -> List[Tuple[Optional[str], object]]:
+        chunks = [
+            (piece, None)
+            for piece in _STREAM_PIECE.findall(completion.content)
+        ]
+        return [*chunks, (None, completion.usage)]
+
+
+_default_backend: Optional[CompletionBackend] = None
+_current_backend: ContextVar[Optional[CompletionBackend]] = ContextVar(
+    "completion_backend", default=None
+)
+
+
+def set_backend(backend: Optional[CompletionBackend]) -> None:
+    """
+    Install the backend used by every completion request in the process.
+
+    Args:
+        backend (CompletionBackend, optional): The backend to use, or None for the OpenAI API.
+    """
+
+    global _default_backend
+    _default_backend = backend
+
+
+def get_backend() -> CompletionBackend:
+    """Return the backend selected with use_backend, else the one installed with set_backend."""
+
+    global _default_backend
+    backend = _current_backend.get()
+    if backend is not None:
+        return backend
+    if _default_backend is None:
+        _default_backend = OpenAIBackend()
+    return _default_backend
+
+
+@contextmanager
+def use_backend(backend: Optional[CompletionBackend]) -> Iterator[None]:
+    """
+    Send the completion requests made in this context, including from the pipeline's worker threads
+    and tasks, to a backend.
+
+    Args:
+        backend (CompletionBackend, optional): The backend to use. If None, the selection is unchanged.
+    """
+
+    if backend is None:
+        yield
+        return
+    token = _current_backend.set(backend)
+    try:
+        yield
+    finally:
+        _current_backend.reset(token)
+
+
+def cache_model_name(backend: CompletionBackend, model: str) -> str:
+    """
+    Return the model name to use in completion cache keys for a backend.
+
+    Args:
+        backend (CompletionBackend): The backend serving the request.
+        model (str): The model name.
+    """
+
+    if not backend.cache_namespace:
+        return model
+    return f"{backend.cache_namespace}/{model}"
@@ -0,0 +1,507 @@
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from abc import ABC
+from abc import abstractmethod
+from typing import TYPE_CHECKING
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from .utils import get_client
+from .utils import get_completion
+from .utils import one_chunk_improve_translation_prompt
+from .utils import one_chunk_initial_translation_prompt
+from .utils import one_chunk_reflect_on_translation_prompt
+
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    import openai
+
+
+BATCH_STATE_VERSION = 2
+BATCH_STAGES = ("translation_1", "reflection", "translation_2")
+BATCH_ENDPOINT = "/v1/chat/completions"
+# OpenAI limit on the number of requests in one batch file
+MAX_BATCH_REQUESTS = 50000
+
+# Batch statuses after which a batch will not change any more
+FINISHED_STATUSES = ("completed", "expired", "failed", "cancelled")
+
+
+class BatchBackend(ABC):
+    """
+    Runs files of chat completion requests in the OpenAI Batch API JSONL format.
+
+    Every input line is {"custom_id", "method", "url", "body"} and every output line is
+    {"custom_id", "response": {"status_code", "body"}, "error"}, as documented for the Batch API.
+    """
+
+    @abstractmethod
+    def submit(self, requests_path: str) -> str:
+        """
+        Start a batch.
+
+        Args:
+            requests_path (str): The path of the JSONL file of requests.
+
+        Returns:
+            str: The id of the batch.
+        """
+
+    @abstractmethod
+    def status(self, batch_id: str) -> str:
+        """
+        Return the status of a batch, such as "in_progress" or one of FINISHED_STATUSES.
+
+        Args:
+            batch_id (str): The id returned by submit.
+        """
+
+    @abstractmethod
+    def download(self, batch_id: str, output_path: str) -> None:
+        """
+        Write the output lines of a finished batch, including failed requests, to a file.
+
+        Args:
+            batch_id (str): The id returned by submit.
+            output_path (str): The path of the JSONL file to write.
+        """
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """
+    Runs batches with the OpenAI Batch API.
+
+    Args:
+        client (openai.OpenAI, optional): The client to use. Defaults to the shared client from utils.get_client.
+        completion_window (str): The time frame within which the batch should be processed.
+    """
+
+    def __init__(
+        self,
+        client: Optional["openai.OpenAI"] = None,
+        completion_window: str = "24h",
+    ):
+        self.client = client
+        self.completion_window = completion_window
+
+    def _client(self) -> "openai.OpenAI":
+        return self.client if self.client is not None else get_client()
+
+    def submit(self, requests_path: str) -> str:
+        with open(requests_path, "rb") as file:
+            input_file = self._client().files.create(
+                file=file, purpose="batch"
+            )
+        batch = self._client().batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window,
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return self._client().batches.retrieve(batch_id).status
+
+    def download(self, batch_id: str, output_path: str) -> None:
+        batch = self._client().batches.retrieve(batch_id)
+        with open(output_path, "w", encoding="utf-8") as file:
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    content = self._client().files.content(file_id).text
+                    file.write(content.rstrip("\n") + "\n" if content else "")
+
+
+def complete_request_body(body: dict) -> str:
+    """
+    Run the body of a batch request as a regular chat completion with get_completion.
+
+    Args:
+        body (dict): The request body, with model, temperature and messages.
+
+    Returns:
+        str: The completion text.
+    """
+
+    messages = {
+        message["role"]: message["content"] for message in body["messages"]
+    }
+    return get_completion(
+        messages["user"],
+        system_message=messages["system"],
+        model=body["model"],
+        temperature=body["temperature"],
+    )
+
+
+def _output_line(
+    custom_id: str, content: Optional[str] = None, error: Optional[dict] = None
+) -> dict:
+    response = None
+    if error is None:
+        response = {
+            "status_code": 200,
+            "body": {
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                    }
+                ]
+            },
+        }
+    return {"custom_id": custom_id, "response": response, "error": error}
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    Runs batches locally, one request after another, keeping every batch as files in a directory.
+
+    Each batch is processed when it is submitted. Its input and output files survive restarts, so a
+    resumed run finds finished batches as the Batch API would.
+
+    Args:
+        directory (str): The directory holding the batch files.
+        complete (Callable[[dict], str], optional): Turns a request body into a completion.
+            Defaults to complete_request_body, which calls the regular API. Pass a fake to run offline.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        complete: Callable[[dict], str] = complete_request_body,
+    ):
+        self.directory = directory
+        self.complete = complete
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, batch_id: str, kind: str) -> str:
+        return os.path.join(self.directory, f"{batch_id}.{kind}.jsonl")
+
+    def submit(self, requests_path: str) -> str:
+        batch_id = f"batch_local_{uuid.uuid4().hex}"
+        shutil.copyfile(requests_path, self._path(batch_id, "input"))
+
+        with open(self._path(batch_id, "input"), encoding="utf-8") as file:
+            requests = [json.loads(line) for line in file if line.strip()]
+
+        with open(
+            self._path(batch_id, "output.partial"), "w", encoding="utf-8"
+        ) as file:
+            for request in requests:
+                try:
+                    result = _output_line(
+                        request["custom_id"], self.complete(request["body"])
+                    )
+                except Exception as error:  # noqa: BLE001 - reported per request, as the Batch API does
+                    result = _output_line(
+                        request["custom_id"],
+                        error={
+                            "code": type(error).__name__,
+                            "message": str(error),
+                        },
+                    )
+                file.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+        os.replace(
+            self._path(batch_id, "output.partial"),
+            self._path(batch_id, "output"),
+        )
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        if os.path.exists(self._path(batch_id, "output")):
+            return "completed"
+        if os.path.exists(self._path(batch_id, "input")):
+            return "in_progress"
+        return "failed"
+
+    def download(self, batch_id: str, output_path: str) -> None:
+        shutil.copyfile(self._path(batch_id, "output"), output_path)
+
+
+def read_documents(input_path: str) -> List[dict]:
+    """
+    Read the documents to translate from a JSONL file.
+
+    Every line is a JSON object with a "text" field and an optional "id", which defaults to the line
+    number. Lines may override the languages and country with "source_lang", "target_lang" and "country".
+
+    Args:
+        input_path (str): The path of the JSONL file.
+
+    Returns:
+        List[dict]: The documents, in file order, each with a string "id".
+    """
+
+    documents = []
+    seen_ids = set()
+    with open(input_path, encoding="utf-8") as file:
+        for line_number, line in enumerate(file):
+            if not line.strip():
+                continue
+            document = json.loads(line)
+            document["id"] = str(document.get("id", line_number))
+            if document["id"] in seen_ids:
+                raise ValueError(f"Duplicate document id: {document['id']}")
+            seen_ids.add(document["id"])
+            documents.append(document)
+    return documents
+
+
+def stage_prompt(
+    stage: str,
+    document: dict,
+    outputs: Dict[str, str],
+    source_lang: str,
+    target_lang: str,
+    country: str,
+) -> Tuple[str, str]:
+    """
+    Build the system message and prompt of one stage for one document.
+
+    Args:
+        stage (str): One of BATCH_STAGES.
+        document (dict): The document, as returned by read_documents.
+        outputs (Dict[str, str]): The outputs of the earlier stages for the document.
+        source_lang (str): The default source language.
+        target_lang (str): The default target language.
+        country (str): The default country for the target language.
+
+    Returns:
+        Tuple[str, str]: The system message and the prompt.
+    """
+
+    source_lang = document.get("source_lang", source_lang)
+    target_lang = document.get("target_lang", target_lang)
+    country = document.get("country", country)
+    source_text = document["text"]
+
+    if stage == "translation_1":
+        return one_chunk_initial_translation_prompt(
+            source_lang, target_lang, source_text
+        )
+    if stage == "reflection":
+        return one_chunk_reflect_on_translation_prompt(
+            source_lang,
+            target_lang,
+            source_text,
+            outputs["translation_1"],
+            country,
+        )
+    return one_chunk_improve_translation_prompt(
+        source_lang,
+        target_lang,
+        source_text,
+        outputs["translation_1"],
+        outputs["reflection"],
+    )
+
+
+def _load_state(state_path: str) -> dict:
+    if not os.path.exists(state_path):
+        return {
+            "version": BATCH_STATE_VERSION,
+            "stage": 0,
+            "batch_ids": [],
+            "submitted_requests": 0,
+            "submitted_batches": 0,
+            "outputs": {},
+            "errors": {},
+        }
+
+    with open(state_path, encoding="utf-8") as file:
+        state = json.load(file)
+    if state.get("version") != BATCH_STATE_VERSION:
+        raise ValueError(
+            f"Unsupported batch state version: {state.get('version')}"
+        )
+    return state
+
+
+def _save_state(state: dict, state_path: str) -> None:
+    # Write then rename, so that an interruption never leaves a truncated state file
+    with open(state_path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(state, file, ensure_ascii=False)
+    os.replace(state_path + ".tmp", state_path)
+
+
+def _parse_output_line(result: dict) -> Tuple[Optional[str], Optional[str]]:
+    # Returns the completion text or an error message
+    if result.get("error"):
+        return None, result["error"].get("message") or str(result["error"])
+    response = result.get("response") or {}
+    if response.get("status_code") != 200:
+        return None, f"status code {response.get('status_code')}"
+    return response["body"]["choices"][0]["message"]["content"], None
+
+
+def batch_translate(
+    input_path: str,
+    output_path: str,
+    source_lang: str,
+    target_lang: str,
+    country: str = "",
+    backend: Optional[BatchBackend] = None,
+    state_path: Optional[str] = None,
+    model: str = "gpt-4-turbo",
+    temperature: float = 0.3,
+    poll_interval: float = 60.0,
+    max_batch_requests: int = MAX_BATCH_REQUESTS,
+) -> Dict[str, int]:
+    """
+    Translate every document of a JSONL file with three bulk submissions, one per stage.
+
+    All initial translations are submitted as one batch, then all reflections, then all
+    improvements. Each document is treated as one chunk, so this mode is meant for many short texts.
+    Progress is saved to a state file after every step, including every batch submission. Calling
+    batch_translate again with the same state file resumes where the previous run stopped, without
+    submitting any request twice.
+
+    Args:
+        input_path (str): The JSONL file of documents, see read_documents.
+        output_path (str): The JSONL file to write. Every input document is written with a
+            "translation" field, or an "error" field if one of its requests failed.
+        source_lang (str): The source language of the documents.
+        target_lang (str): The target language for translation.
+        country (str): Country specified for target language.
+        backend (BatchBackend, optional): Where batches run. Defaults to OpenAIBatchBackend.
+        state_path (str, optional): The job state file. Defaults to output_path + ".state.json".
+        model (str): The model used for every request.
+        temperature (float): The sampling temperature used for every request.
+        poll_interval (float): Seconds to wait between status checks of a running batch.
+        max_batch_requests (int): Maximum number of requests per batch file. Larger stages are
+            split into several batches.
+
+    Returns:
+        Dict[str, int]: The number of documents, translated documents, failed documents and
+            submitted batches.
+    """
+
+    backend = backend if backend is not None else OpenAIBatchBackend()
+    state_path = state_path or output_path + ".state.json"
+    documents = read_documents(input_path)
+    state = _load_state(state_path)
+    outputs: Dict[str, Dict[str, str]] = state["outputs"]
+    errors: Dict[str, str] = state["errors"]
+
+    while state["stage"] < len(BATCH_STAGES):
+        stage = BATCH_STAGES[state["stage"]]
+        pending = [
+            document
+            for document in documents
+            if document["id"] not in errors
+            and stage not in outputs.get(document["id"], {})
+        ]
+
+        # The pending documents do not change until the stage's batches are collected, so on
+        # resume the number of submitted requests is where the first unsubmitted slice starts
+        if state["submitted_requests"] < len(pending):
+            for start in range(
+                state["submitted_requests"], len(pending), max_batch_requests
+            ):
+                batch_documents = pending[start : start + max_batch_requests]
+                requests_path = f"{state_path}.{stage}.{start}.jsonl"
+                with open(requests_path, "w", encoding="utf-8") as file:
+                    for document in batch_documents:
+                        system_message, prompt = stage_prompt(
+                            stage,
+                            document,
+                            outputs.get(document["id"], {}),
+                            source_lang,
+                            target_lang,
+                            country,
+                        )
+                        request = {
+                            "custom_id": document["id"],
+                            "method": "POST",
+                            "url": BATCH_ENDPOINT,
+                            "body": {
+                                "model": model,
+                                "temperature": temperature,
+                                "top_p": 1,
+                                "messages": [
+                                    {
+                                        "role": "system",
+                                        "content": system_message,
+                                    },
+                                    {"role": "user", "content": prompt},
+                                ],
+                            },
+                        }
+                        file.write(
+                            json.dumps(request, ensure_ascii=False) + "\n"
+                        )
+                state["batch_ids"].append(backend.submit(requests_path))
+                state["submitted_requests"] = start + len(batch_documents)
+                state["submitted_batches"] += 1
+                _save_state(state, state_path)
+            logger.info("Submitted %s batches: %s", stage, state["batch_ids"])
+
+        for batch_id in state["batch_ids"]:
+            status = backend.status(batch_id)
+            while status not in FINISHED_STATUSES:
+                time.sleep(poll_interval)
+                status = backend.status(batch_id)
+
+            if status in ("failed", "cancelled"):
+                # Forget the batch so that the next run submits the stage again
+                state["batch_ids"] = []
+                state["submitted_requests"] = 0
+                _save_state(state, state_path)
+                raise RuntimeError(f"Batch {batch_id} for {stage} {status}")
+
+            results_path = f"{state_path}.{batch_id}.output.jsonl"
+            backend.download(batch_id, results_path)
+            with open(results_path, encoding="utf-8") as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    result = json.loads(line)
+                    content, error = _parse_output_line(result)
+                    if error is not None:
+                        errors[result["custom_id"]] = f"{stage}: {error}"
+                    else:
+                        outputs.setdefault(result["custom_id"], {})[stage] = (
+                            content
+                        )
+
+        # Requests missing from the output, for example because the batch expired
+        for document in pending:
+            if stage not in outputs.get(document["id"], {}):
+                errors.setdefault(
+                    document["id"], f"{stage}: no result returned"
+                )
+
+        state["stage"] += 1
+        state["batch_ids"] = []
+        state["submitted_requests"] = 0
+        _save_state(state, state_path)
+
+    translated = 0
+    with open(output_path, "w", encoding="utf-8") as file:
+        for document in documents:
+            result = dict(document)
+            if document["id"] in errors:
+                result["error"] = errors[document["id"]]
+            else:
+                result["translation"] = outputs[document["id"]][
+                    "translation_2"
+                ]
+                translated += 1
+            file.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    return {
+        "documents": len(documents),
+        "translated": translated,
+        "failed": len(documents) - translated,
+        "batches": state["submitted_batches"],
+    }
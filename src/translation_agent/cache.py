@@ -0,0 +1,227 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+
+class CompletionCache:
+    """
+    Content-addressed cache for LLM completions.
+
+    Entries are keyed on a hash of everything that determines a completion, and stored in an
+    in-memory LRU tier backed by an optional on-disk SQLite tier that survives restarts.
+    Both tiers are safe to use from several threads.
+
+    A chunk's key covers its whole prompt, context included. With the default FullDocumentContext,
+    editing one paragraph changes the prompt, and so the key, of every chunk. Reusing completions
+    across edits therefore needs a windowed ContextPolicy such as NeighbourChunksContext, which
+    incremental_translate uses by default.
+
+    Args:
+        path (str, optional): Path of the SQLite database file. If None, only the memory tier is used.
+        max_memory_entries (int): Maximum number of entries kept in memory. Least recently used entries
+            are evicted first.
+        max_disk_entries (int, optional): Maximum number of entries kept on disk. If None, the disk tier
+            is unbounded.
+        ttl (float, optional): Time to live of an entry in seconds. If None, entries never expire.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_memory_entries: int = 1024,
+        max_disk_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, Tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS completions_accessed "
+                "ON completions (accessed)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(
+        model: str,
+        temperature: float,
+        system_message: str,
+        prompt: str,
+        json_mode: bool,
+    ) -> str:
+        """
+        Compute the cache key of a completion request.
+
+        Args:
+            model (str): The model name.
+            temperature (float): The sampling temperature.
+            system_message (str): The system message.
+            prompt (str): The user prompt.
+            json_mode (bool): Whether JSON output was requested.
+
+        Returns:
+            str: The hex SHA-256 digest identifying the request.
+        """
+
+        payload = json.dumps(
+            [model, temperature, system_message, prompt, json_mode],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a completion, checking memory first and then disk.
+
+        Args:
+            key (str): The cache key from make_key.
+
+        Returns:
+            Optional[str]: The cached completion, or None on a miss or an expired entry.
+        """
+
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created, now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM completions WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is not None:
+                    value, created = row
+                    if not self._expired(created, now):
+                        self._db.execute(
+                            "UPDATE completions SET accessed = ? WHERE key = ?",
+                            (now, key),
+                        )
+                        self._db.commit()
+                        self._remember(key, value, created)
+                        self.hits += 1
+                        return value
+                    self._db.execute(
+                        "DELETE FROM completions WHERE key = ?", (key,)
+                    )
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Store a completion in both tiers.
+
+        Args:
+            key (str): The cache key from make_key.
+            value (str): The completion text.
+        """
+
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO completions "
+                    "(key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now),
+                )
+                if self.max_disk_entries is not None:
+                    self._db.execute(
+                        "DELETE FROM completions WHERE key IN ("
+                        "SELECT key FROM completions ORDER BY accessed DESC "
+                        "LIMIT -1 OFFSET ?)",
+                        (self.max_disk_entries,),
+                    )
+                self._db.commit()
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        """
+        Remove one entry from both tiers.
+
+        Args:
+            key (str): The cache key from make_key.
+        """
+
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._db is not None:
+                self._db.execute(
+                    "DELETE FROM completions WHERE key = ?", (key,)
+                )
+                self._db.commit()
+
+    def clear(self) -> None:
+        """Remove every entry from both tiers and reset the counters."""
+
+        with self._lock:
+            self._memory.clear()
+            self.hits = 0
+            self.misses = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM completions")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Report cache usage.
+
+        Returns:
+            Dict[str, int]: Hit and miss counters and the number of entries in each tier.
+        """
+
+        with self._lock:
+            disk_entries = 0
+            if self._db is not None:
+                disk_entries = self._db.execute(
+                    "SELECT COUNT(*) FROM completions"
+                ).fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+            }
+
+    def close(self) -> None:
+        """Close the SQLite connection, if any."""
+
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,120 @@
+import re
+from bisect import bisect_left
+from bisect import bisect_right
+from typing import List
+
+from .tokenizer import TokenizedText
+
+
+# Preferred boundary patterns, from most to least preferred. A boundary is the end of a
+# match, so separators stay at the end of the chunk they close.
+BOUNDARY_PATTERNS = [
+    re.compile(r"\n[^\S\n]*\n\s*"),  # paragraph
+    re.compile(r"\n\s*"),  # line
+    re.compile(  # sentence, including CJK full stops
+        r"[.!?][\"'\u201d\u2019)\]]*\s+"
+        r"|[\u3002\uff01\uff1f]+[\u300d\u300f\u201d\u2019\uff09]*"
+    ),
+]
+
+# Word boundaries are only searched for inside a chunk that has no preferred boundary
+WORD_BOUNDARY_PATTERN = re.compile(r"\s+")
+
+# A preferred boundary must fill at least this share of a chunk
+MIN_CHUNK_FILL = 0.5
+
+
+def boundary_token_indexes(tokenized_text: TokenizedText) -> List[List[int]]:
+    """
+    Find the token indices at which a chunk may start, for each kind of preferred boundary.
+
+    Args:
+        tokenized_text (TokenizedText): The tokenized text.
+
+    Returns:
+        List[List[int]]: One sorted list of token indices per entry of BOUNDARY_PATTERNS.
+    """
+
+    offsets = tokenized_text.offsets
+    indexes = []
+    for pattern in BOUNDARY_PATTERNS:
+        token_indexes = []
+        for match in pattern.finditer(tokenized_text.text):
+            token_index = bisect_left(offsets, match.end())
+            if not token_indexes or token_indexes[-1] != token_index:
+                token_indexes.append(token_index)
+        indexes.append(token_indexes)
+    return indexes
+
+
+def _last_word_boundary(
+    tokenized_text: TokenizedText, start: int, limit: int
+) -> int:
+    offsets = tokenized_text.offsets
+    matches = list(
+        WORD_BOUNDARY_PATTERN.finditer(
+            tokenized_text.text, offsets[start], offsets[limit]
+        )
+    )
+    if not matches:
+        return start
+    return bisect_left(offsets, matches[-1].end())
+
+
+def split_tokenized_text(
+    tokenized_text: TokenizedText, chunk_size: int
+) -> List[str]:
+    """
+    Split a tokenized text into chunks of at most chunk_size tokens.
+
+    Each chunk ends at the most preferred boundary (paragraph, line, then sentence) that keeps it
+    within chunk_size tokens and fills at least MIN_CHUNK_FILL of it, otherwise at the last word
+    boundary, otherwise at chunk_size tokens. The text is never encoded again, and joining
+    the chunks gives back the original text.
+
+    Args:
+        tokenized_text (TokenizedText): The tokenized text.
+        chunk_size (int): The maximum number of tokens per chunk.
+
+    Returns:
+        List[str]: The chunks of the text, in document order.
+    """
+
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+
+    text = tokenized_text.text
+    offsets = tokenized_text.offsets
+    num_tokens = len(tokenized_text)
+    boundaries = boundary_token_indexes(tokenized_text)
+    min_fill = max(1, int(chunk_size * MIN_CHUNK_FILL))
+
+    chunks = []
+    start = 0
+    while start < num_tokens:
+        limit = start + chunk_size
+        if limit >= num_tokens:
+            end = num_tokens
+        else:
+            end = 0
+            for token_indexes in boundaries:
+                position = bisect_right(token_indexes, limit) - 1
+                if (
+                    position >= 0
+                    and token_indexes[position] - start >= min_fill
+                ):
+                    end = token_indexes[position]
+                    break
+            if not end:
+                end = _last_word_boundary(tokenized_text, start, limit)
+            if end <= start:
+                end = limit
+
+        start_char = offsets[start]
+        end_char = offsets[end] if end < num_tokens else len(text)
+        # Tokens that split a multi-byte character share an offset
+        if end_char > start_char:
+            chunks.append(text[start_char:end_char])
+        start = end
+
+    return chunks
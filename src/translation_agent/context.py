@@ -0,0 +1,265 @@
+from abc import ABC
+from abc import abstractmethod
+from functools import lru_cache
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from .tokenizer import TokenizedText
+from .tokenizer import count_tokens
+
+
+MULTICHUNK_STAGES = 3  # initial translation, reflection and improvement
+
+
+@lru_cache(maxsize=4096)
+def _chunk_tokens(chunk: str) -> int:
+    return count_tokens(chunk)
+
+
+class ContextPolicy(ABC):
+    """
+    Decides how much of the surrounding document is sent with each chunk in the multichunk prompts.
+
+    Subclasses choose a window of neighbouring chunks around the chunk being translated and may add
+    a preamble, such as a document summary, in front of it.
+    """
+
+    # Whether the prompts put the context first, unmarked, so that it forms a prefix shared by the
+    # prompts of every chunk. See PrefixCachingContext.
+    stable_prefix = False
+
+    @abstractmethod
+    def window(
+        self, source_text_chunks: List[str], chunk_index: int
+    ) -> Tuple[int, int]:
+        """
+        Choose the chunks to include as context.
+
+        Args:
+            source_text_chunks (List[str]): The source text divided into chunks.
+            chunk_index (int): The index of the chunk being translated.
+
+        Returns:
+            Tuple[int, int]: The start (inclusive) and end (exclusive) chunk indices of the window.
+        """
+
+    def preamble(self) -> str:
+        """Return text placed before the window, or an empty string."""
+        return ""
+
+    def tagged_text(
+        self, source_text_chunks: List[str], chunk_index: int
+    ) -> str:
+        """
+        Build the source text shown to the model, with the chunk to translate marked by <TRANSLATE_THIS> tags.
+
+        Text outside the window is replaced by an ellipsis marker.
+
+        Args:
+            source_text_chunks (List[str]): The source text divided into chunks.
+            chunk_index (int): The index of the chunk being translated.
+
+        Returns:
+            str: The tagged context text.
+        """
+
+        start, end = self.window(source_text_chunks, chunk_index)
+
+        return (
+            self.preamble()
+            + ("[...]\n" if start > 0 else "")
+            + "".join(source_text_chunks[start:chunk_index])
+            + "<TRANSLATE_THIS>"
+            + source_text_chunks[chunk_index]
+            + "</TRANSLATE_THIS>"
+            + "".join(source_text_chunks[chunk_index + 1 : end])
+            + ("\n[...]" if end < len(source_text_chunks) else "")
+        )
+
+    def context_text(
+        self, source_text_chunks: List[str], chunk_index: int
+    ) -> str:
+        """
+        Build the source text shown to the model, without marking the chunk to translate.
+
+        Args:
+            source_text_chunks (List[str]): The source text divided into chunks.
+            chunk_index (int): The index of the chunk being translated.
+
+        Returns:
+            str: The context text.
+        """
+
+        start, end = self.window(source_text_chunks, chunk_index)
+
+        return (
+            self.preamble()
+            + ("[...]\n" if start > 0 else "")
+            + "".join(source_text_chunks[start:end])
+            + ("\n[...]" if end < len(source_text_chunks) else "")
+        )
+
+
+class FullDocumentContext(ContextPolicy):
+    """Send the whole document with every chunk. Prompt size grows with the document length."""
+
+    def window(
+        self, source_text_chunks: List[str], chunk_index: int
+    ) -> Tuple[int, int]:
+        return 0, len(source_text_chunks)
+
+
+class NeighbourChunksContext(ContextPolicy):
+    """
+    Send only the chunks next to the chunk being translated.
+
+    Args:
+        before (int): Number of preceding chunks to include.
+        after (int, optional): Number of following chunks to include. Defaults to `before`.
+    """
+
+    def __init__(self, before: int = 1, after: Optional[int] = None):
+        self.before = before
+        self.after = before if after is None else after
+
+    def window(
+        self, source_text_chunks: List[str], chunk_index: int
+    ) -> Tuple[int, int]:
+        return (
+            max(0, chunk_index - self.before),
+            min(len(source_text_chunks), chunk_index + self.after + 1),
+        )
+
+
+class TokenBudgetContext(ContextPolicy):
+    """
+    Grow the window one neighbouring chunk at a time, alternating between the preceding and the
+    following side, for as long as the context stays within a token budget.
+
+    Args:
+        max_context_tokens (int): Token budget for the neighbouring chunks, excluding the chunk itself.
+    """
+
+    def __init__(self, max_context_tokens: int = 2000):
+        self.max_context_tokens = max_context_tokens
+
+    def window(
+        self, source_text_chunks: List[str], chunk_index: int
+    ) -> Tuple[int, int]:
+        start, end = chunk_index, chunk_index + 1
+        budget = self.max_context_tokens
+        grew = True
+        while grew:
+            grew = False
+            if start > 0:
+                cost = _chunk_tokens(source_text_chunks[start - 1])
+                if cost <= budget:
+                    start -= 1
+                    budget -= cost
+                    grew = True
+            if end < len(source_text_chunks):
+                cost = _chunk_tokens(source_text_chunks[end])
+                if cost <= budget:
+                    end += 1
+                    budget -= cost
+                    grew = True
+        return start, end
+
+
+class SummaryContext(NeighbourChunksContext):
+    """
+    Send a precomputed summary of the whole document followed by the neighbouring chunks.
+
+    Args:
+        summary (str): A summary of the document in the source language.
+        before (int): Number of preceding chunks to include.
+        after (int, optional): Number of following chunks to include. Defaults to `before`.
+    """
+
+    def __init__(
+        self, summary: str, before: int = 1, after: Optional[int] = None
+    ):
+        super().__init__(before, after)
+        self.summary = summary
+
+    def preamble(self) -> str:
+        return f"[Summary of the whole document: {self.summary}]\n\n"
+
+
+class PrefixCachingContext(ContextPolicy):
+    """
+    Lay the multichunk prompts out so that providers can cache the document context.
+
+    The context chosen by another policy is placed first in each prompt, without <TRANSLATE_THIS>
+    markers, and the chunk to translate is given after it. With the full document as context, the
+    prompts of every chunk of a stage then share the document as a prefix, which providers with
+    prompt caching bill and process faster after the first request. routing.prompt_cache_stats
+    reports how many prompt tokens were served from the cache.
+
+    Args:
+        policy (ContextPolicy, optional): Chooses the context. Defaults to the full document.
+    """
+
+    stable_prefix = True
+
+    def __init__(self, policy: Optional[ContextPolicy] = None):
+        self.policy = FullDocumentContext() if policy is None else policy
+
+    def window(
+        self, source_text_chunks: List[str], chunk_index: int
+    ) -> Tuple[int, int]:
+        return self.policy.window(source_text_chunks, chunk_index)
+
+    def preamble(self) -> str:
+        return self.policy.preamble()
+
+
+FULL_DOCUMENT_CONTEXT = FullDocumentContext()
+
+
+def context_token_savings(
+    source_text_chunks: List[str],
+    context_policy: ContextPolicy,
+    tokenized_text: Optional[TokenizedText] = None,
+) -> Dict[str, int]:
+    """
+    Estimate how many prompt tokens a context policy saves compared with sending the full document.
+
+    Counts cover the source context of all three multichunk stages for the whole document.
+    The fixed instructions and the chunk-specific parts of the prompts are the same under every
+    policy and are left out.
+
+    Args:
+        source_text_chunks (List[str]): The source text divided into chunks.
+        context_policy (ContextPolicy): The policy to evaluate.
+        tokenized_text (TokenizedText, optional): The tokenized source text. If given, chunk token counts
+            are derived from it instead of encoding every chunk.
+
+    Returns:
+        Dict[str, int]: The full-document context tokens, the policy's context tokens and the tokens saved.
+    """
+
+    if tokenized_text is not None:
+        chunk_tokens = tokenized_text.chunk_token_counts(source_text_chunks)
+    else:
+        chunk_tokens = [_chunk_tokens(chunk) for chunk in source_text_chunks]
+    document_tokens = sum(chunk_tokens)
+    preamble_tokens = _chunk_tokens(context_policy.preamble())
+
+    full_context_tokens = 0
+    policy_context_tokens = 0
+    for i in range(len(source_text_chunks)):
+        start, end = context_policy.window(source_text_chunks, i)
+        full_context_tokens += document_tokens
+        policy_context_tokens += preamble_tokens + sum(chunk_tokens[start:end])
+
+    full_context_tokens *= MULTICHUNK_STAGES
+    policy_context_tokens *= MULTICHUNK_STAGES
+
+    return {
+        "full_context_tokens": full_context_tokens,
+        "policy_context_tokens": policy_context_tokens,
+        "saved_tokens": full_context_tokens - policy_context_tokens,
+    }
@@ -0,0 +1,225 @@
+import logging
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+from typing import Callable
+from typing import Deque
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+from joblib import Parallel
+from joblib import delayed
+
+from .backends import use_backend
+from .context import ContextPolicy
+from .metrics import MetricsCollector
+from .metrics import collect_metrics
+from .routing import ModelRouter
+from .tokenizer import TokenizedText
+from .utils import MAX_CONCURRENT_REQUESTS
+from .utils import MAX_TOKENS_PER_CHUNK
+from .utils import one_chunk_translate_text
+from .utils import split_source_text
+from .utils import submit_multichunk_translation
+
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    from .gates import QualityGate
+    from .glossary import Glossary
+    from .memory import TranslationMemory
+
+
+@dataclass
+class PreparedDocument:
+    """
+    A document tokenized and split the way translate would split it.
+
+    Attributes:
+        source_text_chunks (List[str]): The chunks of the document, or the whole document as one chunk.
+        num_tokens (int): The number of tokens in the document.
+        single_chunk (bool): Whether the document is translated with the one-chunk prompts.
+    """
+
+    source_text_chunks: List[str]
+    num_tokens: int
+    single_chunk: bool
+
+
+def prepare_document(
+    source_text: str, max_tokens: int = MAX_TOKENS_PER_CHUNK
+) -> PreparedDocument:
+    """
+    Tokenize and split one document. Runs in the worker processes of prepare_corpus.
+
+    Args:
+        source_text (str): The document.
+        max_tokens (int): Documents with at least this many tokens are split into chunks.
+
+    Returns:
+        PreparedDocument: The prepared document.
+    """
+
+    tokenized_text = TokenizedText(source_text)
+    num_tokens = len(tokenized_text)
+    if num_tokens < max_tokens:
+        return PreparedDocument([source_text], num_tokens, True)
+    return PreparedDocument(
+        split_source_text(tokenized_text, max_tokens), num_tokens, False
+    )
+
+
+def prepare_corpus(
+    source_texts: Iterable[str],
+    max_tokens: int = MAX_TOKENS_PER_CHUNK,
+    n_jobs: Optional[int] = -1,
+) -> Iterator[PreparedDocument]:
+    """
+    Tokenize and split many documents across a joblib process pool. The documents are not
+    translated there.
+
+    Documents are yielded in order as soon as they are ready, so translation can start before the
+    whole corpus is prepared. Small documents are sent to the workers in batches, and the input is
+    read lazily, a few batches ahead of the workers.
+
+    Args:
+        source_texts (Iterable[str]): The documents.
+        max_tokens (int): Documents with at least this many tokens are split into chunks.
+        n_jobs (int, optional): The number of worker processes, as for joblib.Parallel. -1 uses every
+            core and 1 prepares the documents in the calling thread. joblib.parallel_config can choose
+            another joblib backend.
+
+    Yields:
+        PreparedDocument: The prepared documents, in input order.
+    """
+
+    yield from Parallel(n_jobs=n_jobs, return_as="generator")(
+        delayed(prepare_document)(source_text, max_tokens)
+        for source_text in source_texts
+    )
+
+
+def translate_corpus(
+    source_lang: str,
+    target_lang: str,
+    source_texts: Iterable[str],
+    country: str = "",
+    max_tokens: int = MAX_TOKENS_PER_CHUNK,
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    n_jobs: Optional[int] = -1,
+    on_document_complete: Optional[Callable[[int, str], None]] = None,
+    context_policy: Optional[ContextPolicy] = None,
+    quality_gate: Optional["QualityGate"] = None,
+    model_router: Optional[ModelRouter] = None,
+    translation_memory: Optional["TranslationMemory"] = None,
+    glossary: Optional["Glossary"] = None,
+    backend=None,
+    on_metrics: Optional[Callable[[MetricsCollector], None]] = None,
+) -> List[str]:
+    """
+    Translate many documents, preparing them in worker processes and translating them on one
+    shared thread pool.
+
+    Only tokenization and splitting run in a joblib process pool, so they scale with the number
+    of cores instead of holding the GIL of the calling process. Prompt construction and the
+    handling of responses stay in the translation threads, as in translate. Every chunk pipeline
+    of every document goes to one executor as soon as its document is prepared. Requests for early
+    documents are therefore in flight while later ones are still being tokenized, and max_workers
+    bounds the requests in flight for the whole corpus rather than per document. Each document is
+    translated as translate would translate it.
+
+    After each document is submitted, the finished documents at the head of the corpus are
+    reported and their futures released, so results arrive while the corpus is still being
+    prepared.
+
+    Args:
+        source_lang (str): The source language of the documents.
+        target_lang (str): The target language for translation.
+        source_texts (Iterable[str]): The documents.
+        country (str): Country specified for target language.
+        max_tokens (int): Documents with at least this many tokens are split into chunks.
+        max_workers (int): Maximum number of completion requests in flight at once.
+        n_jobs (int, optional): The number of preprocessing processes, as for joblib.Parallel.
+        on_document_complete (Callable[[int, str], None], optional): Called from the calling thread
+            with the index of each document and its translation, in document order, once it and
+            every earlier document are done.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context. Defaults to the full document.
+        quality_gate (QualityGate, optional): Checked after the initial translation. If it passes, the reflect and improve stages are skipped.
+        model_router (ModelRouter, optional): Chooses the model of each stage and records its latency and cost. Defaults to DEFAULT_MODEL for every stage.
+        translation_memory (TranslationMemory, optional): Exact matches are returned without requests, fuzzy matches are shown as references to the initial translation, and new translations are stored.
+        glossary (Glossary, optional): The glossary terms found in each chunk are added to its initial translation and improvement prompts.
+        backend (CompletionBackend, optional): The backend of every request. Defaults to get_backend().
+        on_metrics (Callable[[MetricsCollector], None], optional): Called with the metrics of the run once it is done.
+
+    Returns:
+        List[str]: The translation of each document, in the same order.
+    """
+
+    translations: List[str] = []
+    # Futures of the submitted documents not yet reported, in document order
+    pending: Deque[List[Future[str]]] = deque()
+
+    def report_completed(wait: bool) -> None:
+        while pending and (
+            wait or all(future.done() for future in pending[0])
+        ):
+            translation = "".join(
+                future.result() for future in pending.popleft()
+            )
+            if on_document_complete is not None:
+                on_document_complete(len(translations), translation)
+            translations.append(translation)
+
+    with use_backend(backend), collect_metrics() as collector:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for document in prepare_corpus(source_texts, max_tokens, n_jobs):
+                if document.single_chunk:
+                    futures = [
+                        executor.submit(
+                            copy_context().run,
+                            one_chunk_translate_text,
+                            source_lang,
+                            target_lang,
+                            document.source_text_chunks[0],
+                            country,
+                            quality_gate,
+                            model_router,
+                            translation_memory,
+                            glossary,
+                        )
+                    ]
+                else:
+                    futures = submit_multichunk_translation(
+                        executor,
+                        source_lang,
+                        target_lang,
+                        document.source_text_chunks,
+                        country,
+                        context_policy=context_policy,
+                        quality_gate=quality_gate,
+                        model_router=model_router,
+                        translation_memory=translation_memory,
+                        glossary=glossary,
+                    )
+                pending.append(futures)
+                report_completed(wait=False)
+
+            logger.info(
+                "Prepared %d documents", len(translations) + len(pending)
+            )
+
+            report_completed(wait=True)
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Translation metrics: %s", collector.to_json())
+
+    if on_metrics is not None:
+        on_metrics(collector)
+
+    return translations
@@ -0,0 +1,643 @@
+import html
+import logging
+import re
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Union
+
+from .context import ContextPolicy
+from .tokenizer import count_tokens
+from .utils import MAX_CONCURRENT_REQUESTS
+from .utils import MAX_TOKENS_PER_CHUNK
+from .utils import map_concurrently
+from .utils import one_chunk_translate_text
+from .utils import translate
+
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_FORMATS = ("markdown", "html")
+
+# Inline markup inside a segment is sent as numbered placeholders, ⟦1⟧, ⟦2⟧, ...
+_PLACEHOLDER = re.compile(r"⟦\d+⟧")
+# Segments are sent as one text, each starting with a marker such as ⟦#3⟧
+_SEGMENT_MARKER = re.compile(r"⟦#(\d+)⟧[ \t]*")
+# Letters, which a segment needs to be worth translating
+_WORD = re.compile(r"[^\W\d_]")
+
+_MARKDOWN_FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+_MARKDOWN_RAW_HTML = re.compile(
+    r"^\s*<(pre|script|style|textarea)\b", re.IGNORECASE
+)
+_MARKDOWN_LINE_PREFIX = re.compile(
+    r"^[ \t]*(?:>[ \t]?)*[ \t]*(?:#{1,6}[ \t]+|[-*+][ \t]+(?:\[[ xX]\][ \t]+)?|\d{1,9}[.)][ \t]+)?"
+)
+_MARKDOWN_HEADING = re.compile(r"^[ \t]*(?:>[ \t]?)*[ \t]*#{1,6}[ \t]")
+_MARKDOWN_LIST_ITEM = re.compile(r"^[ \t]*(?:[-*+]|\d{1,9}[.)])[ \t]")
+_MARKDOWN_TABLE_ROW = re.compile(r"^[ \t]*\|.*\|[ \t]*$")
+_MARKDOWN_TABLE_CELL_SEPARATOR = re.compile(r"(?<!\\)\|")
+_MARKDOWN_SKELETON_LINE = re.compile(
+    r"^ {0,3}(?:"
+    r"\[[^\]]+\]:[ \t]*\S+"  # link reference definitions
+    r"|([-*_])(?:[ \t]*\1){2,}[ \t]*"  # thematic breaks
+    r"|[=-]+[ \t]*"  # setext heading underlines
+    r"|<!--.*-->[ \t]*"
+    r")$"
+)
+_MARKDOWN_INLINE = re.compile(
+    r"(?P<code>(?P<ticks>`+).+?(?<!`)(?P=ticks)(?!`))"
+    r"|(?P<link_open>!?\[)(?P<label>[^\[\]]*)"
+    r"(?P<link_target>\]\([^()\s]*(?:[ \t]+\"[^\"]*\")?\)|\]\[[^\]]*\])"
+    r"|(?P<markup><!--.*?-->|<[a-zA-Z][\w+.-]*:[^\s>]*>|</?[a-zA-Z][^<>]*>"
+    r"|https?://[^\s<>()\[\]]*[^\s<>()\[\].,;:!?'\"])",
+    re.DOTALL,
+)
+
+# HTML elements whose content is translated as part of the surrounding text
+HTML_INLINE_TAGS = frozenset(
+    [
+        "a",
+        "abbr",
+        "b",
+        "bdi",
+        "bdo",
+        "big",
+        "cite",
+        "code",
+        "data",
+        "del",
+        "dfn",
+        "em",
+        "font",
+        "i",
+        "img",
+        "input",
+        "ins",
+        "kbd",
+        "label",
+        "mark",
+        "q",
+        "s",
+        "samp",
+        "small",
+        "span",
+        "strong",
+        "sub",
+        "sup",
+        "time",
+        "tt",
+        "u",
+        "var",
+        "br",
+        "wbr",
+    ]
+)
+# HTML elements that are never translated. Inline ones are kept whole as a placeholder.
+HTML_SKIPPED_TAGS = frozenset(
+    [
+        "code",
+        "kbd",
+        "samp",
+        "var",
+        "pre",
+        "script",
+        "style",
+        "textarea",
+        "template",
+        "svg",
+        "math",
+        "img",
+        "input",
+        "br",
+        "wbr",
+    ]
+)
+# Marks segment n in the HTML skeleton; private-use delimiters do not occur in ordinary text or markup
+_HTML_SLOT = "\ue000{}\ue001"
+_HTML_SLOT_PATTERN = re.compile("\ue000(\\d+)\ue001")
+
+
+@dataclass
+class Segment:
+    """
+    A run of translatable text from a structured document.
+
+    Attributes:
+        text (str): The text, with inline markup replaced by placeholders such as ⟦1⟧.
+        placeholders (Dict[str, str]): The markup each placeholder stands for.
+    """
+
+    text: str
+    placeholders: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class StructuredDocument:
+    """
+    A Markdown or HTML document split into its markup skeleton and translatable segments.
+
+    Attributes:
+        parts (List[Union[str, int]]): The document in order: markup and untranslated text as strings,
+            and the index of a segment where it goes.
+        segments (List[Segment]): The translatable segments.
+        escape_html (bool): Whether segment text must be escaped when it is put back, as in HTML.
+    """
+
+    parts: List[Union[str, int]]
+    segments: List[Segment]
+    escape_html: bool = False
+
+    def render(self, texts: Optional[List[str]] = None) -> str:
+        """
+        Rebuild the document with new segment texts.
+
+        Args:
+            texts (List[str], optional): The text of each segment, with the segment's placeholders.
+                Defaults to the source text, which gives back the original document.
+
+        Returns:
+            str: The document.
+        """
+
+        if texts is None:
+            texts = [segment.text for segment in self.segments]
+        escape = (
+            (lambda text: html.escape(text, quote=False))
+            if self.escape_html
+            else None
+        )
+        return "".join(
+            part
+            if isinstance(part, str)
+            else restore_placeholders(
+                texts[part], self.segments[part].placeholders, escape
+            )
+            for part in self.parts
+        )
+
+
+class _SegmentBuilder:
+    def __init__(self):
+        self.pieces: List[str] = []
+        self.placeholders: Dict[str, str] = {}
+
+    def text(self, text: str) -> None:
+        self.pieces.append(text)
+
+    def markup(self, markup: str) -> None:
+        placeholder = f"⟦{len(self.placeholders) + 1}⟧"
+        self.placeholders[placeholder] = markup
+        self.pieces.append(placeholder)
+
+    def build(self) -> Segment:
+        return Segment("".join(self.pieces), self.placeholders)
+
+
+def has_words(segment: Segment) -> bool:
+    """Whether a segment has any letters outside its placeholders."""
+    return bool(_WORD.search(_PLACEHOLDER.sub("", segment.text)))
+
+
+def placeholders_intact(translation: str, segment: Segment) -> bool:
+    """Whether a translated segment has every placeholder of the source segment exactly once."""
+    return sorted(_PLACEHOLDER.findall(translation)) == sorted(
+        segment.placeholders
+    )
+
+
+def restore_placeholders(
+    text: str, placeholders: Dict[str, str], escape=None
+) -> str:
+    """
+    Replace the placeholders of a segment with the markup they stand for.
+
+    Each placeholder is restored once. Unknown placeholders are dropped, and missing ones are
+    appended at the end, so that no markup is lost even from a damaged translation.
+
+    Args:
+        text (str): The segment text with placeholders.
+        placeholders (Dict[str, str]): The markup each placeholder stands for.
+        escape (Callable[[str], str], optional): Applied to the text between placeholders.
+
+    Returns:
+        str: The text with markup.
+    """
+
+    restored = []
+    unused = dict(placeholders)
+    position = 0
+    for match in _PLACEHOLDER.finditer(text):
+        between = text[position : match.start()]
+        restored.append(escape(between) if escape else between)
+        restored.append(unused.pop(match.group(), ""))
+        position = match.end()
+    between = text[position:]
+    restored.append(escape(between) if escape else between)
+    restored.extend(unused.values())
+    return "".join(restored)
+
+
+def _add_segment(
+    parts: List[Union[str, int]],
+    segments: List[Segment],
+    source: str,
+    segment: Segment,
+) -> None:
+    # Surrounding whitespace stays in the skeleton, and segments without words are not sent
+    if not has_words(segment):
+        parts.append(source)
+        return
+    text = segment.text
+    stripped = text.strip()
+    start = text.index(stripped)
+    lead, trail = text[:start], text[start + len(stripped) :]
+    parts.append(lead)
+    parts.append(len(segments))
+    parts.append(trail)
+    segments.append(Segment(stripped, segment.placeholders))
+
+
+def _markdown_segment(content: str) -> Segment:
+    builder = _SegmentBuilder()
+    position = 0
+    for match in _MARKDOWN_INLINE.finditer(content):
+        builder.text(content[position : match.start()])
+        if match.group("link_open"):
+            builder.markup(match.group("link_open"))
+            builder.text(match.group("label"))
+            builder.markup(match.group("link_target"))
+        else:
+            builder.markup(match.group())
+        position = match.end()
+    builder.text(content[position:])
+    return builder.build()
+
+
+def parse_markdown(text: str) -> StructuredDocument:
+    """
+    Split a Markdown document into its skeleton and translatable segments.
+
+    Front matter, fenced and indented code blocks, raw <pre>, <script> and <style> blocks, link
+    reference definitions and thematic breaks are left out. Every heading, list item, table cell
+    and paragraph is one segment, with inline code, link targets, URLs and inline HTML tags as
+    placeholders. Line prefixes such as "#", "-" and ">" stay in the skeleton.
+
+    Args:
+        text (str): The Markdown document.
+
+    Returns:
+        StructuredDocument: The document, which renders back to text exactly.
+    """
+
+    parts: List[Union[str, int]] = []
+    segments: List[Segment] = []
+    lines = text.splitlines(keepends=True)
+
+    paragraph: List[str] = []
+    paragraph_end = ""
+
+    def close_paragraph() -> None:
+        nonlocal paragraph, paragraph_end
+        if paragraph:
+            content = "\n".join(paragraph)
+            _add_segment(parts, segments, content, _markdown_segment(content))
+            parts.append(paragraph_end)
+            paragraph, paragraph_end = [], ""
+
+    closing = None  # the line that ends the current block of skipped lines
+    previous_blank = True
+    in_list = False
+    if lines and lines[0].strip() == "---":
+        closing = re.compile(r"^(---|\.\.\.)\s*$")
+        parts.append(lines[0])
+        lines = lines[1:]
+
+    for line in lines:
+        body = line.rstrip("\r\n")
+        end = line[len(body) :]
+
+        if closing is not None:
+            parts.append(line)
+            if closing.search(body):
+                closing = None
+            continue
+
+        fence = _MARKDOWN_FENCE.match(body)
+        raw_html = _MARKDOWN_RAW_HTML.match(body)
+        if fence or raw_html:
+            close_paragraph()
+            parts.append(line)
+            if fence:
+                closing = re.compile(
+                    rf"^ {{0,3}}{re.escape(fence.group(1)[0])}{{{len(fence.group(1))},}}\s*$"
+                )
+            elif not re.search(
+                rf"</{raw_html.group(1)}>", body, re.IGNORECASE
+            ):
+                closing = re.compile(rf"</{raw_html.group(1)}>", re.IGNORECASE)
+            previous_blank = False
+            continue
+
+        if not body.strip():
+            close_paragraph()
+            parts.append(line)
+            previous_blank = True
+            continue
+
+        indented_code = (
+            previous_blank
+            and not in_list
+            and not paragraph
+            and body.startswith(("    ", "\t"))
+        )
+        if indented_code or _MARKDOWN_SKELETON_LINE.match(body):
+            close_paragraph()
+            parts.append(line)
+            previous_blank = False
+            continue
+
+        if _MARKDOWN_TABLE_ROW.match(body):
+            close_paragraph()
+            for i, cell in enumerate(
+                _MARKDOWN_TABLE_CELL_SEPARATOR.split(body)
+            ):
+                if i:
+                    parts.append("|")
+                _add_segment(parts, segments, cell, _markdown_segment(cell))
+            parts.append(end)
+            previous_blank = False
+            continue
+
+        prefix = _MARKDOWN_LINE_PREFIX.match(body).group()
+        if _MARKDOWN_LIST_ITEM.match(body):
+            in_list = True
+        elif not body[0].isspace():
+            in_list = False
+
+        if paragraph and not prefix.strip():
+            # A continuation line of the open paragraph or list item
+            paragraph.append(body)
+            paragraph_end = end
+        else:
+            close_paragraph()
+            parts.append(prefix)
+            paragraph = [body[len(prefix) :]]
+            paragraph_end = end
+            if _MARKDOWN_HEADING.match(body):
+                close_paragraph()
+        previous_blank = False
+
+    close_paragraph()
+    return StructuredDocument(parts, segments)
+
+
+def _import_beautiful_soup():
+    try:
+        from bs4 import BeautifulSoup
+    except ImportError as error:
+        raise ImportError(
+            "Translating HTML requires beautifulsoup4. Install it with "
+            "`pip install beautifulsoup4` or `poetry install --extras html`."
+        ) from error
+    return BeautifulSoup
+
+
+def _opening_tag(tag) -> str:
+    attributes = "".join(
+        f' {name}="{html.escape(" ".join(value) if isinstance(value, list) else value)}"'
+        for name, value in tag.attrs.items()
+    )
+    return f"<{tag.name}{attributes}>"
+
+
+def _add_html_inline(builder: _SegmentBuilder, node) -> None:
+    from bs4 import NavigableString
+    from bs4 import Tag
+
+    if isinstance(node, Tag):
+        if node.name in HTML_SKIPPED_TAGS:
+            builder.markup(str(node))
+        else:
+            builder.markup(_opening_tag(node))
+            for child in node.children:
+                _add_html_inline(builder, child)
+            builder.markup(f"</{node.name}>")
+    elif type(node) is NavigableString:
+        builder.text(str(node))
+    else:
+        # Comments and other special strings are kept as they are
+        builder.markup(node.output_ready())
+
+
+def _collect_html_segments(tag, segments: List[Segment]) -> None:
+    from bs4 import NavigableString
+    from bs4 import Tag
+
+    run: list = []
+
+    def close_run() -> None:
+        builder = _SegmentBuilder()
+        for node in run:
+            _add_html_inline(builder, node)
+        segment = builder.build()
+        if has_words(segment):
+            text = segment.text
+            stripped = text.strip()
+            start = text.index(stripped)
+            slot = (
+                text[:start]
+                + _HTML_SLOT.format(len(segments))
+                + text[start + len(stripped) :]
+            )
+            segments.append(Segment(stripped, segment.placeholders))
+            run[0].replace_with(NavigableString(slot))
+            for node in run[1:]:
+                node.extract()
+        run.clear()
+
+    for child in list(tag.children):
+        inline = (
+            isinstance(child, Tag) and child.name in HTML_INLINE_TAGS
+        ) or type(child) is NavigableString
+        if inline:
+            run.append(child)
+            continue
+        if run:
+            close_run()
+        if isinstance(child, Tag) and child.name not in HTML_SKIPPED_TAGS:
+            _collect_html_segments(child, segments)
+    if run:
+        close_run()
+
+
+def parse_html(markup: str) -> StructuredDocument:
+    """
+    Split an HTML document into its skeleton and translatable segments.
+
+    Every run of text and inline elements inside a block element is one segment, with the inline
+    tags as placeholders. Attributes, comments and the content of code, pre, script and style
+    elements are never sent. Requires beautifulsoup4.
+
+    Args:
+        markup (str): The HTML document or fragment.
+
+    Returns:
+        StructuredDocument: The document. It renders back to the markup as serialized by
+            BeautifulSoup, which can differ from the input in attribute quoting and entities.
+    """
+
+    soup = _import_beautiful_soup()(markup, "html.parser")
+    segments: List[Segment] = []
+    _collect_html_segments(soup, segments)
+
+    parts: List[Union[str, int]] = []
+    pieces = _HTML_SLOT_PATTERN.split(str(soup))
+    for i, piece in enumerate(pieces):
+        parts.append(int(piece) if i % 2 else piece)
+    return StructuredDocument(parts, segments, escape_html=True)
+
+
+def parse_document(
+    document: str, document_format: str = "markdown"
+) -> StructuredDocument:
+    """
+    Split a structured document into its skeleton and translatable segments.
+
+    Args:
+        document (str): The document.
+        document_format (str): One of DOCUMENT_FORMATS.
+
+    Returns:
+        StructuredDocument: The document.
+    """
+
+    if document_format == "markdown":
+        return parse_markdown(document)
+    if document_format == "html":
+        return parse_html(document)
+    raise ValueError(
+        f"document_format must be one of {DOCUMENT_FORMATS}, not {document_format!r}"
+    )
+
+
+def join_segments(segments: List[Segment]) -> str:
+    """
+    Join segments into one text to translate, each starting with a marker such as ⟦#1⟧.
+
+    Args:
+        segments (List[Segment]): The segments.
+
+    Returns:
+        str: The text, with segments separated by blank lines so that chunks end between them.
+    """
+
+    return "\n\n".join(
+        f"⟦#{i + 1}⟧ {segment.text}" for i, segment in enumerate(segments)
+    )
+
+
+def split_segments(translation: str) -> Dict[int, str]:
+    """
+    Read the translated segments back from the translation of join_segments.
+
+    Args:
+        translation (str): The translated text.
+
+    Returns:
+        Dict[int, str]: The translation of each segment whose marker came back, keyed by index.
+    """
+
+    pieces = _SEGMENT_MARKER.split(translation)
+    translations: Dict[int, str] = {}
+    for i in range(1, len(pieces), 2):
+        translations.setdefault(int(pieces[i]) - 1, pieces[i + 1].strip())
+    return translations
+
+
+def translate_document(
+    source_lang: str,
+    target_lang: str,
+    document: str,
+    country: str = "",
+    document_format: str = "markdown",
+    max_tokens: int = MAX_TOKENS_PER_CHUNK,
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    context_policy: Optional[ContextPolicy] = None,
+) -> str:
+    """
+    Translate the text of a Markdown or HTML document, keeping its structure.
+
+    Only the translatable segments found by parse_document are sent, joined into one text that
+    goes through translate, so code blocks, URLs, attributes and tags cost no tokens and cannot be
+    corrupted by the model. Segments whose marker or placeholders do not come back intact are
+    translated again on their own.
+
+    Args:
+        source_lang (str): The source language of the document.
+        target_lang (str): The target language for translation.
+        document (str): The document.
+        country (str): Country specified for target language.
+        document_format (str): One of DOCUMENT_FORMATS.
+        max_tokens (int): The maximum number of tokens per chunk.
+        max_workers (int): Maximum number of completion requests in flight at once.
+        context_policy (ContextPolicy, optional): How much of the document to send with each chunk.
+
+    Returns:
+        str: The translated document.
+    """
+
+    structured = parse_document(document, document_format)
+    if not structured.segments:
+        return document
+
+    source_text = join_segments(structured.segments)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            "Translating %d segments: %d of %d document tokens",
+            len(structured.segments),
+            count_tokens(source_text),
+            count_tokens(document),
+        )
+
+    translations = split_segments(
+        translate(
+            source_lang,
+            target_lang,
+            source_text,
+            country,
+            max_tokens,
+            max_workers,
+            context_policy=context_policy,
+        )
+    )
+
+    damaged = [
+        i
+        for i, segment in enumerate(structured.segments)
+        if i not in translations
+        or not placeholders_intact(translations[i], segment)
+    ]
+    if damaged:
+        logger.warning(
+            "%d segments came back damaged, translating them one by one",
+            len(damaged),
+        )
+        retranslations = map_concurrently(
+            lambda i: one_chunk_translate_text(
+                source_lang,
+                target_lang,
+                structured.segments[i].text,
+                country,
+            ),
+            damaged,
+            max_workers,
+        )
+        for position, i in enumerate(damaged):
+            translations[i] = retranslations[position]
+
+    return structured.render(
+        [translations[i] for i in range(len(structured.segments))]
+    )
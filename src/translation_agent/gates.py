@@ -0,0 +1,350 @@
+import asyncio
+import json
+import re
+import threading
+from abc import ABC
+from abc import abstractmethod
+from dataclasses import dataclass
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+from .utils import get_completion
+
+
+# Calls the reflect and improve stages make for a chunk that goes through the whole pipeline
+SKIPPABLE_CALLS = 2
+
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+@dataclass
+class GateVerdict:
+    """
+    The decision of a quality gate on an initial translation.
+
+    Attributes:
+        passed (bool): Whether the initial translation is good enough to skip the remaining stages.
+        reflection (str, optional): Suggestions produced by the gate. When the gate fails, they replace
+            the reflection stage.
+        calls (int): The number of completion requests the gate made.
+    """
+
+    passed: bool
+    reflection: Optional[str] = None
+    calls: int = 0
+
+
+class QualityGate(ABC):
+    """
+    Decides after the initial translation whether a chunk still needs the reflect and improve stages.
+
+    The same gate may be shared by every chunk of a run; its counters report how many chunks
+    passed and how many completion requests were saved.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @abstractmethod
+    def check(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source_text: str,
+        translation_1: str,
+        country: str = "",
+    ) -> GateVerdict:
+        """
+        Judge an initial translation.
+
+        Args:
+            source_lang (str): The source language of the text.
+            target_lang (str): The target language of the translation.
+            source_text (str): The text, or chunk, that was translated.
+            translation_1 (str): Its initial translation.
+            country (str): Country specified for the target language.
+
+        Returns:
+            GateVerdict: The verdict.
+        """
+
+    async def acheck(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source_text: str,
+        translation_1: str,
+        country: str = "",
+    ) -> GateVerdict:
+        """Async version of check. Defaults to running check in a worker thread."""
+
+        return await asyncio.to_thread(
+            self.check,
+            source_lang,
+            target_lang,
+            source_text,
+            translation_1,
+            country,
+        )
+
+    def record(self, verdict: GateVerdict) -> GateVerdict:
+        """
+        Count a verdict in the gate's statistics.
+
+        Args:
+            verdict (GateVerdict): The verdict returned by check or acheck.
+
+        Returns:
+            GateVerdict: The same verdict.
+        """
+
+        if verdict.passed:
+            calls_after_gate = 0
+        else:
+            calls_after_gate = SKIPPABLE_CALLS - (
+                verdict.reflection is not None
+            )
+        with self._lock:
+            self.counters["chunks"] += 1
+            self.counters["passed"] += verdict.passed
+            self.counters["gate_calls"] += verdict.calls
+            self.counters["calls_saved"] += (
+                SKIPPABLE_CALLS - verdict.calls - calls_after_gate
+            )
+        return verdict
+
+    def evaluate(self, *args, **kwargs) -> GateVerdict:
+        """Run check with the arguments of check and record the verdict."""
+        return self.record(self.check(*args, **kwargs))
+
+    async def aevaluate(self, *args, **kwargs) -> GateVerdict:
+        """Run acheck with the arguments of check and record the verdict."""
+        return self.record(await self.acheck(*args, **kwargs))
+
+    def reset_stats(self) -> None:
+        """Reset the counters, for example at the start of a run."""
+
+        with self._lock:
+            self.counters = {
+                "chunks": 0,
+                "passed": 0,
+                "gate_calls": 0,
+                "calls_saved": 0,
+            }
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Report the gate's decisions since the last reset.
+
+        Returns:
+            Dict[str, int]: The number of chunks judged, the number that passed, the completion requests
+                made by the gate and the net number of requests saved, which is negative if the gate
+                cost more than it saved.
+        """
+
+        with self._lock:
+            return dict(self.counters)
+
+
+class LengthRatioGate(QualityGate):
+    """
+    A heuristic gate that makes no requests.
+
+    An initial translation passes if its length is within a ratio of the source length, it keeps the
+    source's line structure and numbers, and it is not a copy of the source text.
+
+    Args:
+        min_ratio (float): The smallest accepted translation to source length ratio, in characters.
+        max_ratio (float): The largest accepted translation to source length ratio, in characters.
+        max_source_chars (int, optional): Longer source texts never pass, because longer texts are more
+            likely to need editing. If None, there is no limit.
+    """
+
+    def __init__(
+        self,
+        min_ratio: float = 0.6,
+        max_ratio: float = 1.8,
+        max_source_chars: Optional[int] = None,
+    ):
+        super().__init__()
+        self.min_ratio = min_ratio
+        self.max_ratio = max_ratio
+        self.max_source_chars = max_source_chars
+
+    def check(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source_text: str,
+        translation_1: str,
+        country: str = "",
+    ) -> GateVerdict:
+        source = source_text.strip()
+        translation = translation_1.strip()
+        if not source or not translation or source == translation:
+            return GateVerdict(passed=False)
+        if (
+            self.max_source_chars is not None
+            and len(source) > self.max_source_chars
+        ):
+            return GateVerdict(passed=False)
+
+        ratio = len(translation) / len(source)
+        passed = (
+            self.min_ratio <= ratio <= self.max_ratio
+            and source.count("\n") == translation.count("\n")
+            and sorted(_NUMBER.findall(source))
+            == sorted(_NUMBER.findall(translation))
+        )
+        return GateVerdict(passed=passed)
+
+
+def verdict_prompt(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    translation_1: str,
+    country: str = "",
+) -> Tuple[str, str]:
+    """
+    Build the system message and prompt asking for a structured verdict on a translation.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language of the translation.
+        source_text (str): The original text in the source language.
+        translation_1 (str): The initial translation of the source text.
+        country (str): Country specified for the target language.
+
+    Returns:
+        Tuple[str, str]: The system message and the prompt.
+    """
+
+    system_message = f"You are an expert linguist specializing in translation from {source_lang} to {target_lang}. \
+You will be provided with a source text and its translation and your goal is to decide whether the translation needs improving."
+
+    style = (
+        f" The final style and tone of the translation should match the style of {target_lang} colloquially spoken in {country}."
+        if country != ""
+        else ""
+    )
+
+    prompt = f"""Your task is to carefully read a source text and a translation from {source_lang} to {target_lang}, \
+and then decide whether the translation needs any changes.{style}
+
+The source text and initial translation, delimited by XML tags <SOURCE_TEXT></SOURCE_TEXT> and <TRANSLATION></TRANSLATION>, are as follows:
+
+<SOURCE_TEXT>
+{source_text}
+</SOURCE_TEXT>
+
+<TRANSLATION>
+{translation_1}
+</TRANSLATION>
+
+Check the translation's
+(i) accuracy (errors of addition, mistranslation, omission, or untranslated text),
+(ii) fluency ({target_lang} grammar, spelling and punctuation rules, and unnecessary repetitions),
+(iii) style (the style of the source text and any cultural context),
+(iv) terminology (consistent use that reflects the source text domain, and equivalent idioms in {target_lang}).
+
+Respond with a JSON object with two keys: "needs_changes", true unless the translation is already correct, fluent \
+and idiomatic, and "suggestions", a string listing specific, helpful and constructive suggestions to improve the translation, \
+or an empty string if no changes are needed."""
+
+    return system_message, prompt
+
+
+def parse_verdict(completion: str) -> GateVerdict:
+    """
+    Read a verdict from the JSON completion of verdict_prompt.
+
+    Args:
+        completion (str): The completion.
+
+    Returns:
+        GateVerdict: The verdict. A completion that cannot be read fails the gate without suggestions,
+            so that the regular reflection stage runs.
+    """
+
+    try:
+        data = json.loads(completion)
+    except (TypeError, ValueError):
+        return GateVerdict(passed=False, calls=1)
+    if not isinstance(data, dict) or not isinstance(
+        data.get("needs_changes"), bool
+    ):
+        return GateVerdict(passed=False, calls=1)
+
+    suggestions = data.get("suggestions")
+    if data["needs_changes"]:
+        reflection = (
+            suggestions
+            if isinstance(suggestions, str) and suggestions.strip()
+            else None
+        )
+        return GateVerdict(passed=False, reflection=reflection, calls=1)
+    return GateVerdict(passed=True, calls=1)
+
+
+class ReflectionVerdictGate(QualityGate):
+    """
+    A gate that replaces the reflection stage with a JSON-mode reflection returning a verdict.
+
+    When the model finds nothing to change, the improvement stage is skipped. Otherwise its suggestions
+    are used as the reflection, so a failing chunk costs no extra request.
+
+    Args:
+        model (str, optional): The model used for the verdict. Defaults to the model of get_completion.
+    """
+
+    def __init__(self, model: Optional[str] = None):
+        super().__init__()
+        self.model = model
+
+    def _completion_kwargs(self) -> dict:
+        return {"model": self.model} if self.model is not None else {}
+
+    def check(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source_text: str,
+        translation_1: str,
+        country: str = "",
+    ) -> GateVerdict:
+        system_message, prompt = verdict_prompt(
+            source_lang, target_lang, source_text, translation_1, country
+        )
+        return parse_verdict(
+            get_completion(
+                prompt,
+                system_message=system_message,
+                json_mode=True,
+                **self._completion_kwargs(),
+            )
+        )
+
+    async def acheck(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source_text: str,
+        translation_1: str,
+        country: str = "",
+    ) -> GateVerdict:
+        from .async_utils import aget_completion
+
+        system_message, prompt = verdict_prompt(
+            source_lang, target_lang, source_text, translation_1, country
+        )
+        return parse_verdict(
+            await aget_completion(
+                prompt,
+                system_message=system_message,
+                json_mode=True,
+                **self._completion_kwargs(),
+            )
+        )
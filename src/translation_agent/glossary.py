@@ -0,0 +1,337 @@
+from collections import deque
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from .gates import GateVerdict
+from .gates import QualityGate
+
+
+# Characters from here on belong to scripts written without spaces between words (CJK and later
+# blocks), where a term may be directly followed or preceded by another word
+_SPACELESS_SCRIPTS = 0x2E80
+
+
+def fold_case(text: str) -> str:
+    """
+    Lowercase a text without changing its length, so that match offsets apply to the original.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        str: The lowercased text. Characters whose lowercase form has another length are kept.
+    """
+
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(
+        char.lower() if len(char.lower()) == 1 else char for char in text
+    )
+
+
+def _is_word_char(char: str) -> bool:
+    return (char.isalnum() or char == "_") and ord(char) < _SPACELESS_SCRIPTS
+
+
+class TermMatcher:
+    """
+    An Aho-Corasick automaton finding many terms in one pass over a text.
+
+    Building it costs time linear in the total length of the terms; a search costs time linear in
+    the length of the text plus the number of matches, however many terms there are.
+
+    Args:
+        terms (List[str]): The terms to find. They should already be case-folded if the searched
+            texts will be.
+    """
+
+    def __init__(self, terms: List[str]):
+        self.terms = terms
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail = [0]
+        # Indices of the terms ending at each state, including those reached through failure links
+        self._output: List[List[int]] = [[]]
+
+        for index, term in enumerate(terms):
+            if not term:
+                continue
+            state = 0
+            for char in term:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(index)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = (
+                    self._output[next_state]
+                    + self._output[self._fail[next_state]]
+                )
+
+    def find_all(self, text: str) -> List[Tuple[int, int, int]]:
+        """
+        Find every occurrence of every term, including overlapping ones.
+
+        Args:
+            text (str): The text to search.
+
+        Returns:
+            List[Tuple[int, int, int]]: (start, end, term index) of each occurrence, ordered by end.
+        """
+
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        matches = []
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                end = position + 1
+                matches.append((end - len(self.terms[index]), end, index))
+        return matches
+
+    def find(self, text: str) -> List[Tuple[int, int, int]]:
+        """
+        Find whole-word occurrences of the terms, preferring the leftmost and then the longest term
+        where occurrences overlap.
+
+        Args:
+            text (str): The text to search.
+
+        Returns:
+            List[Tuple[int, int, int]]: (start, end, term index) of each occurrence, in text order,
+                without overlaps.
+        """
+
+        candidates = []
+        for start, end, index in self.find_all(text):
+            # A boundary is only needed where the term itself starts or ends with a word character
+            if (
+                start > 0
+                and _is_word_char(text[start])
+                and _is_word_char(text[start - 1])
+            ):
+                continue
+            if (
+                end < len(text)
+                and _is_word_char(text[end - 1])
+                and _is_word_char(text[end])
+            ):
+                continue
+            candidates.append((start, end, index))
+
+        candidates.sort(key=lambda match: (match[0], -match[1]))
+        matches = []
+        covered = 0
+        for start, end, index in candidates:
+            if start >= covered:
+                matches.append((start, end, index))
+                covered = end
+        return matches
+
+
+class Glossary:
+    """
+    Required translations of source language terms.
+
+    The source terms are compiled into one TermMatcher, so finding the terms of a chunk costs a
+    single pass over it. Matching is on whole words and, unless case_sensitive is set, ignores case.
+    Target terms are matched literally, so a glossary for an inflected language should list the
+    form the translation is expected to use.
+
+    Args:
+        terms (Union[Dict[str, str], Iterable[Tuple[str, str]]]): Source terms and their translations.
+            Later entries replace earlier ones for the same source term.
+        case_sensitive (bool): Whether the case of terms must match.
+    """
+
+    def __init__(
+        self,
+        terms: Union[Dict[str, str], Iterable[Tuple[str, str]]],
+        case_sensitive: bool = False,
+    ):
+        self.case_sensitive = case_sensitive
+        entries: Dict[str, Tuple[str, str]] = {}
+        for source, target in dict(terms).items():
+            source = source.strip()
+            target = target.strip()
+            if not source or not target:
+                raise ValueError(
+                    f"Glossary terms must not be empty: {source!r}: {target!r}"
+                )
+            entries[self._fold(source)] = (source, target)
+        self.entries: List[Tuple[str, str]] = list(entries.values())
+        self._source_matcher = TermMatcher(list(entries))
+
+        # Entries sharing a translation share one target term
+        target_indices: Dict[str, int] = {}
+        self._target_of_entry = []
+        for _source, target in self.entries:
+            folded = self._fold(target)
+            self._target_of_entry.append(
+                target_indices.setdefault(folded, len(target_indices))
+            )
+        self._target_matcher = TermMatcher(list(target_indices))
+
+    def _fold(self, text: str) -> str:
+        return text if self.case_sensitive else fold_case(text)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def terms_in(self, text: str) -> List[Tuple[str, str]]:
+        """
+        Find the glossary entries used in a text.
+
+        Args:
+            text (str): A source text or chunk.
+
+        Returns:
+            List[Tuple[str, str]]: (source, target) entries, in order of first occurrence.
+        """
+
+        indices = dict.fromkeys(
+            index
+            for _start, _end, index in self._source_matcher.find(
+                self._fold(text)
+            )
+        )
+        return [self.entries[index] for index in indices]
+
+    def violations(
+        self, source_text: str, translation: str
+    ) -> List[Tuple[str, str]]:
+        """
+        Find the glossary entries used in a source text whose required translation is missing from
+        its translation.
+
+        Args:
+            source_text (str): The source text or chunk.
+            translation (str): Its translation.
+
+        Returns:
+            List[Tuple[str, str]]: (source, target) entries that were not followed.
+        """
+
+        used = {
+            index
+            for _start, _end, index in self._source_matcher.find(
+                self._fold(source_text)
+            )
+        }
+        if not used:
+            return []
+        present = {
+            index
+            for _start, _end, index in self._target_matcher.find(
+                self._fold(translation)
+            )
+        }
+        return [
+            self.entries[index]
+            for index in sorted(used)
+            if self._target_of_entry[index] not in present
+        ]
+
+
+def violations_reflection(
+    target_lang: str, violations: List[Tuple[str, str]]
+) -> str:
+    """
+    Describe glossary violations as suggestions for the improvement stage.
+
+    Args:
+        target_lang (str): The target language of the translation.
+        violations (List[Tuple[str, str]]): (source, target) entries from Glossary.violations.
+
+    Returns:
+        str: One suggestion per violated entry.
+    """
+
+    return "\n".join(
+        f'- The glossary requires "{source}" to be translated into {target_lang} as "{target}". '
+        f'Use "{target}" wherever the source text says "{source}".'
+        for source, target in violations
+    )
+
+
+class GlossaryGate(QualityGate):
+    """
+    A gate that checks glossary terms without a request.
+
+    An initial translation missing the required translation of a glossary term in its source fails,
+    and the missing terms become the reflection, so the improvement stage runs without a reflection
+    request. Otherwise the translation passes, skipping the reflect and improve stages, unless a
+    follow-up gate decides otherwise.
+
+    Args:
+        glossary (Glossary): The required terminology.
+        then (QualityGate, optional): Checked when no term is violated, for example a
+            ReflectionVerdictGate. If None, such translations pass.
+    """
+
+    def __init__(self, glossary: Glossary, then: Optional[QualityGate] = None):
+        super().__init__()
+        self.glossary = glossary
+        self.then = then
+
+    def check(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source_text: str,
+        translation_1: str,
+        country: str = "",
+    ) -> GateVerdict:
+        violations = self.glossary.violations(source_text, translation_1)
+        if violations:
+            return GateVerdict(
+                passed=False,
+                reflection=violations_reflection(target_lang, violations),
+            )
+        if self.then is None:
+            return GateVerdict(passed=True)
+        return self.then.check(
+            source_lang, target_lang, source_text, translation_1, country
+        )
+
+    async def acheck(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source_text: str,
+        translation_1: str,
+        country: str = "",
+    ) -> GateVerdict:
+        violations = self.glossary.violations(source_text, translation_1)
+        if violations:
+            return GateVerdict(
+                passed=False,
+                reflection=violations_reflection(target_lang, violations),
+            )
+        if self.then is None:
+            return GateVerdict(passed=True)
+        return await self.then.acheck(
+            source_lang, target_lang, source_text, translation_1, country
+        )
@@ -0,0 +1,341 @@
+import json
+import logging
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from .chunking import split_tokenized_text
+from .context import ContextPolicy
+from .context import NeighbourChunksContext
+from .tokenizer import TokenizedText
+from .utils import MAX_CONCURRENT_REQUESTS
+from .utils import MAX_TOKENS_PER_CHUNK
+from .utils import calculate_chunk_size
+from .utils import chunk_translation
+from .utils import map_concurrently
+from .utils import multichunk_translation
+from .utils import num_tokens_in_string
+from .utils import one_chunk_translate_text
+from .utils import split_text_into_chunks
+
+
+logger = logging.getLogger(__name__)
+
+ALIGNMENT_FORMAT_VERSION = 1
+
+
+@dataclass
+class TranslationAlignment:
+    """
+    A translation stored chunk by chunk, aligned with the source chunks it was produced from.
+
+    Saved alignments are the input of the next incremental run.
+
+    Attributes:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language of the translation.
+        country (str): Country specified for target language.
+        chunk_size (int): The token size used to split the source text.
+        source_chunks (List[str]): The source text divided into chunks.
+        translation_chunks (List[str]): The translation of each source chunk.
+        retranslated_chunks (List[int]): Indices of the chunks translated by the run that produced
+            this alignment.
+    """
+
+    source_lang: str
+    target_lang: str
+    country: str
+    chunk_size: int
+    source_chunks: List[str]
+    translation_chunks: List[str]
+    retranslated_chunks: List[int] = field(default_factory=list)
+
+    @property
+    def translation(self) -> str:
+        """The full translation, as translate would return it."""
+        return "".join(self.translation_chunks)
+
+    def save(self, path: str) -> None:
+        """
+        Write the alignment to a JSON file.
+
+        Args:
+            path (str): The path of the file to write.
+        """
+
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(
+                {"version": ALIGNMENT_FORMAT_VERSION, **asdict(self)},
+                file,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "TranslationAlignment":
+        """
+        Read an alignment written by save.
+
+        Args:
+            path (str): The path of the file to read.
+
+        Returns:
+            TranslationAlignment: The stored alignment.
+        """
+
+        with open(path, encoding="utf-8") as file:
+            data = json.load(file)
+
+        version = data.pop("version", None)
+        if version != ALIGNMENT_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported alignment format version: {version}"
+            )
+
+        return cls(**data)
+
+
+def translate_with_alignment(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    country: str = "",
+    max_tokens: int = MAX_TOKENS_PER_CHUNK,
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    context_policy: Optional[ContextPolicy] = None,
+) -> TranslationAlignment:
+    """
+    Translate a text like translate does, keeping the chunk-level alignment.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for translation.
+        source_text (str): The text to be translated.
+        country (str): Country specified for target language.
+        max_tokens (int): The maximum number of tokens per chunk.
+        max_workers (int): Maximum number of completion requests in flight at once.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context.
+
+    Returns:
+        TranslationAlignment: The translation and its alignment with the source chunks.
+    """
+
+    tokenized_text = TokenizedText(source_text)
+    num_tokens_in_text = len(tokenized_text)
+
+    if num_tokens_in_text < max_tokens:
+        source_chunks = [source_text]
+        chunk_size = max_tokens
+        translation_chunks = [
+            one_chunk_translate_text(
+                source_lang, target_lang, source_text, country
+            )
+        ]
+    else:
+        chunk_size = calculate_chunk_size(num_tokens_in_text, max_tokens)
+        source_chunks = split_tokenized_text(tokenized_text, chunk_size)
+        translation_chunks = multichunk_translation(
+            source_lang,
+            target_lang,
+            source_chunks,
+            country,
+            max_workers,
+            context_policy=context_policy,
+        )
+
+    return TranslationAlignment(
+        source_lang=source_lang,
+        target_lang=target_lang,
+        country=country,
+        chunk_size=chunk_size,
+        source_chunks=source_chunks,
+        translation_chunks=translation_chunks,
+        retranslated_chunks=list(range(len(source_chunks))),
+    )
+
+
+def align_chunks(
+    previous_chunks: List[str], source_text: str, chunk_size: int
+) -> List[Tuple[str, Optional[int]]]:
+    """
+    Split a new version of a text into chunks, reusing the previous chunks wherever they still occur.
+
+    Previous chunks are looked up in order in the new text. Every match becomes a chunk of its own,
+    so chunk boundaries stay put around an edit. The text between matches is new or edited and is
+    split into chunks of at most chunk_size tokens. No text is dropped, so the chunks join back into
+    source_text; text between matches that is only whitespace becomes a chunk of its own.
+
+    Args:
+        previous_chunks (List[str]): The chunks of the previous version of the text.
+        source_text (str): The new version of the text.
+        chunk_size (int): The maximum number of tokens per chunk for new text.
+
+    Returns:
+        List[Tuple[str, Optional[int]]]: The new chunks, each paired with the index of the previous
+            chunk it is identical to, or None if it is new.
+    """
+
+    aligned: List[Tuple[str, Optional[int]]] = []
+    cursor = 0
+
+    def add_new_text(text: str) -> None:
+        if not text:
+            return
+        if not text.strip() or num_tokens_in_string(text) <= chunk_size:
+            aligned.append((text, None))
+        else:
+            aligned.extend(
+                (chunk, None)
+                for chunk in split_text_into_chunks(text, chunk_size)
+            )
+
+    for previous_index, previous_chunk in enumerate(previous_chunks):
+        if not previous_chunk.strip():
+            continue
+        position = source_text.find(previous_chunk, cursor)
+        if position < 0:
+            continue
+        add_new_text(source_text[cursor:position])
+        aligned.append((previous_chunk, previous_index))
+        cursor = position + len(previous_chunk)
+
+    add_new_text(source_text[cursor:])
+
+    return aligned
+
+
+def deleted_chunk_positions(
+    previous_chunks: List[str], aligned: List[Tuple[str, Optional[int]]]
+) -> List[int]:
+    """
+    Find where previous chunks were deleted from the text.
+
+    Args:
+        previous_chunks (List[str]): The chunks of the previous version of the text.
+        aligned (List[Tuple[str, Optional[int]]]): The new chunks, as returned by align_chunks.
+
+    Returns:
+        List[int]: For every run of deleted chunks, the index in aligned of the chunk that now
+            follows it, or len(aligned) if the run was at the end of the text.
+    """
+
+    positions = []
+    expected = 0
+    for i, (_, previous_index) in enumerate(aligned):
+        if previous_index is None:
+            continue
+        if any(
+            chunk.strip() for chunk in previous_chunks[expected:previous_index]
+        ):
+            positions.append(i)
+        expected = previous_index + 1
+    if any(chunk.strip() for chunk in previous_chunks[expected:]):
+        positions.append(len(aligned))
+    return positions
+
+
+def incremental_translate(
+    previous: TranslationAlignment,
+    source_text: str,
+    neighbourhood: int = 1,
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    context_policy: Optional[ContextPolicy] = None,
+) -> TranslationAlignment:
+    """
+    Translate a new version of a text, re-running the pipeline only on the chunks that changed.
+
+    Args:
+        previous (TranslationAlignment): The alignment produced for the previous version of the text.
+        source_text (str): The new version of the text.
+        neighbourhood (int): Number of unchanged chunks on each side of a changed chunk to translate again,
+            because their context has changed.
+        max_workers (int): Maximum number of completion requests in flight at once.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context.
+            Defaults to NeighbourChunksContext(neighbourhood), which shows each chunk exactly the
+            neighbours whose changes cause it to be translated again. The prompts of the other chunks
+            then stay the same across edits, and so do their completion cache keys.
+
+    Returns:
+        TranslationAlignment: The alignment for the new version. Its retranslated_chunks lists the
+            chunks that went through the pipeline again.
+    """
+
+    if context_policy is None:
+        context_policy = NeighbourChunksContext(neighbourhood)
+
+    aligned = align_chunks(
+        previous.source_chunks, source_text, previous.chunk_size
+    )
+    source_chunks = [chunk for chunk, _ in aligned]
+    blank = {i for i, chunk in enumerate(source_chunks) if not chunk.strip()}
+
+    # Windows of chunks whose text or context changed: each new chunk with its neighbours, and the
+    # neighbours on both sides of every place where a previous chunk was deleted
+    windows = [
+        (i - neighbourhood, i + neighbourhood + 1)
+        for i, (_, previous_index) in enumerate(aligned)
+        if previous_index is None and i not in blank
+    ]
+    windows.extend(
+        (i - neighbourhood, i + neighbourhood)
+        for i in deleted_chunk_positions(previous.source_chunks, aligned)
+    )
+    retranslated = sorted(
+        {
+            j
+            for start, end in windows
+            for j in range(max(start, 0), min(end, len(aligned)))
+            if j not in blank
+        }
+    )
+
+    logger.info(
+        "Retranslating %d of %d chunks", len(retranslated), len(source_chunks)
+    )
+
+    # Whitespace between chunks is kept as it is, without a request
+    translation_chunks = [
+        previous.translation_chunks[previous_index]
+        if previous_index is not None
+        else chunk
+        if i in blank
+        else ""
+        for i, (chunk, previous_index) in enumerate(aligned)
+    ]
+
+    if len(source_chunks) - len(blank) == 1 and retranslated:
+        (i,) = retranslated
+        translation_chunks[i] = one_chunk_translate_text(
+            previous.source_lang,
+            previous.target_lang,
+            source_chunks[i],
+            previous.country,
+        )
+    else:
+        new_translations = map_concurrently(
+            lambda i: chunk_translation(
+                previous.source_lang,
+                previous.target_lang,
+                source_chunks,
+                i,
+                previous.country,
+                context_policy,
+            ),
+            retranslated,
+            max_workers,
+        )
+        for position, i in enumerate(retranslated):
+            translation_chunks[i] = new_translations[position]
+
+    return TranslationAlignment(
+        source_lang=previous.source_lang,
+        target_lang=previous.target_lang,
+        country=previous.country,
+        chunk_size=previous.chunk_size,
+        source_chunks=source_chunks,
+        translation_chunks=translation_chunks,
+        retranslated_chunks=retranslated,
+    )
@@ -0,0 +1,461 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from .context import ContextPolicy
+from .tokenizer import TokenizedText
+from .utils import MAX_CONCURRENT_REQUESTS
+from .utils import MAX_TOKENS_PER_CHUNK
+from .utils import chunk_improve_translation
+from .utils import chunk_initial_translation
+from .utils import chunk_reflect_on_translation
+from .utils import map_concurrently
+from .utils import one_chunk_improve_translation
+from .utils import one_chunk_initial_translation
+from .utils import one_chunk_reflect_on_translation
+from .utils import split_source_text
+
+
+logger = logging.getLogger(__name__)
+
+JOB_STAGES = ("translation_1", "reflection", "translation_2")
+
+PENDING = "pending"
+RUNNING = "running"
+PAUSED = "paused"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class JobStore:
+    """
+    SQLite store for translation jobs and the output of every stage of every chunk.
+
+    Outputs are committed as soon as they are saved, so a crashed or preempted job loses at most the
+    requests that were in flight. The store is safe to use from several threads.
+
+    Args:
+        path (str): Path of the SQLite database file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, source_lang TEXT NOT NULL, "
+            "target_lang TEXT NOT NULL, country TEXT NOT NULL, "
+            "source_hash TEXT NOT NULL, source_chunks TEXT NOT NULL, "
+            "status TEXT NOT NULL, translation TEXT, error TEXT, "
+            "created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS stage_outputs ("
+            "job_id TEXT NOT NULL, chunk_index INTEGER NOT NULL, "
+            "stage TEXT NOT NULL, output TEXT NOT NULL, "
+            "PRIMARY KEY (job_id, chunk_index, stage))"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def source_hash(source_text: str) -> str:
+        """Return the hex SHA-256 digest identifying a source text."""
+        return hashlib.sha256(source_text.encode("utf-8")).hexdigest()
+
+    def create_job(
+        self,
+        job_id: str,
+        source_lang: str,
+        target_lang: str,
+        country: str,
+        source_text: str,
+        source_chunks: List[str],
+    ) -> None:
+        """
+        Record a new job and its chunks.
+
+        Args:
+            job_id (str): The id of the job.
+            source_lang (str): The source language of the text.
+            target_lang (str): The target language for translation.
+            country (str): Country specified for target language.
+            source_text (str): The text to be translated.
+            source_chunks (List[str]): The source text divided into chunks.
+        """
+
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (job_id, source_lang, target_lang, country, "
+                "source_hash, source_chunks, status, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    source_lang,
+                    target_lang,
+                    country,
+                    self.source_hash(source_text),
+                    json.dumps(source_chunks, ensure_ascii=False),
+                    PENDING,
+                    now,
+                    now,
+                ),
+            )
+            self._db.commit()
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """
+        Look up a job.
+
+        Args:
+            job_id (str): The id of the job.
+
+        Returns:
+            Optional[dict]: The job's languages, country, source hash, chunks, status, translation and
+                error, or None if there is no such job.
+        """
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT source_lang, target_lang, country, source_hash, "
+                "source_chunks, status, translation, error "
+                "FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": job_id,
+            "source_lang": row[0],
+            "target_lang": row[1],
+            "country": row[2],
+            "source_hash": row[3],
+            "source_chunks": json.loads(row[4]),
+            "status": row[5],
+            "translation": row[6],
+            "error": row[7],
+        }
+
+    def set_status(
+        self,
+        job_id: str,
+        status: str,
+        translation: Optional[str] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """
+        Update the status of a job.
+
+        Args:
+            job_id (str): The id of the job.
+            status (str): The new status.
+            translation (str, optional): The final translation, for completed jobs.
+            error (str, optional): The error message, for failed jobs.
+        """
+
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, translation = ?, error = ?, "
+                "updated = ? WHERE job_id = ?",
+                (status, translation, error, time.time(), job_id),
+            )
+            self._db.commit()
+
+    def save_output(
+        self, job_id: str, chunk_index: int, stage: str, output: str
+    ) -> None:
+        """
+        Store the output of one stage of one chunk.
+
+        Args:
+            job_id (str): The id of the job.
+            chunk_index (int): The index of the chunk.
+            stage (str): One of JOB_STAGES.
+            output (str): The output of the stage.
+        """
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO stage_outputs "
+                "(job_id, chunk_index, stage, output) VALUES (?, ?, ?, ?)",
+                (job_id, chunk_index, stage, output),
+            )
+            self._db.commit()
+
+    def outputs(self, job_id: str) -> Dict[Tuple[int, str], str]:
+        """
+        Return every stored stage output of a job.
+
+        Args:
+            job_id (str): The id of the job.
+
+        Returns:
+            Dict[Tuple[int, str], str]: The outputs, keyed by chunk index and stage.
+        """
+
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT chunk_index, stage, output FROM stage_outputs "
+                "WHERE job_id = ?",
+                (job_id,),
+            ).fetchall()
+        return {
+            (chunk_index, stage): output for chunk_index, stage, output in rows
+        }
+
+    def delete_job(self, job_id: str) -> None:
+        """
+        Remove a job and its outputs.
+
+        Args:
+            job_id (str): The id of the job.
+        """
+
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM stage_outputs WHERE job_id = ?", (job_id,)
+            )
+            self._db.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            self._db.commit()
+
+    def close(self) -> None:
+        """Close the SQLite connection."""
+
+        with self._lock:
+            self._db.close()
+
+
+class _JobPausedError(Exception):
+    """Raised inside a running job to stop it at the next stage boundary."""
+
+
+class TranslationJob:
+    """
+    A translation that checkpoints every stage of every chunk, so that it can be paused and resumed.
+
+    Creating a job with an id that is already in the store resumes that job: finished stage outputs
+    are reused and only the missing ones are requested. The chunking of the first run is kept, so
+    resumed runs send the same prompts.
+
+    Args:
+        store (JobStore): The store holding the job.
+        job_id (str): The id of the job.
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for translation.
+        source_text (str): The text to be translated.
+        country (str): Country specified for target language.
+        max_tokens (int): The maximum number of tokens per chunk.
+        max_workers (int): Maximum number of completion requests in flight at once.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        job_id: str,
+        source_lang: str,
+        target_lang: str,
+        source_text: str,
+        country: str = "",
+        max_tokens: int = MAX_TOKENS_PER_CHUNK,
+        max_workers: int = MAX_CONCURRENT_REQUESTS,
+        context_policy: Optional[ContextPolicy] = None,
+    ):
+        self.store = store
+        self.job_id = job_id
+        self.max_workers = max_workers
+        self.context_policy = context_policy
+        self._pause_requested = threading.Event()
+
+        job = store.get_job(job_id)
+        if job is None:
+            tokenized_text = TokenizedText(source_text)
+            if len(tokenized_text) < max_tokens:
+                source_chunks = [source_text]
+            else:
+                source_chunks = split_source_text(tokenized_text, max_tokens)
+            store.create_job(
+                job_id,
+                source_lang,
+                target_lang,
+                country,
+                source_text,
+                source_chunks,
+            )
+            job = store.get_job(job_id)
+        elif job["source_hash"] != store.source_hash(source_text) or (
+            job["source_lang"],
+            job["target_lang"],
+            job["country"],
+        ) != (source_lang, target_lang, country):
+            raise ValueError(
+                f"Job {job_id} exists with a different text or languages"
+            )
+
+        self.source_lang = job["source_lang"]
+        self.target_lang = job["target_lang"]
+        self.country = job["country"]
+        self.source_chunks: List[str] = job["source_chunks"]
+
+    @property
+    def status(self) -> str:
+        """The stored status of the job."""
+        return self.store.get_job(self.job_id)["status"]
+
+    def progress(self) -> Dict[str, int]:
+        """
+        Report how much of the job is done.
+
+        Returns:
+            Dict[str, int]: The number of chunks, the number of finished chunks, and the number of
+                finished and total stage outputs.
+        """
+
+        outputs = self.store.outputs(self.job_id)
+        return {
+            "chunks": len(self.source_chunks),
+            "completed_chunks": sum(
+                (i, JOB_STAGES[-1]) in outputs
+                for i in range(len(self.source_chunks))
+            ),
+            "completed_stages": len(outputs),
+            "stages": len(self.source_chunks) * len(JOB_STAGES),
+        }
+
+    def pause(self) -> None:
+        """
+        Ask a running job to stop.
+
+        Requests already in flight finish and are saved; no new stage is started. run then returns
+        None and the job can be resumed later. Safe to call from another thread or a signal handler.
+        """
+
+        self._pause_requested.set()
+
+    def _run_stage(
+        self, chunk_index: int, stage: str, outputs: Dict[Tuple[int, str], str]
+    ) -> str:
+        stored = outputs.get((chunk_index, stage))
+        if stored is not None:
+            return stored
+        if self._pause_requested.is_set():
+            raise _JobPausedError
+
+        one_chunk = len(self.source_chunks) == 1
+        if stage == "translation_1":
+            if one_chunk:
+                output = one_chunk_initial_translation(
+                    self.source_lang, self.target_lang, self.source_chunks[0]
+                )
+            else:
+                output = chunk_initial_translation(
+                    self.source_lang,
+                    self.target_lang,
+                    self.source_chunks,
+                    chunk_index,
+                    self.context_policy,
+                )
+        elif stage == "reflection":
+            translation_1 = outputs[(chunk_index, "translation_1")]
+            if one_chunk:
+                output = one_chunk_reflect_on_translation(
+                    self.source_lang,
+                    self.target_lang,
+                    self.source_chunks[0],
+                    translation_1,
+                    self.country,
+                )
+            else:
+                output = chunk_reflect_on_translation(
+                    self.source_lang,
+                    self.target_lang,
+                    self.source_chunks,
+                    chunk_index,
+                    translation_1,
+                    self.country,
+                    self.context_policy,
+                )
+        else:
+            translation_1 = outputs[(chunk_index, "translation_1")]
+            reflection = outputs[(chunk_index, "reflection")]
+            if one_chunk:
+                output = one_chunk_improve_translation(
+                    self.source_lang,
+                    self.target_lang,
+                    self.source_chunks[0],
+                    translation_1,
+                    reflection,
+                )
+            else:
+                output = chunk_improve_translation(
+                    self.source_lang,
+                    self.target_lang,
+                    self.source_chunks,
+                    chunk_index,
+                    translation_1,
+                    reflection,
+                    self.context_policy,
+                )
+
+        self.store.save_output(self.job_id, chunk_index, stage, output)
+        return output
+
+    def _run_chunk(
+        self, chunk_index: int, outputs: Dict[Tuple[int, str], str]
+    ) -> Optional[str]:
+        chunk_outputs = {
+            key: value
+            for key, value in outputs.items()
+            if key[0] == chunk_index
+        }
+        try:
+            for stage in JOB_STAGES:
+                chunk_outputs[(chunk_index, stage)] = self._run_stage(
+                    chunk_index, stage, chunk_outputs
+                )
+        except _JobPausedError:
+            return None
+        return chunk_outputs[(chunk_index, JOB_STAGES[-1])]
+
+    def run(self) -> Optional[str]:
+        """
+        Run the job until it is finished or paused.
+
+        Returns:
+            Optional[str]: The translation, or None if the job was paused before it finished.
+        """
+
+        self._pause_requested.clear()
+        job = self.store.get_job(self.job_id)
+        if job["status"] == COMPLETED:
+            return job["translation"]
+
+        self.store.set_status(self.job_id, RUNNING)
+        outputs = self.store.outputs(self.job_id)
+        logger.info("Job %s progress: %s", self.job_id, self.progress())
+
+        try:
+            translation_2_chunks = map_concurrently(
+                lambda i: self._run_chunk(i, outputs),
+                list(range(len(self.source_chunks))),
+                self.max_workers,
+            )
+        except Exception as error:
+            self.store.set_status(self.job_id, FAILED, error=str(error))
+            raise
+
+        if any(chunk is None for chunk in translation_2_chunks):
+            self.store.set_status(self.job_id, PAUSED)
+            return None
+
+        translation = "".join(translation_2_chunks)
+        self.store.set_status(self.job_id, COMPLETED, translation=translation)
+        return translation
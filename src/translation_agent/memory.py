@@ -0,0 +1,394 @@
+import hashlib
+import re
+import sqlite3
+import struct
+import threading
+import time
+import unicodedata
+import zlib
+from dataclasses import dataclass
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+
+# Bins of the one-permutation MinHash signature of a segment
+NUM_BINS = 48
+# Signature bins per LSH band. Two segments are candidates if all bins of any band agree.
+ROWS_PER_BAND = 3
+SHINGLE_WORDS = 3  # words per shingle
+MAX_CANDIDATES = 20  # candidates verified per fuzzy lookup
+
+_WHITESPACE = re.compile(r"\s+")
+_WORDS = re.compile(r"\w+")
+_EMPTY_BIN = 0xFFFFFFFF
+
+
+@dataclass
+class TranslationMatch:
+    """
+    A segment from the translation memory that resembles the one being translated.
+
+    Attributes:
+        source_text (str): The stored source segment.
+        translation (str): Its stored translation.
+        similarity (float): Jaccard similarity of the word shingles of the two source segments.
+    """
+
+    source_text: str
+    translation: str
+    similarity: float
+
+
+def normalize_segment(text: str) -> str:
+    """Normalize a segment for exact lookup: NFC Unicode, collapsed whitespace and no padding."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def segment_hash(text: str) -> str:
+    """The hex SHA-256 digest of the normalized segment."""
+    return hashlib.sha256(normalize_segment(text).encode("utf-8")).hexdigest()
+
+
+def shingles(text: str) -> Set[int]:
+    """
+    Hash the overlapping word n-grams of a segment, case-insensitively.
+
+    Args:
+        text (str): The segment.
+
+    Returns:
+        Set[int]: The CRC-32 of every run of SHINGLE_WORDS words, or of the whole segment if it is
+            shorter. Stable across processes, unlike hash().
+    """
+
+    words = _WORDS.findall(normalize_segment(text).lower())
+    size = min(SHINGLE_WORDS, len(words))
+    return {
+        zlib.crc32(" ".join(words[i : i + size]).encode("utf-8"))
+        for i in range(len(words) - size + 1)
+    }
+
+
+def minhash_signature(hashes: Set[int]) -> List[int]:
+    """
+    Compute the one-permutation MinHash signature of a set of shingle hashes.
+
+    Each hash is mixed once and falls into one of NUM_BINS bins, which keep their minimum, so the
+    signature costs one pass over the shingles instead of one per permutation. Empty bins borrow
+    the value of the next non-empty bin, so short segments still get comparable signatures.
+
+    Args:
+        hashes (Set[int]): The shingle hashes from shingles.
+
+    Returns:
+        List[int]: NUM_BINS values, all _EMPTY_BIN for an empty set.
+    """
+
+    bins = [_EMPTY_BIN] * NUM_BINS
+    for value in hashes:
+        # Multiplicative hashing spreads CRC-32 values over the bins and within them
+        mixed = (value * 0x9E3779B1) & 0xFFFFFFFF
+        index = mixed % NUM_BINS
+        bins[index] = min(bins[index], mixed)
+    if not hashes:
+        return bins
+
+    signature = list(bins)
+    for i in range(NUM_BINS):
+        offset = 1
+        while signature[i] == _EMPTY_BIN:
+            borrowed = bins[(i + offset) % NUM_BINS]
+            if borrowed != _EMPTY_BIN:
+                signature[i] = (borrowed + offset) & 0xFFFFFFFF
+            offset += 1
+    return signature
+
+
+def band_keys(signature: List[int]) -> List[int]:
+    """
+    Compute the LSH bucket of every band of a signature.
+
+    Args:
+        signature (List[int]): A signature from minhash_signature.
+
+    Returns:
+        List[int]: One integer per band, unique across bands, for an indexed equality lookup.
+    """
+
+    keys = []
+    for band, start in enumerate(range(0, NUM_BINS, ROWS_PER_BAND)):
+        rows = struct.pack(
+            f"<{ROWS_PER_BAND}I", *signature[start : start + ROWS_PER_BAND]
+        )
+        keys.append((band << 32) | zlib.crc32(rows))
+    return keys
+
+
+def _jaccard(a: Set[int], b: Set[int]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class TranslationMemory:
+    """
+    Persistent store of translated segments with exact and fuzzy lookup.
+
+    Segments are stored per language pair and country in SQLite, keyed by the hash of the
+    normalized source text. Exact lookups are one primary-key query. Fuzzy lookups find candidates
+    through MinHash LSH band keys kept in an indexed table, and rank them by the Jaccard similarity
+    of their word shingles. Both query an index, so they typically stay under a millisecond with
+    millions of segments.
+    Safe to use from several threads.
+
+    Args:
+        path (str, optional): Path of the SQLite database file. If None, the memory lives in memory only.
+        min_similarity (float): The lowest similarity returned by fuzzy lookups.
+        max_references (int): The maximum number of fuzzy matches returned by references.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        min_similarity: float = 0.5,
+        max_references: int = 2,
+    ):
+        self.path = path
+        self.min_similarity = min_similarity
+        self.max_references = max_references
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path if path is not None else ":memory:", check_same_thread=False
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS segments ("
+            "pair TEXT NOT NULL, hash TEXT NOT NULL, source TEXT NOT NULL, "
+            "target TEXT NOT NULL, created REAL NOT NULL, "
+            "PRIMARY KEY (pair, hash))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS segment_bands ("
+            "pair TEXT NOT NULL, band_key INTEGER NOT NULL, hash TEXT NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS segment_bands_key "
+            "ON segment_bands (pair, band_key)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def pair_key(source_lang: str, target_lang: str, country: str = "") -> str:
+        """The key of a language pair and target country."""
+        return "\t".join(
+            part.strip().lower()
+            for part in (source_lang, target_lang, country)
+        )
+
+    def add(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source_text: str,
+        translation: str,
+        country: str = "",
+    ) -> None:
+        """
+        Store the translation of a segment, replacing an earlier translation of the same segment.
+
+        Args:
+            source_lang (str): The source language.
+            target_lang (str): The target language.
+            source_text (str): The source segment.
+            translation (str): Its translation.
+            country (str): Country specified for the target language.
+        """
+
+        self.add_many(
+            source_lang, target_lang, [(source_text, translation)], country
+        )
+
+    def add_many(
+        self,
+        source_lang: str,
+        target_lang: str,
+        segments: Iterable[Tuple[str, str]],
+        country: str = "",
+    ) -> int:
+        """
+        Store the translations of many segments in one transaction, for example to import an
+        existing translation memory.
+
+        Args:
+            source_lang (str): The source language.
+            target_lang (str): The target language.
+            segments (Iterable[Tuple[str, str]]): (source, translation) pairs.
+            country (str): Country specified for the target language.
+
+        Returns:
+            int: The number of segments stored.
+        """
+
+        pair = self.pair_key(source_lang, target_lang, country)
+        now = time.time()
+        count = 0
+        with self._lock, self._db:
+            for source_text, translation in segments:
+                digest = segment_hash(source_text)
+                # Equal hashes mean equal normalized texts, so a stored segment's bands are current
+                known = self._db.execute(
+                    "SELECT 1 FROM segments WHERE pair = ? AND hash = ?",
+                    (pair, digest),
+                ).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO segments "
+                    "(pair, hash, source, target, created) VALUES (?, ?, ?, ?, ?)",
+                    (pair, digest, source_text, translation, now),
+                )
+                if known is None:
+                    self._db.executemany(
+                        "INSERT INTO segment_bands (pair, band_key, hash) "
+                        "VALUES (?, ?, ?)",
+                        [
+                            (pair, key, digest)
+                            for key in band_keys(
+                                minhash_signature(shingles(source_text))
+                            )
+                        ],
+                    )
+                count += 1
+        return count
+
+    def lookup(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source_text: str,
+        country: str = "",
+    ) -> Optional[str]:
+        """
+        Find the stored translation of the same segment, ignoring whitespace differences.
+
+        Args:
+            source_lang (str): The source language.
+            target_lang (str): The target language.
+            source_text (str): The segment to translate.
+            country (str): Country specified for the target language.
+
+        Returns:
+            Optional[str]: The stored translation, or None.
+        """
+
+        pair = self.pair_key(source_lang, target_lang, country)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT target FROM segments WHERE pair = ? AND hash = ?",
+                (pair, segment_hash(source_text)),
+            ).fetchone()
+            if row is not None:
+                self.exact_hits += 1
+                return row[0]
+            return None
+
+    def fuzzy_matches(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source_text: str,
+        country: str = "",
+        limit: Optional[int] = None,
+    ) -> List[TranslationMatch]:
+        """
+        Find stored segments similar to a segment, most similar first.
+
+        Args:
+            source_lang (str): The source language.
+            target_lang (str): The target language.
+            source_text (str): The segment to translate.
+            country (str): Country specified for the target language.
+            limit (int, optional): The maximum number of matches. Defaults to max_references.
+
+        Returns:
+            List[TranslationMatch]: Matches with at least min_similarity, excluding the segment itself.
+        """
+
+        pair = self.pair_key(source_lang, target_lang, country)
+        digest = segment_hash(source_text)
+        query = shingles(source_text)
+        keys = band_keys(minhash_signature(query))
+        placeholders = ", ".join("?" * len(keys))
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT segments.source, segments.target FROM ("
+                "SELECT hash, COUNT(*) AS bands FROM segment_bands "
+                f"WHERE pair = ? AND band_key IN ({placeholders}) AND hash != ? "
+                "GROUP BY hash ORDER BY bands DESC LIMIT ?) AS candidates "
+                "JOIN segments ON segments.pair = ? AND segments.hash = candidates.hash",
+                (pair, *keys, digest, MAX_CANDIDATES, pair),
+            ).fetchall()
+
+        matches = []
+        for source, target in rows:
+            similarity = _jaccard(query, shingles(source))
+            if similarity >= self.min_similarity:
+                matches.append(TranslationMatch(source, target, similarity))
+        matches.sort(key=lambda match: match.similarity, reverse=True)
+        return matches[: self.max_references if limit is None else limit]
+
+    def references(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source_text: str,
+        country: str = "",
+    ) -> List[Tuple[str, str]]:
+        """
+        Find reference translations for a segment that has no exact match.
+
+        Args:
+            source_lang (str): The source language.
+            target_lang (str): The target language.
+            source_text (str): The segment to translate.
+            country (str): Country specified for the target language.
+
+        Returns:
+            List[Tuple[str, str]]: (source, translation) pairs of the best fuzzy matches, for the
+                references argument of the initial translation prompts.
+        """
+
+        matches = self.fuzzy_matches(
+            source_lang, target_lang, source_text, country
+        )
+        with self._lock:
+            if matches:
+                self.fuzzy_hits += 1
+            else:
+                self.misses += 1
+        return [(match.source_text, match.translation) for match in matches]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM segments"
+            ).fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Report memory usage.
+
+        Returns:
+            Dict[str, int]: Exact hits, fuzzy hits, misses and the number of stored segments.
+        """
+
+        return {
+            "exact_hits": self.exact_hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "segments": len(self),
+        }
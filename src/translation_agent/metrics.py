@@ -0,0 +1,396 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict
+from dataclasses import dataclass
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Protocol
+from typing import Tuple
+
+
+# USD per million prompt and completion tokens, used for cost estimates. Pass prices to
+# routing.ModelRouter for other models or updated prices.
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-3.5-turbo": (0.5, 1.5),
+}
+
+
+def cached_prompt_tokens(usage: object) -> int:
+    """
+    Read the number of prompt tokens served from the provider's prompt cache.
+
+    Args:
+        usage (object): The usage attribute of a chat completion response.
+
+    Returns:
+        int: usage.prompt_tokens_details.cached_tokens, or 0 if the server did not report it.
+    """
+
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None)
+    return cached_tokens if isinstance(cached_tokens, int) else 0
+
+
+@dataclass
+class CallRecord:
+    """
+    Measurements of one completion request.
+
+    Attributes:
+        model (str): The model requested.
+        stage (str, optional): The pipeline stage, such as "initial", "reflect" or "improve".
+        chunk_index (int, optional): The index of the chunk, or None outside the multichunk pipeline.
+        prompt_tokens (int): Tokens in the request, as reported by the server.
+        completion_tokens (int): Tokens in the completion.
+        cached_tokens (int): Prompt tokens served from the provider's prompt cache.
+        queue_seconds (float): Time spent waiting for the rate limiter and on failed attempts before the
+            request that succeeded was sent.
+        latency_seconds (float): Time from sending the successful request to its response.
+        cache_hit (bool): Whether the completion came from the completion cache, without a request.
+        error (str, optional): The exception type, if the call failed.
+        cost_usd (float): The estimated cost, with the prices of the ModelRouter of the stage or else
+            MODEL_PRICES. 0 for unknown models.
+    """
+
+    model: str
+    stage: Optional[str] = None
+    chunk_index: Optional[int] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    queue_seconds: float = 0.0
+    latency_seconds: float = 0.0
+    cache_hit: bool = False
+    error: Optional[str] = None
+    cost_usd: float = 0.0
+
+    @property
+    def wall_seconds(self) -> float:
+        """The total time of the call."""
+        return self.queue_seconds + self.latency_seconds
+
+
+class Span(Protocol):
+    """The part of the OpenTelemetry span interface used for completion calls."""
+
+    def set_attribute(self, key: str, value: object) -> None: ...
+
+    def end(self) -> None: ...
+
+
+class Tracer(Protocol):
+    """
+    The part of the OpenTelemetry tracer interface used for completion calls.
+
+    An opentelemetry.trace.Tracer can be installed with set_tracer as it is.
+    """
+
+    def start_span(
+        self, name: str, attributes: Optional[Dict[str, object]] = None
+    ) -> Span: ...
+
+
+SPAN_NAME = "translation_agent.completion"
+
+_callbacks: List[Callable[[CallRecord], None]] = []
+_tracer: Optional[Tracer] = None
+_lock = threading.Lock()
+
+# Stage and chunk labels of the calls made in the current thread or task
+_labels: ContextVar[Tuple[Optional[str], Optional[int]]] = ContextVar(
+    "call_labels", default=(None, None)
+)
+# Prices, by model, of the calls made in the current thread or task
+_prices: ContextVar[Dict[str, Tuple[float, float]]] = ContextVar(
+    "call_prices", default=MODEL_PRICES
+)
+# Collectors of the collect_metrics contexts enclosing the current thread or task
+_collectors: ContextVar[Tuple["MetricsCollector", ...]] = ContextVar(
+    "metrics_collectors", default=()
+)
+
+
+def add_callback(callback: Callable[[CallRecord], None]) -> None:
+    """
+    Call a function with the CallRecord of every completion request in the process.
+
+    Callbacks run in the thread that made the request and must be thread-safe.
+
+    Args:
+        callback (Callable[[CallRecord], None]): The function to call.
+    """
+
+    with _lock:
+        _callbacks.append(callback)
+
+
+def remove_callback(callback: Callable[[CallRecord], None]) -> None:
+    """Stop calling a function added with add_callback."""
+
+    with _lock:
+        _callbacks.remove(callback)
+
+
+def set_tracer(tracer: Optional[Tracer]) -> None:
+    """
+    Open a span for every completion request with a tracer.
+
+    Args:
+        tracer (Tracer, optional): The tracer, for example opentelemetry.trace.get_tracer(__name__),
+            or None to stop tracing.
+    """
+
+    global _tracer
+    _tracer = tracer
+
+
+@contextmanager
+def call_labels(
+    stage: Optional[str] = None, chunk_index: Optional[int] = None
+) -> Iterator[None]:
+    """
+    Label the completion requests made in this context with a stage and chunk index.
+
+    Args:
+        stage (str, optional): The pipeline stage.
+        chunk_index (int, optional): The index of the chunk.
+    """
+
+    token = _labels.set((stage, chunk_index))
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+@contextmanager
+def call_prices(prices: Dict[str, Tuple[float, float]]) -> Iterator[None]:
+    """
+    Estimate the cost of the completion requests made in this context with a price table.
+
+    Args:
+        prices (Dict[str, Tuple[float, float]]): USD per million prompt and completion tokens, by model.
+    """
+
+    token = _prices.set(prices)
+    try:
+        yield
+    finally:
+        _prices.reset(token)
+
+
+class CallTimer:
+    """
+    Measures one completion call and reports it to the callbacks, tracer and collector.
+
+    Args:
+        model (str): The model requested.
+    """
+
+    def __init__(self, model: str):
+        stage, chunk_index = _labels.get()
+        self.record = CallRecord(
+            model=model, stage=stage, chunk_index=chunk_index
+        )
+        self.prices = _prices.get()
+        self.started = time.perf_counter()
+        self.sent = self.started
+        self.span = None
+        if _tracer is not None:
+            self.span = _tracer.start_span(
+                SPAN_NAME,
+                attributes={
+                    key: value
+                    for key, value in (
+                        ("model", model),
+                        ("stage", self.record.stage),
+                        ("chunk_index", self.record.chunk_index),
+                    )
+                    if value is not None
+                },
+            )
+
+    def sending(self) -> None:
+        """Mark the start of an attempt. The last attempt is the one that counts as latency."""
+        self.sent = time.perf_counter()
+
+    def finish(
+        self,
+        usage: object = None,
+        cache_hit: bool = False,
+        error: Optional[BaseException] = None,
+    ) -> CallRecord:
+        """
+        Complete the record and report it.
+
+        Args:
+            usage (object): The usage of the response, if any.
+            cache_hit (bool): Whether the completion came from the completion cache.
+            error (BaseException, optional): The exception that ended the call, if any.
+
+        Returns:
+            CallRecord: The record.
+        """
+
+        ended = time.perf_counter()
+        record = self.record
+        record.queue_seconds = self.sent - self.started
+        record.latency_seconds = ended - self.sent
+        record.cache_hit = cache_hit
+        record.error = type(error).__name__ if error is not None else None
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        if isinstance(prompt_tokens, int) and isinstance(
+            completion_tokens, int
+        ):
+            record.prompt_tokens = prompt_tokens
+            record.completion_tokens = completion_tokens
+            record.cached_tokens = cached_prompt_tokens(usage)
+            prompt_price, completion_price = self.prices.get(
+                record.model, (0.0, 0.0)
+            )
+            record.cost_usd = (
+                prompt_tokens * prompt_price
+                + completion_tokens * completion_price
+            ) / 1e6
+
+        if self.span is not None:
+            for key in (
+                "prompt_tokens",
+                "completion_tokens",
+                "cached_tokens",
+                "queue_seconds",
+                "latency_seconds",
+                "cache_hit",
+            ):
+                self.span.set_attribute(key, getattr(record, key))
+            if record.error is not None:
+                self.span.set_attribute("error", record.error)
+            self.span.end()
+
+        for collector in _collectors.get():
+            collector.add(record)
+        with _lock:
+            callbacks = list(_callbacks)
+        for callback in callbacks:
+            callback(record)
+        return record
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _totals(records: List[CallRecord]) -> Dict[str, float]:
+    return {
+        "calls": len(records),
+        "errors": sum(record.error is not None for record in records),
+        "cache_hits": sum(record.cache_hit for record in records),
+        "prompt_tokens": sum(record.prompt_tokens for record in records),
+        "completion_tokens": sum(
+            record.completion_tokens for record in records
+        ),
+        "cached_tokens": sum(record.cached_tokens for record in records),
+        "queue_seconds": sum(record.queue_seconds for record in records),
+        "latency_seconds": sum(record.latency_seconds for record in records),
+        "cost_usd": sum(record.cost_usd for record in records),
+    }
+
+
+class MetricsCollector:
+    """Collects the CallRecords of the completion requests made inside collect_metrics."""
+
+    def __init__(self):
+        self.records: List[CallRecord] = []
+        self.started = time.perf_counter()
+        self.ended: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def add(self, record: CallRecord) -> None:
+        """Add a record."""
+
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self) -> Dict[str, object]:
+        """
+        Summarize the collected calls.
+
+        Returns:
+            Dict[str, object]: The wall time of the collection, the totals of every call, latency
+                percentiles, and the totals per stage and per model.
+        """
+
+        with self._lock:
+            records = list(self.records)
+        ended = self.ended if self.ended is not None else time.perf_counter()
+        latencies = [
+            record.latency_seconds
+            for record in records
+            if not record.cache_hit
+        ]
+
+        def grouped(key: str) -> Dict[str, Dict[str, float]]:
+            groups: Dict[str, List[CallRecord]] = {}
+            for record in records:
+                groups.setdefault(str(getattr(record, key)), []).append(record)
+            return {name: _totals(group) for name, group in groups.items()}
+
+        return {
+            "wall_seconds": ended - self.started,
+            **_totals(records),
+            "latency_p50_seconds": _percentile(latencies, 0.5),
+            "latency_p95_seconds": _percentile(latencies, 0.95),
+            "stages": grouped("stage"),
+            "models": grouped("model"),
+        }
+
+    def to_json(self, include_calls: bool = False) -> str:
+        """
+        Serialize the summary as JSON.
+
+        Args:
+            include_calls (bool): Whether to add every CallRecord under "call_records".
+
+        Returns:
+            str: The JSON document.
+        """
+
+        summary = self.summary()
+        if include_calls:
+            with self._lock:
+                summary["call_records"] = [
+                    asdict(record) for record in self.records
+                ]
+        return json.dumps(summary, indent=2)
+
+
+@contextmanager
+def collect_metrics() -> Iterator[MetricsCollector]:
+    """
+    Collect the CallRecords of the completion requests made in this context, including from the
+    pipeline's worker threads and tasks.
+
+    Yields:
+        MetricsCollector: The collector, whose summary covers the calls made until the context exits.
+    """
+
+    collector = MetricsCollector()
+    token = _collectors.set((*_collectors.get(), collector))
+    try:
+        yield collector
+    finally:
+        _collectors.reset(token)
+        collector.ended = time.perf_counter()
@@ -0,0 +1,409 @@
+import json
+import logging
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from .tokenizer import count_tokens
+from .utils import MAX_CONCURRENT_REQUESTS
+from .utils import MAX_TOKENS_PER_CHUNK
+from .utils import get_completion
+from .utils import map_concurrently
+from .utils import one_chunk_improve_translation
+from .utils import one_chunk_initial_translation
+from .utils import one_chunk_reflect_on_translation
+from .utils import one_chunk_translate_text
+from .utils import translate
+
+
+logger = logging.getLogger(__name__)
+
+# Source tokens per packed prompt. The improved translations of a pack must fit in one response.
+MAX_PACK_TOKENS = 1000
+MAX_PACK_ITEMS = 50  # texts per packed prompt
+
+
+def pack_texts(
+    texts: List[str],
+    max_pack_tokens: int = MAX_PACK_TOKENS,
+    max_pack_items: int = MAX_PACK_ITEMS,
+) -> List[List[int]]:
+    """
+    Group texts into packs that fit a token budget, keeping their order.
+
+    Args:
+        texts (List[str]): The texts to pack.
+        max_pack_tokens (int): The maximum number of source tokens in one pack. A text that is longer on
+            its own gets a pack of its own.
+        max_pack_items (int): The maximum number of texts in one pack.
+
+    Returns:
+        List[List[int]]: The indices of the texts in each pack.
+    """
+
+    packs: List[List[int]] = []
+    pack: List[int] = []
+    pack_tokens = 0
+    for i, text in enumerate(texts):
+        num_tokens = count_tokens(text)
+        if pack and (
+            pack_tokens + num_tokens > max_pack_tokens
+            or len(pack) >= max_pack_items
+        ):
+            packs.append(pack)
+            pack, pack_tokens = [], 0
+        pack.append(i)
+        pack_tokens += num_tokens
+    if pack:
+        packs.append(pack)
+    return packs
+
+
+def _to_json(items: Dict[str, object]) -> str:
+    return json.dumps(items, ensure_ascii=False, indent=2)
+
+
+def packed_initial_translation_prompt(
+    source_lang: str, target_lang: str, source_texts: Dict[str, str]
+) -> Tuple[str, str]:
+    """
+    Build the system message and prompt for translating several independent texts in one completion.
+
+    Args:
+        source_lang (str): The source language of the texts.
+        target_lang (str): The target language for the translation.
+        source_texts (Dict[str, str]): The texts to translate, keyed by id.
+
+    Returns:
+        Tuple[str, str]: The system message and the prompt.
+    """
+
+    system_message = f"You are an expert linguist, specializing in translation from {source_lang} to {target_lang}."
+
+    prompt = f"""This is an {source_lang} to {target_lang} translation of several independent texts. \
+The texts are given as a JSON object that maps an id to each {source_lang} text:
+
+{_to_json(source_texts)}
+
+Translate every text into {target_lang}, on its own. \
+Respond with a JSON object that maps each id to the {target_lang} translation of its text, and nothing else."""
+
+    return system_message, prompt
+
+
+def packed_reflect_on_translation_prompt(
+    source_lang: str,
+    target_lang: str,
+    source_texts: Dict[str, str],
+    translation_1: Dict[str, str],
+    country: str = "",
+) -> Tuple[str, str]:
+    """
+    Build the system message and prompt for reflecting on several translations in one completion.
+
+    Args:
+        source_lang (str): The source language of the texts.
+        target_lang (str): The target language of the translations.
+        source_texts (Dict[str, str]): The original texts, keyed by id.
+        translation_1 (Dict[str, str]): The initial translation of each text, keyed by id.
+        country (str): Country specified for the target language.
+
+    Returns:
+        Tuple[str, str]: The system message and the prompt.
+    """
+
+    system_message = f"You are an expert linguist specializing in translation from {source_lang} to {target_lang}. \
+You will be provided with several source texts and their translations and your goal is to improve the translations."
+
+    items = {
+        item_id: {
+            "source_text": source_text,
+            "translation": translation_1[item_id],
+        }
+        for item_id, source_text in source_texts.items()
+    }
+
+    style = (
+        f"The final style and tone of the translations should match the style of {target_lang} colloquially spoken in {country}.\n\n"
+        if country != ""
+        else ""
+    )
+
+    prompt = f"""Your task is to carefully read several independent source texts and their translations from {source_lang} to {target_lang}, \
+and then give constructive criticism and helpful suggestions to improve each translation. {style}\
+The texts are given as a JSON object that maps an id to each source text and its initial translation:
+
+{_to_json(items)}
+
+When writing suggestions, pay attention to whether there are ways to improve each translation's
+(i) accuracy (by correcting errors of addition, mistranslation, omission, or untranslated text),
+(ii) fluency (by applying {target_lang} grammar, spelling and punctuation rules, and ensuring there are no unnecessary repetitions),
+(iii) style (by ensuring the translations reflect the style of the source text and take into account any cultural context),
+(iv) terminology (by ensuring terminology use is consistent and reflects the source text domain; and by only ensuring you use equivalent idioms {target_lang}).
+
+Respond with a JSON object that maps each id to a single string listing the specific, helpful and constructive suggestions \
+for improving its translation, and nothing else."""
+
+    return system_message, prompt
+
+
+def packed_improve_translation_prompt(
+    source_lang: str,
+    target_lang: str,
+    source_texts: Dict[str, str],
+    translation_1: Dict[str, str],
+    reflection: Dict[str, str],
+) -> Tuple[str, str]:
+    """
+    Build the system message and prompt for improving several translations in one completion.
+
+    Args:
+        source_lang (str): The source language of the texts.
+        target_lang (str): The target language of the translations.
+        source_texts (Dict[str, str]): The original texts, keyed by id.
+        translation_1 (Dict[str, str]): The initial translation of each text, keyed by id.
+        reflection (Dict[str, str]): Expert suggestions for each translation, keyed by id.
+
+    Returns:
+        Tuple[str, str]: The system message and the prompt.
+    """
+
+    system_message = f"You are an expert linguist, specializing in translation editing from {source_lang} to {target_lang}."
+
+    items = {
+        item_id: {
+            "source_text": source_text,
+            "translation": translation_1[item_id],
+            "expert_suggestions": reflection[item_id],
+        }
+        for item_id, source_text in source_texts.items()
+    }
+
+    prompt = f"""Your task is to carefully read, then edit, several independent translations from {source_lang} to {target_lang}, taking into
+account lists of expert suggestions and constructive criticisms.
+
+The texts are given as a JSON object that maps an id to each source text, its initial translation and the expert suggestions for it:
+
+{_to_json(items)}
+
+Please take into account the expert suggestions when editing each translation. Edit each translation by ensuring:
+
+(i) accuracy (by correcting errors of addition, mistranslation, omission, or untranslated text),
+(ii) fluency (by applying {target_lang} grammar, spelling and punctuation rules and ensuring there are no unnecessary repetitions), \
+(iii) style (by ensuring the translations reflect the style of the source text)
+(iv) terminology (inappropriate for context, inconsistent use), or
+(v) other errors.
+
+Respond with a JSON object that maps each id to its new translation, and nothing else."""
+
+    return system_message, prompt
+
+
+def parse_packed_completion(completion: str, ids: List[str]) -> Dict[str, str]:
+    """
+    Read the per-text outputs from a packed JSON completion.
+
+    Args:
+        completion (str): The completion, expected to be a JSON object keyed by id.
+        ids (List[str]): The ids that were sent.
+
+    Returns:
+        Dict[str, str]: The output of every id that came back as a string. Ids that are missing or
+            malformed are left out, as is everything if the completion is not a JSON object.
+    """
+
+    try:
+        outputs = json.loads(completion)
+    except (TypeError, ValueError):
+        return {}
+    if not isinstance(outputs, dict):
+        return {}
+    return {
+        item_id: outputs[item_id]
+        for item_id in ids
+        if isinstance(outputs.get(item_id), str)
+    }
+
+
+def run_packed_stage(
+    system_message: str,
+    prompt: str,
+    ids: List[str],
+    fallback: Callable[[str], str],
+) -> Dict[str, str]:
+    """
+    Run one stage for a pack of texts, falling back to one completion per text where parsing fails.
+
+    Args:
+        system_message (str): The system message of the packed prompt.
+        prompt (str): The packed prompt.
+        ids (List[str]): The ids of the texts in the pack.
+        fallback (Callable[[str], str]): Runs the stage for one id with a regular one-chunk call.
+
+    Returns:
+        Dict[str, str]: The output of the stage for every id.
+    """
+
+    outputs = parse_packed_completion(
+        get_completion(prompt, system_message=system_message, json_mode=True),
+        ids,
+    )
+
+    missing = [item_id for item_id in ids if item_id not in outputs]
+    if missing:
+        logger.warning(
+            "%d packed outputs are missing, translating them one by one",
+            len(missing),
+        )
+        for item_id in missing:
+            outputs[item_id] = fallback(item_id)
+
+    return outputs
+
+
+def packed_translate_text(
+    source_lang: str,
+    target_lang: str,
+    source_texts: List[str],
+    country: str = "",
+) -> List[str]:
+    """
+    Translate several short texts with one completion per stage.
+
+    Args:
+        source_lang (str): The source language of the texts.
+        target_lang (str): The target language for the translation.
+        source_texts (List[str]): The texts to translate.
+        country (str): Country specified for target language.
+
+    Returns:
+        List[str]: The improved translation of each text, in the same order.
+    """
+
+    if len(source_texts) == 1:
+        return [
+            one_chunk_translate_text(
+                source_lang, target_lang, source_texts[0], country
+            )
+        ]
+
+    ids = [str(i) for i in range(len(source_texts))]
+    texts = {str(i): text for i, text in enumerate(source_texts)}
+
+    translation_1 = run_packed_stage(
+        *packed_initial_translation_prompt(source_lang, target_lang, texts),
+        ids,
+        lambda item_id: one_chunk_initial_translation(
+            source_lang, target_lang, texts[item_id]
+        ),
+    )
+
+    reflection = run_packed_stage(
+        *packed_reflect_on_translation_prompt(
+            source_lang, target_lang, texts, translation_1, country
+        ),
+        ids,
+        lambda item_id: one_chunk_reflect_on_translation(
+            source_lang,
+            target_lang,
+            texts[item_id],
+            translation_1[item_id],
+            country,
+        ),
+    )
+
+    translation_2 = run_packed_stage(
+        *packed_improve_translation_prompt(
+            source_lang, target_lang, texts, translation_1, reflection
+        ),
+        ids,
+        lambda item_id: one_chunk_improve_translation(
+            source_lang,
+            target_lang,
+            texts[item_id],
+            translation_1[item_id],
+            reflection[item_id],
+        ),
+    )
+
+    return [translation_2[item_id] for item_id in ids]
+
+
+def translate_many(
+    source_lang: str,
+    target_lang: str,
+    source_texts: List[str],
+    country: str = "",
+    max_tokens: int = MAX_TOKENS_PER_CHUNK,
+    max_pack_tokens: int = MAX_PACK_TOKENS,
+    max_pack_items: int = MAX_PACK_ITEMS,
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+) -> List[str]:
+    """
+    Translate many independent texts, packing short ones together to save requests.
+
+    Short texts are grouped with pack_texts and every group goes through the translate, reflect
+    and improve stages with one completion per stage. Texts of max_tokens or more are translated
+    on their own with translate.
+
+    Args:
+        source_lang (str): The source language of the texts.
+        target_lang (str): The target language for translation.
+        source_texts (List[str]): The texts to translate.
+        country (str): Country specified for target language.
+        max_tokens (int): Texts with at least this many tokens are translated on their own.
+        max_pack_tokens (int): The maximum number of source tokens in one pack.
+        max_pack_items (int): The maximum number of texts in one pack.
+        max_workers (int): Maximum number of completion requests in flight at once.
+
+    Returns:
+        List[str]: The translation of each text, in the same order.
+    """
+
+    short: List[int] = []
+    long: List[int] = []
+    for i, text in enumerate(source_texts):
+        (short if count_tokens(text) < max_tokens else long).append(i)
+
+    packs = [
+        [short[j] for j in pack]
+        for pack in pack_texts(
+            [source_texts[i] for i in short], max_pack_tokens, max_pack_items
+        )
+    ]
+
+    logger.info(
+        "Translating %d texts in %d packs and %d on their own",
+        len(source_texts),
+        len(packs),
+        len(long),
+    )
+
+    translations = [""] * len(source_texts)
+
+    pack_translations = map_concurrently(
+        lambda pack: packed_translate_text(
+            source_lang,
+            target_lang,
+            [source_texts[i] for i in pack],
+            country,
+        ),
+        packs,
+        max_workers,
+    )
+    for pack_index, pack in enumerate(packs):
+        for position, i in enumerate(pack):
+            translations[i] = pack_translations[pack_index][position]
+
+    for i in long:
+        translations[i] = translate(
+            source_lang,
+            target_lang,
+            source_texts[i],
+            country,
+            max_tokens,
+            max_workers,
+        )
+
+    return translations
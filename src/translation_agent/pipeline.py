@@ -0,0 +1,137 @@
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from .routing import ModelRouter
+from .routing import measure_stage
+from .routing import stage_models
+
+
+if TYPE_CHECKING:
+    from .glossary import Glossary
+    from .memory import TranslationMemory
+
+
+class ChunkPipeline:
+    """
+    The steps around the completion requests of one chunk, shared by the sync and async pipelines.
+
+    Creating it looks the chunk up in the translation memory. Unless the memory has it, it also
+    finds the fuzzy matches to show as references, the glossary terms in the chunk and the model of
+    every stage.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for translation.
+        source_text (str): The chunk, or whole text, being translated.
+        country (str): Country specified for target language.
+        model_router (ModelRouter, optional): Chooses the model of each stage and records its latency
+            and cost.
+        translation_memory (TranslationMemory, optional): Looked up first and filled with the result.
+        glossary (Glossary, optional): The glossary of the run.
+        chunk_index (int, optional): The index of the chunk, in the multichunk pipeline.
+
+    Attributes:
+        stored (str, optional): The translation from the memory, or None if the chunk has to be translated.
+        references (List[Tuple[str, str]], optional): Source and translation of the fuzzy matches from
+            the memory.
+        terms (List[Tuple[str, str]], optional): The glossary terms in the chunk.
+        models (Dict[str, str]): The model of each stage in ROUTED_STAGES.
+    """
+
+    def __init__(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source_text: str,
+        country: str = "",
+        model_router: Optional[ModelRouter] = None,
+        translation_memory: Optional["TranslationMemory"] = None,
+        glossary: Optional["Glossary"] = None,
+        chunk_index: Optional[int] = None,
+    ):
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.source_text = source_text
+        self.country = country
+        self.model_router = model_router
+        self.translation_memory = translation_memory
+        self.chunk_index = chunk_index
+        self.stored: Optional[str] = None
+        self.references: Optional[List[Tuple[str, str]]] = None
+        self.terms: Optional[List[Tuple[str, str]]] = None
+        self.models: Dict[str, str] = {}
+
+        if translation_memory is not None:
+            self.stored = translation_memory.lookup(
+                source_lang, target_lang, source_text, country
+            )
+            if self.stored is not None:
+                return
+            self.references = translation_memory.references(
+                source_lang, target_lang, source_text, country
+            )
+        if glossary is not None:
+            self.terms = glossary.terms_in(source_text)
+        self.models = stage_models(
+            model_router, source_lang, target_lang, source_text
+        )
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        """
+        Measure a stage of the chunk with measure_stage, using the model routed to it.
+
+        Args:
+            stage (str): One of ROUTED_STAGES.
+        """
+
+        with measure_stage(
+            self.model_router, stage, self.models[stage], self.chunk_index
+        ):
+            yield
+
+    def store(self, translation: str) -> str:
+        """
+        Add the final translation of the chunk to the translation memory, if any.
+
+        Args:
+            translation (str): The translation.
+
+        Returns:
+            str: The translation.
+        """
+
+        if self.translation_memory is not None:
+            self.translation_memory.add(
+                self.source_lang,
+                self.target_lang,
+                self.source_text,
+                translation,
+                self.country,
+            )
+        return translation
+
+    @staticmethod
+    def deliver(
+        translation: str, on_delta: Optional[Callable[[str], None]] = None
+    ) -> str:
+        """
+        Pass a translation produced without the streamed improvement stage to on_delta in one piece.
+
+        Args:
+            translation (str): The translation.
+            on_delta (Callable[[str], None], optional): The callback of the pipeline, if any.
+
+        Returns:
+            str: The translation.
+        """
+
+        if on_delta is not None:
+            on_delta(translation)
+        return translation
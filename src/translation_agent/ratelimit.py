@@ -0,0 +1,453 @@
+import asyncio
+import contextlib
+import random
+import re
+import threading
+import time
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
+from typing import TypeVar
+from typing import Union
+
+
+T = TypeVar("T")
+
+# Process-wide ceiling of the adaptive concurrency limit
+MAX_CONCURRENT_COMPLETIONS = 64
+
+# Status codes worth retrying besides server errors: timeouts, conflicts and rate limits
+RETRYABLE_STATUS_CODES = (408, 409, 429)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """
+    Parse a rate-limit reset duration such as "20ms", "1s" or "6m0s".
+
+    Args:
+        value (str): The header value.
+
+    Returns:
+        Optional[float]: The duration in seconds, or None if the value is not a duration.
+    """
+
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = _DURATION_PART.findall(value)
+    if not parts or "".join(number + unit for number, unit in parts) != value:
+        return None
+    return sum(
+        float(number) * _DURATION_SECONDS[unit] for number, unit in parts
+    )
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Decide whether a failed completion request is worth retrying.
+
+    Args:
+        error (BaseException): The exception raised by the request.
+
+    Returns:
+        bool: True for rate limits, timeouts, connection errors and server errors.
+    """
+
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+
+    try:
+        import openai
+    except ImportError:
+        return isinstance(error, (TimeoutError, ConnectionError))
+    return isinstance(
+        error, (openai.APIConnectionError, TimeoutError, ConnectionError)
+    )
+
+
+def _error_headers(error: BaseException) -> Mapping[str, str]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    return headers if headers is not None else {}
+
+
+def _is_rate_limited(error: Optional[BaseException]) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class TokenBucket:
+    """
+    A bucket refilled at a constant rate, from which requests or tokens are reserved.
+
+    Reservations may overdraw the bucket; the caller then waits until the refill has covered the debt.
+    This keeps a long request from starving behind short ones.
+
+    Args:
+        per_minute (float): The budget per minute, which is also the bucket capacity.
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(
+            self.per_minute,
+            self.level + (now - self.updated) * self.per_minute / 60.0,
+        )
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take an amount out of the bucket.
+
+        Args:
+            amount (float): The number of requests or tokens to reserve.
+
+        Returns:
+            float: The number of seconds to wait before using the reservation.
+        """
+
+        self._refill(time.monotonic())
+        self.level -= amount
+        if self.level >= 0:
+            return 0.0
+        return -self.level * 60.0 / self.per_minute
+
+    def refund(self, amount: float) -> None:
+        """Give back part of a reservation, for example when a request used fewer tokens than reserved."""
+        self.level = min(self.per_minute, self.level + amount)
+
+    def observe(
+        self, limit: Optional[float], remaining: Optional[float]
+    ) -> None:
+        """
+        Align the bucket with the limit and remaining budget reported by the server.
+
+        Args:
+            limit (float, optional): The budget per minute reported by the server.
+            remaining (float, optional): The budget left in the current window.
+        """
+
+        self._refill(time.monotonic())
+        if limit is not None and limit > 0:
+            self.per_minute = limit
+        if remaining is not None:
+            self.level = min(self.level, remaining)
+
+
+class RateLimiter:
+    """
+    Client-side scheduler for completion requests, shared by every translation in the process.
+
+    Requests are admitted within a requests-per-minute and a tokens-per-minute budget, retried with
+    jittered exponential backoff when they fail with a rate limit, timeout or server error, and run
+    with an adaptive concurrency limit that is halved on every rate limit and grows back by one
+    slot per window of successful requests. Budgets that are not configured are learned from the
+    x-ratelimit-* headers of rate-limited responses.
+
+    The default OpenAI clients are created with max_retries=0, so that failed requests are only
+    retried here. Clients passed to set_client and set_async_client should be created the same way.
+
+    Args:
+        requests_per_minute (float, optional): The request budget. If None, only learned from headers.
+        tokens_per_minute (float, optional): The token budget. If None, only learned from headers.
+        max_concurrency (int): The ceiling of the adaptive concurrency limit.
+        max_retries (int): The number of retries after the first attempt.
+        initial_backoff (float): The backoff ceiling in seconds before the first retry.
+        max_backoff (float): The largest backoff in seconds.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_concurrency: int = MAX_CONCURRENT_COMPLETIONS,
+        max_retries: int = 6,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        self.requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.tokens = (
+            TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        )
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = float(max_concurrency)
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.in_flight = 0
+        self.counters = {
+            "requests": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "failures": 0,
+        }
+        self.waited_seconds = 0.0
+        self._lock = threading.Lock()
+        self._slot_released = threading.Condition(self._lock)
+        # Futures of coroutines waiting for a slot, with their event loops. The limiter is shared
+        # by threads and event loops, so waiters are woken with call_soon_threadsafe.
+        self._async_waiters: List[
+            Tuple[asyncio.AbstractEventLoop, asyncio.Future]
+        ] = []
+
+    def backoff(
+        self, attempt: int, retry_after: Optional[float] = None
+    ) -> float:
+        """
+        Compute how long to wait before a retry, with full jitter.
+
+        Args:
+            attempt (int): The number of the retry, starting at 0.
+            retry_after (float, optional): The delay requested by the server, used as a lower bound.
+
+        Returns:
+            float: The delay in seconds.
+        """
+
+        ceiling = min(self.max_backoff, self.initial_backoff * 2**attempt)
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """
+        Adapt the budgets to the x-ratelimit-* headers of a response.
+
+        Args:
+            headers (Mapping[str, str]): The response headers.
+        """
+
+        def number(name: str) -> Optional[float]:
+            value = headers.get(name)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+
+        with self._lock:
+            for kind in ("requests", "tokens"):
+                limit = number(f"x-ratelimit-limit-{kind}")
+                remaining = number(f"x-ratelimit-remaining-{kind}")
+                bucket = getattr(self, kind)
+                if bucket is None and limit:
+                    bucket = TokenBucket(limit)
+                    setattr(self, kind, bucket)
+                if bucket is not None:
+                    bucket.observe(limit, remaining)
+
+    def _retry_after(self, error: BaseException) -> Optional[float]:
+        headers = _error_headers(error)
+        for name in (
+            "retry-after-ms",
+            "retry-after",
+            "x-ratelimit-reset-requests",
+            "x-ratelimit-reset-tokens",
+        ):
+            value = headers.get(name)
+            if value is None:
+                continue
+            seconds = parse_duration(value)
+            if seconds is not None:
+                return seconds / 1000 if name == "retry-after-ms" else seconds
+        return None
+
+    def _try_acquire_slot(self) -> bool:
+        if self.in_flight >= max(1, int(self.concurrency_limit)):
+            return False
+        self.in_flight += 1
+        return True
+
+    def _release_slot(self, success: bool, rate_limited: bool) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            if rate_limited:
+                self.counters["rate_limited"] += 1
+                self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+            elif success:
+                self.concurrency_limit = min(
+                    float(self.max_concurrency),
+                    self.concurrency_limit + 1 / self.concurrency_limit,
+                )
+            self._slot_released.notify_all()
+            for loop, waiter in self._async_waiters:
+                # A closed loop has no waiter left to wake
+                with contextlib.suppress(RuntimeError):
+                    loop.call_soon_threadsafe(_wake, waiter)
+            self._async_waiters.clear()
+
+    def _reserve(self, num_tokens: int) -> float:
+        with self._lock:
+            self.counters["requests"] += 1
+            wait = 0.0
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1))
+            if self.tokens is not None and num_tokens:
+                wait = max(wait, self.tokens.reserve(num_tokens))
+            self.waited_seconds += wait
+            return wait
+
+    def _record_usage(self, result: object, reserved_tokens: int) -> None:
+        # Chat completions report their actual usage, which replaces the estimate
+        usage = getattr(result, "usage", None)
+        used_tokens = getattr(usage, "total_tokens", None)
+        if self.tokens is None or not isinstance(used_tokens, int):
+            return
+        with self._lock:
+            self.tokens.refund(reserved_tokens - used_tokens)
+
+    def _handle_error(self, error: BaseException, attempt: int) -> float:
+        if _is_rate_limited(error):
+            self.update_from_headers(_error_headers(error))
+        if attempt >= self.max_retries or not is_retryable(error):
+            with self._lock:
+                self.counters["failures"] += 1
+            raise error
+        with self._lock:
+            self.counters["retries"] += 1
+        return self.backoff(attempt, self._retry_after(error))
+
+    def _needs_tokens(self, num_tokens: Union[int, Callable[[], int]]) -> int:
+        if self.tokens is None:
+            return 0
+        return num_tokens() if callable(num_tokens) else num_tokens
+
+    def call(
+        self,
+        func: Callable[[], T],
+        num_tokens: Union[int, Callable[[], int]] = 0,
+    ) -> T:
+        """
+        Run a request within the budgets, retrying it when it fails with a retryable error.
+
+        Args:
+            func (Callable[[], T]): Sends the request.
+            num_tokens (Union[int, Callable[[], int]]): The tokens the request will use, or a function
+                computing them, which is only called when a token budget is in force.
+
+        Returns:
+            T: The result of func.
+        """
+
+        for attempt in range(self.max_retries + 1):
+            with self._lock:
+                while not self._try_acquire_slot():
+                    self._slot_released.wait()
+            succeeded = False
+            failure = None
+            # The slot is released however the attempt ends, including on cancellation
+            try:
+                reserved_tokens = self._needs_tokens(num_tokens)
+                time.sleep(self._reserve(reserved_tokens))
+                result = func()
+                succeeded = True
+            except Exception as error:  # noqa: BLE001 - re-raised unless retryable
+                failure = error
+            finally:
+                self._release_slot(
+                    success=succeeded,
+                    rate_limited=_is_rate_limited(failure),
+                )
+            if failure is not None:
+                time.sleep(self._handle_error(failure, attempt))
+                continue
+            self._record_usage(result, reserved_tokens)
+            return result
+        raise AssertionError("unreachable")
+
+    async def acall(
+        self,
+        func: Callable[[], Awaitable[T]],
+        num_tokens: Union[int, Callable[[], int]] = 0,
+    ) -> T:
+        """Async version of call. Waiting for a slot or a budget never blocks the event loop."""
+
+        for attempt in range(self.max_retries + 1):
+            while True:
+                with self._lock:
+                    if self._try_acquire_slot():
+                        break
+                    loop = asyncio.get_running_loop()
+                    waiter = loop.create_future()
+                    self._async_waiters.append((loop, waiter))
+                await waiter
+            succeeded = False
+            failure = None
+            # The slot is released however the attempt ends, including on cancellation
+            try:
+                reserved_tokens = self._needs_tokens(num_tokens)
+                await asyncio.sleep(self._reserve(reserved_tokens))
+                result = await func()
+                succeeded = True
+            except Exception as error:  # noqa: BLE001 - re-raised unless retryable
+                failure = error
+            finally:
+                self._release_slot(
+                    success=succeeded,
+                    rate_limited=_is_rate_limited(failure),
+                )
+            if failure is not None:
+                await asyncio.sleep(self._handle_error(failure, attempt))
+                continue
+            self._record_usage(result, reserved_tokens)
+            return result
+        raise AssertionError("unreachable")
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Report scheduler activity.
+
+        Returns:
+            Dict[str, float]: Request, retry, rate-limit and failure counters, the seconds spent
+                waiting for budget and the current concurrency limit.
+        """
+
+        with self._lock:
+            return {
+                **self.counters,
+                "waited_seconds": self.waited_seconds,
+                "concurrency_limit": self.concurrency_limit,
+            }
+
+
+_rate_limiter: Optional[RateLimiter] = RateLimiter()
+
+
+def set_rate_limiter(rate_limiter: Optional[RateLimiter]) -> None:
+    """
+    Install the scheduler used by every completion request in the process.
+
+    Args:
+        rate_limiter (RateLimiter, optional): The scheduler to use, or None to send requests directly,
+            without budgets or retries.
+    """
+
+    global _rate_limiter
+    _rate_limiter = rate_limiter
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """Return the installed scheduler, or None if requests are sent directly."""
+
+    return _rate_limiter
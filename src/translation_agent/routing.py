@@ -0,0 +1,325 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from .metrics import MODEL_PRICES
+from .metrics import cached_prompt_tokens
+from .metrics import call_labels
+from .metrics import call_prices
+from .tokenizer import count_tokens
+
+
+DEFAULT_MODEL = "gpt-4-turbo"
+
+ROUTED_STAGES = ("initial", "reflect", "improve")
+
+# Prompt, completion and cached prompt tokens of the completions made while a stage is measured,
+# in the current thread or task
+_stage_usage: ContextVar[Optional[List[Tuple[int, int, int]]]] = ContextVar(
+    "stage_usage", default=None
+)
+
+_prompt_cache_lock = threading.Lock()
+_prompt_cache_totals = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0}
+
+
+def record_usage(usage: object) -> None:
+    """
+    Add the token usage of a completion to the prompt cache statistics and to the stage being
+    measured, if any.
+
+    Args:
+        usage (object): The usage attribute of a chat completion response.
+    """
+
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    if not isinstance(prompt_tokens, int) or not isinstance(
+        completion_tokens, int
+    ):
+        return
+    cached_tokens = cached_prompt_tokens(usage)
+
+    with _prompt_cache_lock:
+        _prompt_cache_totals["requests"] += 1
+        _prompt_cache_totals["prompt_tokens"] += prompt_tokens
+        _prompt_cache_totals["cached_tokens"] += cached_tokens
+
+    sink = _stage_usage.get()
+    if sink is not None:
+        sink.append((prompt_tokens, completion_tokens, cached_tokens))
+
+
+def prompt_cache_stats() -> Dict[str, float]:
+    """
+    Report how much of the prompts sent since the last reset was served from provider prompt caches.
+
+    Returns:
+        Dict[str, float]: The number of requests that reported usage, their prompt tokens, the cached
+            prompt tokens and the cached share of the prompt tokens.
+    """
+
+    with _prompt_cache_lock:
+        stats = dict(_prompt_cache_totals)
+    stats["cached_ratio"] = (
+        stats["cached_tokens"] / stats["prompt_tokens"]
+        if stats["prompt_tokens"]
+        else 0.0
+    )
+    return stats
+
+
+def reset_prompt_cache_stats() -> None:
+    """Reset the statistics reported by prompt_cache_stats."""
+
+    with _prompt_cache_lock:
+        for key in _prompt_cache_totals:
+            _prompt_cache_totals[key] = 0
+
+
+@dataclass
+class RoutingRule:
+    """
+    Models to use for the chunks that match some conditions.
+
+    Attributes:
+        initial (str, optional): The model for the initial translation, or None to leave it to later rules.
+        reflect (str, optional): The model for the reflection.
+        improve (str, optional): The model for the improvement.
+        source_lang (str, optional): Only match this source language.
+        target_lang (str, optional): Only match this target language.
+        min_tokens (int, optional): Only match chunks with at least this many tokens.
+        max_tokens (int, optional): Only match chunks with at most this many tokens.
+    """
+
+    initial: Optional[str] = None
+    reflect: Optional[str] = None
+    improve: Optional[str] = None
+    source_lang: Optional[str] = None
+    target_lang: Optional[str] = None
+    min_tokens: Optional[int] = None
+    max_tokens: Optional[int] = None
+
+    @property
+    def uses_tokens(self) -> bool:
+        """Whether the rule depends on the chunk's token count."""
+        return self.min_tokens is not None or self.max_tokens is not None
+
+    def matches(
+        self, source_lang: str, target_lang: str, num_tokens: Optional[int]
+    ) -> bool:
+        """
+        Check the rule's conditions.
+
+        Args:
+            source_lang (str): The source language of the chunk.
+            target_lang (str): The target language of the chunk.
+            num_tokens (int, optional): The token count of the chunk. Only needed if uses_tokens.
+
+        Returns:
+            bool: Whether the rule applies.
+        """
+
+        if self.source_lang is not None and self.source_lang != source_lang:
+            return False
+        if self.target_lang is not None and self.target_lang != target_lang:
+            return False
+        if self.min_tokens is not None and num_tokens < self.min_tokens:
+            return False
+        return self.max_tokens is None or num_tokens <= self.max_tokens
+
+
+class ModelRouter:
+    """
+    Chooses the model of every pipeline stage and reports latency and cost per stage.
+
+    Each stage uses the model of the first rule that matches the chunk and sets a model for that
+    stage, or the router's default for the stage.
+
+    Args:
+        initial (str): The default model for the initial translation.
+        reflect (str): The default model for the reflection.
+        improve (str): The default model for the improvement.
+        rules (Sequence[RoutingRule]): Routing rules, in order of priority.
+        prices (Dict[str, Tuple[float, float]], optional): USD per million prompt and completion tokens,
+            by model. Defaults to MODEL_PRICES.
+    """
+
+    def __init__(
+        self,
+        initial: str = DEFAULT_MODEL,
+        reflect: str = DEFAULT_MODEL,
+        improve: str = DEFAULT_MODEL,
+        rules: Sequence[RoutingRule] = (),
+        prices: Optional[Dict[str, Tuple[float, float]]] = None,
+    ):
+        self.defaults = {
+            "initial": initial,
+            "reflect": reflect,
+            "improve": improve,
+        }
+        self.rules = list(rules)
+        self.prices = MODEL_PRICES if prices is None else prices
+        self._lock = threading.Lock()
+        self.reset_report()
+
+    def route(
+        self, source_lang: str, target_lang: str, source_text: str
+    ) -> Dict[str, str]:
+        """
+        Choose the model of every stage for one chunk.
+
+        Args:
+            source_lang (str): The source language of the text.
+            target_lang (str): The target language for translation.
+            source_text (str): The chunk, or whole text, being translated.
+
+        Returns:
+            Dict[str, str]: The model of each stage in ROUTED_STAGES.
+        """
+
+        num_tokens = None
+        if any(rule.uses_tokens for rule in self.rules):
+            num_tokens = count_tokens(source_text)
+
+        models = {}
+        for stage in ROUTED_STAGES:
+            models[stage] = next(
+                (
+                    getattr(rule, stage)
+                    for rule in self.rules
+                    if getattr(rule, stage) is not None
+                    and rule.matches(source_lang, target_lang, num_tokens)
+                ),
+                self.defaults[stage],
+            )
+        return models
+
+    @contextmanager
+    def measure(self, stage: str, model: str) -> Iterator[None]:
+        """
+        Measure the latency and token usage of a stage while the context is open.
+
+        Args:
+            stage (str): One of ROUTED_STAGES.
+            model (str): The model the stage uses.
+        """
+
+        usage: List[Tuple[int, int, int]] = []
+        token = _stage_usage.set(usage)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            _stage_usage.reset(token)
+            prompt_tokens = sum(prompt for prompt, _, _ in usage)
+            completion_tokens = sum(completion for _, completion, _ in usage)
+            cached_tokens = sum(cached for _, _, cached in usage)
+            prompt_price, completion_price = self.prices.get(model, (0.0, 0.0))
+            cost = (
+                prompt_tokens * prompt_price
+                + completion_tokens * completion_price
+            ) / 1e6
+            with self._lock:
+                totals = self._report[stage]
+                totals["calls"] += 1
+                totals["seconds"] += elapsed
+                totals["prompt_tokens"] += prompt_tokens
+                totals["completion_tokens"] += completion_tokens
+                totals["cached_tokens"] += cached_tokens
+                totals["cost_usd"] += cost
+                totals["models"][model] = totals["models"].get(model, 0) + 1
+
+    def reset_report(self) -> None:
+        """Reset the per-stage totals, for example at the start of a run."""
+
+        with self._lock:
+            self._report = {
+                stage: {
+                    "calls": 0,
+                    "seconds": 0.0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "cached_tokens": 0,
+                    "cost_usd": 0.0,
+                    "models": {},
+                }
+                for stage in ROUTED_STAGES
+            }
+
+    def report(self) -> Dict[str, dict]:
+        """
+        Report the latency and cost of every stage since the last reset.
+
+        Returns:
+            Dict[str, dict]: For each stage, the number of calls, the total seconds spent, the prompt,
+                completion and cached prompt tokens, the estimated cost in USD and the number of calls
+                per model.
+                Cached completions count as calls without tokens.
+        """
+
+        with self._lock:
+            return {
+                stage: {**totals, "models": dict(totals["models"])}
+                for stage, totals in self._report.items()
+            }
+
+
+@contextmanager
+def measure_stage(
+    model_router: Optional[ModelRouter],
+    stage: str,
+    model: str,
+    chunk_index: Optional[int] = None,
+) -> Iterator[None]:
+    """
+    Label the completion requests of a stage for metrics and, with a router, measure the stage and
+    price its requests with the router's prices.
+
+    Args:
+        model_router (ModelRouter, optional): The router of the run.
+        stage (str): One of ROUTED_STAGES.
+        model (str): The model the stage uses.
+        chunk_index (int, optional): The index of the chunk, in the multichunk pipeline.
+    """
+
+    with call_labels(stage, chunk_index):
+        if model_router is None:
+            yield
+        else:
+            with model_router.measure(stage, model):
+                with call_prices(model_router.prices):
+                    yield
+
+
+def stage_models(
+    model_router: Optional[ModelRouter],
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+) -> Dict[str, str]:
+    """
+    Return the model of every stage for one chunk, or DEFAULT_MODEL for every stage without a router.
+
+    Args:
+        model_router (ModelRouter, optional): The router of the run.
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for translation.
+        source_text (str): The chunk, or whole text, being translated.
+
+    Returns:
+        Dict[str, str]: The model of each stage in ROUTED_STAGES.
+    """
+
+    if model_router is None:
+        return dict.fromkeys(ROUTED_STAGES, DEFAULT_MODEL)
+    return model_router.route(source_lang, target_lang, source_text)
@@ -0,0 +1,427 @@
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import TYPE_CHECKING
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from .packing import MAX_PACK_ITEMS
+from .packing import MAX_PACK_TOKENS
+from .packing import run_packed_stage
+from .tokenizer import count_tokens
+from .utils import MAX_CONCURRENT_REQUESTS
+from .utils import one_chunk_improve_translation
+from .utils import one_chunk_initial_translation
+from .utils import one_chunk_reflect_on_translation
+
+
+if TYPE_CHECKING:
+    import pysrt
+
+# Source cues of the previous pack shown with each pack, so that dialogue reads on across packs
+CONTEXT_CUES = 3
+
+
+def pack_cues(
+    cues: Iterable["pysrt.SubRipItem"],
+    max_pack_tokens: int = MAX_PACK_TOKENS,
+    max_pack_items: int = MAX_PACK_ITEMS,
+) -> Iterator[List["pysrt.SubRipItem"]]:
+    """
+    Group consecutive subtitle cues into packs that fit a token budget, reading the cues lazily.
+
+    Args:
+        cues (Iterable[pysrt.SubRipItem]): The cues, in playback order.
+        max_pack_tokens (int): The maximum number of source tokens in one pack. A cue that is longer on
+            its own gets a pack of its own.
+        max_pack_items (int): The maximum number of cues in one pack.
+
+    Yields:
+        List[pysrt.SubRipItem]: The cues of each pack, as soon as the pack is full.
+    """
+
+    pack: List[pysrt.SubRipItem] = []
+    pack_tokens = 0
+    for cue in cues:
+        num_tokens = count_tokens(cue.text)
+        if pack and (
+            pack_tokens + num_tokens > max_pack_tokens
+            or len(pack) >= max_pack_items
+        ):
+            yield pack
+            pack, pack_tokens = [], 0
+        pack.append(cue)
+        pack_tokens += num_tokens
+    if pack:
+        yield pack
+
+
+def cue_ids(cues: List["pysrt.SubRipItem"]) -> List[str]:
+    """
+    Name the cues of a pack by their SRT index, or by position if the indexes are not unique.
+
+    Args:
+        cues (List[pysrt.SubRipItem]): The cues of a pack.
+
+    Returns:
+        List[str]: The id of each cue.
+    """
+
+    ids = [str(cue.index) for cue in cues]
+    if len(set(ids)) < len(ids):
+        return [str(i) for i in range(len(cues))]
+    return ids
+
+
+def _to_json(items: Dict[str, object]) -> str:
+    return json.dumps(items, ensure_ascii=False, indent=2)
+
+
+def _previous_lines_section(previous_lines: Optional[List[str]]) -> str:
+    if not previous_lines:
+        return ""
+    lines = "\n".join(previous_lines)
+    return f"""For context only, these are the subtitle lines just before them, which must not be translated:
+
+{lines}
+
+"""
+
+
+def subtitle_initial_translation_prompt(
+    source_lang: str,
+    target_lang: str,
+    source_cues: Dict[str, str],
+    previous_lines: Optional[List[str]] = None,
+) -> Tuple[str, str]:
+    """
+    Build the system message and prompt for translating a pack of consecutive subtitle cues.
+
+    Args:
+        source_lang (str): The source language of the subtitles.
+        target_lang (str): The target language for the translation.
+        source_cues (Dict[str, str]): The text of each cue, keyed by cue id.
+        previous_lines (List[str], optional): Source lines of the cues before the pack, for context.
+
+    Returns:
+        Tuple[str, str]: The system message and the prompt.
+    """
+
+    system_message = f"You are an expert subtitle translator, specializing in translation from {source_lang} to {target_lang}."
+
+    prompt = f"""This is an {source_lang} to {target_lang} translation of consecutive subtitle cues of one video. \
+The cues are given as a JSON object that maps a cue id to the {source_lang} text shown on screen, in playback order:
+
+{_to_json(source_cues)}
+
+{_previous_lines_section(previous_lines)}\
+Translate every cue into {target_lang}, reading the cues together as one dialogue. \
+Keep each translation in its own cue and about as long as the source, so that it can be read in the time the cue is shown. \
+Keep line breaks and formatting tags such as <i></i>. \
+Respond with a JSON object that maps each cue id to the {target_lang} translation of its cue, and nothing else."""
+
+    return system_message, prompt
+
+
+def subtitle_reflect_on_translation_prompt(
+    source_lang: str,
+    target_lang: str,
+    source_cues: Dict[str, str],
+    translation_1: Dict[str, str],
+    country: str = "",
+    previous_lines: Optional[List[str]] = None,
+) -> Tuple[str, str]:
+    """
+    Build the system message and prompt for reflecting on the translation of a pack of subtitle cues.
+
+    Args:
+        source_lang (str): The source language of the subtitles.
+        target_lang (str): The target language of the translation.
+        source_cues (Dict[str, str]): The text of each cue, keyed by cue id.
+        translation_1 (Dict[str, str]): The initial translation of each cue, keyed by cue id.
+        country (str): Country specified for the target language.
+        previous_lines (List[str], optional): Source lines of the cues before the pack, for context.
+
+    Returns:
+        Tuple[str, str]: The system message and the prompt.
+    """
+
+    system_message = f"You are an expert subtitle translator specializing in translation from {source_lang} to {target_lang}. \
+You will be provided with consecutive subtitle cues and their translations and your goal is to improve the translations."
+
+    items = {
+        cue_id: {"source_text": text, "translation": translation_1[cue_id]}
+        for cue_id, text in source_cues.items()
+    }
+
+    style = (
+        f"The final style and tone of the translations should match the style of {target_lang} colloquially spoken in {country}.\n\n"
+        if country != ""
+        else ""
+    )
+
+    prompt = f"""Your task is to carefully read consecutive subtitle cues of one video and their translations from {source_lang} to {target_lang}, \
+and then give constructive criticism and helpful suggestions to improve the translation of each cue. {style}\
+The cues are given as a JSON object that maps a cue id to its source text and initial translation, in playback order:
+
+{_to_json(items)}
+
+{_previous_lines_section(previous_lines)}\
+When writing suggestions, pay attention to whether there are ways to improve each cue's
+(i) accuracy (by correcting errors of addition, mistranslation, omission, or untranslated text),
+(ii) fluency (by applying {target_lang} grammar, spelling and punctuation rules, and ensuring the dialogue reads naturally across cues),
+(iii) style (by ensuring the translations reflect the register of the speakers and take into account any cultural context),
+(iv) readability (by keeping each translation about as long as its source, so that it can be read while the cue is shown).
+
+Respond with a JSON object that maps each cue id to a single string listing the specific, helpful and constructive suggestions \
+for improving its translation, and nothing else."""
+
+    return system_message, prompt
+
+
+def subtitle_improve_translation_prompt(
+    source_lang: str,
+    target_lang: str,
+    source_cues: Dict[str, str],
+    translation_1: Dict[str, str],
+    reflection: Dict[str, str],
+    previous_lines: Optional[List[str]] = None,
+) -> Tuple[str, str]:
+    """
+    Build the system message and prompt for improving the translation of a pack of subtitle cues.
+
+    Args:
+        source_lang (str): The source language of the subtitles.
+        target_lang (str): The target language of the translation.
+        source_cues (Dict[str, str]): The text of each cue, keyed by cue id.
+        translation_1 (Dict[str, str]): The initial translation of each cue, keyed by cue id.
+        reflection (Dict[str, str]): Expert suggestions for each cue, keyed by cue id.
+        previous_lines (List[str], optional): Source lines of the cues before the pack, for context.
+
+    Returns:
+        Tuple[str, str]: The system message and the prompt.
+    """
+
+    system_message = f"You are an expert subtitle translator, specializing in translation editing from {source_lang} to {target_lang}."
+
+    items = {
+        cue_id: {
+            "source_text": text,
+            "translation": translation_1[cue_id],
+            "expert_suggestions": reflection[cue_id],
+        }
+        for cue_id, text in source_cues.items()
+    }
+
+    prompt = f"""Your task is to carefully read, then edit, the translation of consecutive subtitle cues of one video from {source_lang} to {target_lang}, \
+taking into account lists of expert suggestions and constructive criticisms.
+
+The cues are given as a JSON object that maps a cue id to its source text, initial translation and the expert suggestions for it, \
+in playback order:
+
+{_to_json(items)}
+
+{_previous_lines_section(previous_lines)}\
+Please take into account the expert suggestions when editing each translation. \
+Keep each translation in its own cue and about as long as the source, and keep line breaks and formatting tags such as <i></i>.
+
+Respond with a JSON object that maps each cue id to its new translation, and nothing else."""
+
+    return system_message, prompt
+
+
+def translate_cue_pack(
+    source_lang: str,
+    target_lang: str,
+    cues: List["pysrt.SubRipItem"],
+    country: str = "",
+    previous_lines: Optional[List[str]] = None,
+) -> List["pysrt.SubRipItem"]:
+    """
+    Translate a pack of consecutive subtitle cues with one completion per stage.
+
+    Cues whose output is missing from a packed completion are translated on their own.
+
+    Args:
+        source_lang (str): The source language of the subtitles.
+        target_lang (str): The target language for the translation.
+        cues (List[pysrt.SubRipItem]): The cues of the pack.
+        country (str): Country specified for target language.
+        previous_lines (List[str], optional): Source lines of the cues before the pack, for context.
+
+    Returns:
+        List[pysrt.SubRipItem]: New cues with the index, timing and position of the source cues and
+            the improved translation as text.
+    """
+
+    import pysrt
+
+    ids = cue_ids(cues)
+    texts = {ids[i]: cue.text for i, cue in enumerate(cues)}
+
+    translation_1 = run_packed_stage(
+        *subtitle_initial_translation_prompt(
+            source_lang, target_lang, texts, previous_lines
+        ),
+        ids,
+        lambda cue_id: one_chunk_initial_translation(
+            source_lang, target_lang, texts[cue_id]
+        ),
+    )
+
+    reflection = run_packed_stage(
+        *subtitle_reflect_on_translation_prompt(
+            source_lang,
+            target_lang,
+            texts,
+            translation_1,
+            country,
+            previous_lines,
+        ),
+        ids,
+        lambda cue_id: one_chunk_reflect_on_translation(
+            source_lang,
+            target_lang,
+            texts[cue_id],
+            translation_1[cue_id],
+            country,
+        ),
+    )
+
+    translation_2 = run_packed_stage(
+        *subtitle_improve_translation_prompt(
+            source_lang,
+            target_lang,
+            texts,
+            translation_1,
+            reflection,
+            previous_lines,
+        ),
+        ids,
+        lambda cue_id: one_chunk_improve_translation(
+            source_lang,
+            target_lang,
+            texts[cue_id],
+            translation_1[cue_id],
+            reflection[cue_id],
+        ),
+    )
+
+    return [
+        pysrt.SubRipItem(
+            index=cue.index,
+            start=cue.start,
+            end=cue.end,
+            text=translation_2[ids[i]],
+            position=cue.position,
+        )
+        for i, cue in enumerate(cues)
+    ]
+
+
+def translate_subtitles(
+    source_lang: str,
+    target_lang: str,
+    cues: Iterable["pysrt.SubRipItem"],
+    country: str = "",
+    max_pack_tokens: int = MAX_PACK_TOKENS,
+    max_pack_items: int = MAX_PACK_ITEMS,
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+) -> Iterator["pysrt.SubRipItem"]:
+    """
+    Translate subtitle cues as a stream, keeping their timing.
+
+    Consecutive cues are packed with pack_cues and every pack goes through the translate, reflect
+    and improve stages with one completion per stage. At most max_workers packs are read ahead
+    and translated at once, so a subtitle track of any length is never held in memory.
+
+    Args:
+        source_lang (str): The source language of the subtitles.
+        target_lang (str): The target language for the translation.
+        cues (Iterable[pysrt.SubRipItem]): The cues, in playback order, for example from pysrt.stream.
+        country (str): Country specified for target language.
+        max_pack_tokens (int): The maximum number of source tokens in one pack.
+        max_pack_items (int): The maximum number of cues in one pack.
+        max_workers (int): Maximum number of packs translated at once.
+
+    Yields:
+        pysrt.SubRipItem: The translated cues, in the order of the source cues.
+    """
+
+    max_workers = max(1, max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        previous_lines: List[str] = []
+        for pack in pack_cues(cues, max_pack_tokens, max_pack_items):
+            # Each pack runs in a copy of the caller's context, so that the completion backend
+            # selected with backends.use_backend applies in the worker threads too
+            pending.append(
+                executor.submit(
+                    copy_context().run,
+                    translate_cue_pack,
+                    source_lang,
+                    target_lang,
+                    pack,
+                    country,
+                    previous_lines,
+                )
+            )
+            previous_lines = [cue.text for cue in pack[-CONTEXT_CUES:]]
+            if len(pending) >= max_workers:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+
+
+def translate_srt_file(
+    source_lang: str,
+    target_lang: str,
+    input_path: str,
+    output_path: str,
+    country: str = "",
+    encoding: str = "utf-8-sig",
+    max_pack_tokens: int = MAX_PACK_TOKENS,
+    max_pack_items: int = MAX_PACK_ITEMS,
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+) -> int:
+    """
+    Translate an SRT file, reading and writing it cue by cue.
+
+    Args:
+        source_lang (str): The source language of the subtitles.
+        target_lang (str): The target language for the translation.
+        input_path (str): The SRT file to translate.
+        output_path (str): Where to write the translated SRT file, in UTF-8.
+        country (str): Country specified for target language.
+        encoding (str): The encoding of the input file.
+        max_pack_tokens (int): The maximum number of source tokens in one pack.
+        max_pack_items (int): The maximum number of cues in one pack.
+        max_workers (int): Maximum number of packs translated at once.
+
+    Returns:
+        int: The number of cues written.
+    """
+
+    import pysrt
+
+    num_cues = 0
+    with open(input_path, encoding=encoding) as source_file:
+        with open(output_path, "w", encoding="utf-8") as output_file:
+            for cue in translate_subtitles(
+                source_lang,
+                target_lang,
+                pysrt.stream(source_file),
+                country,
+                max_pack_tokens,
+                max_pack_items,
+                max_workers,
+            ):
+                output_file.write(f"{cue}\n")
+                num_cues += 1
+    return num_cues
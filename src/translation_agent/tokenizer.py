@@ -0,0 +1,178 @@
+from bisect import bisect_left
+from functools import cache
+from itertools import accumulate
+from typing import TYPE_CHECKING
+from typing import List
+from typing import Optional
+
+
+if TYPE_CHECKING:
+    import tiktoken
+
+
+DEFAULT_ENCODING = "cl100k_base"  # used by GPT-4
+
+
+@cache
+def get_encoding(encoding_name: str = DEFAULT_ENCODING) -> "tiktoken.Encoding":
+    """
+    Return the tiktoken encoding with the given name, loading it only once per process.
+
+    Args:
+        encoding_name (str, optional): The name of the encoding. Defaults to "cl100k_base".
+
+    Returns:
+        tiktoken.Encoding: The shared encoding object.
+    """
+
+    import tiktoken
+
+    return tiktoken.get_encoding(encoding_name)
+
+
+def count_tokens(text: str, encoding_name: str = DEFAULT_ENCODING) -> int:
+    """
+    Count the tokens in a string with a cached encoding.
+
+    Special-token strings such as "<|endoftext|>" are counted as ordinary text.
+
+    Args:
+        text (str): The text to count.
+        encoding_name (str, optional): The name of the encoding. Defaults to "cl100k_base".
+
+    Returns:
+        int: The number of tokens.
+    """
+
+    return len(get_encoding(encoding_name).encode_ordinary(text))
+
+
+@cache
+def token_byte_lengths(encoding_name: str = DEFAULT_ENCODING) -> List[int]:
+    """
+    Return the length in bytes of every ordinary token of an encoding, indexed by token id.
+
+    The table is built once per encoding and lets token offsets be computed without decoding.
+
+    Args:
+        encoding_name (str, optional): The name of the encoding. Defaults to "cl100k_base".
+
+    Returns:
+        List[int]: The byte length of each token id, or 0 for ids that are not ordinary tokens.
+    """
+
+    encoding = get_encoding(encoding_name)
+    lengths = []
+    for token in range(encoding.max_token_value + 1):
+        try:
+            lengths.append(len(encoding.decode_single_token_bytes(token)))
+        except KeyError:
+            lengths.append(0)
+    return lengths
+
+
+# Maps UTF-8 continuation bytes to 0 and every byte that starts a character to 1
+_CHAR_START_BYTES = bytes(0 if 0x80 <= i < 0xC0 else 1 for i in range(256))
+
+
+def _token_char_offsets(
+    text: str, tokens: List[int], encoding_name: str
+) -> List[int]:
+    # Same result as tiktoken's decode_with_offsets, without a Python loop over every token
+    lengths = token_byte_lengths(encoding_name)
+    byte_offsets = list(
+        accumulate(map(lengths.__getitem__, tokens), initial=0)
+    )[:-1]
+    if text.isascii() or not byte_offsets:
+        return byte_offsets
+
+    # chars_started[i] is the number of characters that start at or before byte i
+    chars_started = list(
+        accumulate(text.encode("utf-8").translate(_CHAR_START_BYTES))
+    )
+    return [chars_started[offset] - 1 for offset in byte_offsets]
+
+
+class TokenizedText:
+    """
+    A text tokenized exactly once.
+
+    Token counts for any part of the text, such as chunks or prompt context, are derived from the
+    single token array through the character offset of every token, instead of encoding the text again.
+
+    Args:
+        text (str): The text to tokenize.
+        encoding_name (str, optional): The name of the encoding. Defaults to "cl100k_base".
+    """
+
+    def __init__(self, text: str, encoding_name: str = DEFAULT_ENCODING):
+        self.text = text
+        self.encoding_name = encoding_name
+        self.encoding = get_encoding(encoding_name)
+        self.tokens: List[int] = self.encoding.encode_ordinary(text)
+        self._offsets: Optional[List[int]] = None
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    @property
+    def offsets(self) -> List[int]:
+        """The character offset at which each token starts, computed on first use."""
+
+        if self._offsets is None:
+            self._offsets = _token_char_offsets(
+                self.text, self.tokens, self.encoding_name
+            )
+        return self._offsets
+
+    def token_index(self, char_offset: int) -> int:
+        """
+        Return the index of the first token starting at or after a character offset.
+
+        Args:
+            char_offset (int): A character offset into the text.
+
+        Returns:
+            int: The token index, or the number of tokens if no token starts there or later.
+        """
+
+        return bisect_left(self.offsets, char_offset)
+
+    def count_tokens(self, start: int, end: int) -> int:
+        """
+        Count the tokens starting within a character range of the text.
+
+        Args:
+            start (int): The start character offset, inclusive.
+            end (int): The end character offset, exclusive.
+
+        Returns:
+            int: The number of tokens.
+        """
+
+        return self.token_index(end) - self.token_index(start)
+
+    def chunk_token_counts(self, chunks: List[str]) -> List[int]:
+        """
+        Count the tokens of each chunk of the text without encoding the chunks again.
+
+        Chunks are located in order in the text. A chunk that cannot be found, for example because
+        the splitter changed its whitespace, is encoded on its own instead.
+
+        Args:
+            chunks (List[str]): Consecutive parts of the text.
+
+        Returns:
+            List[int]: The number of tokens in each chunk.
+        """
+
+        counts = []
+        cursor = 0
+        for chunk in chunks:
+            position = self.text.find(chunk, cursor)
+            if position < 0:
+                counts.append(len(self.encoding.encode_ordinary(chunk)))
+                continue
+            cursor = position + len(chunk)
+            counts.append(self.count_tokens(position, cursor))
+        return counts
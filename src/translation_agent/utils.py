@@ -1,32 +1,166 @@
+import logging
 import os
+import queue
+import threading
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from contextvars import Context
+from contextvars import copy_context
+from functools import partial
+from typing import TYPE_CHECKING
+from typing import Callable
+from typing import Iterator
 from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TypeVar
 from typing import Union
 
-import openai
-import tiktoken
-from dotenv import load_dotenv
-from icecream import ic
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-
-
-load_dotenv()  # read local .env file
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from .backends import Completion
+from .backends import CompletionBackend
+from .backends import cache_model_name
+from .backends import get_backend
+from .backends import use_backend
+from .cache import CompletionCache
+from .chunking import split_tokenized_text
+from .context import FULL_DOCUMENT_CONTEXT
+from .context import ContextPolicy
+from .metrics import CallTimer
+from .metrics import MetricsCollector
+from .metrics import collect_metrics
+from .pipeline import ChunkPipeline
+from .ratelimit import get_rate_limiter
+from .routing import DEFAULT_MODEL
+from .routing import ModelRouter
+from .routing import record_usage
+from .tokenizer import TokenizedText
+from .tokenizer import count_tokens
+
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    import openai
+
+    from .gates import QualityGate
+    from .glossary import Glossary
+    from .memory import TranslationMemory
+
+# Created on first use by get_client, so that importing the package neither loads openai
+# nor requires an API key
+client: Optional["openai.OpenAI"] = None
+_client_lock = threading.Lock()
 
 MAX_TOKENS_PER_CHUNK = (
     1000  # if text is more than this many tokens, we'll break it up into
 )
 # discrete chunks to translate one chunk at a time
 
+MAX_CONCURRENT_REQUESTS = (
+    8  # max number of completion requests in flight per multichunk stage
+)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_completion_cache: Optional[CompletionCache] = None
+
+
+def openai_api_key() -> Optional[str]:
+    """Return the OpenAI API key from the environment, reading the local .env file first."""
+
+    from dotenv import load_dotenv
+
+    load_dotenv()  # read local .env file
+    return os.getenv("OPENAI_API_KEY")
+
+
+def get_client() -> "openai.OpenAI":
+    """
+    Return the shared OpenAI client, creating it on first use.
+
+    Returns:
+        openai.OpenAI: The shared client.
+    """
+
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                import openai
+
+                # Retries are left to the rate limiter, which also backs off the other requests
+                client = openai.OpenAI(api_key=openai_api_key(), max_retries=0)
+    return client
+
+
+def set_client(new_client: Optional["openai.OpenAI"]) -> None:
+    """
+    Replace the shared OpenAI client.
+
+    Args:
+        new_client (openai.OpenAI, optional): The client to use for all completions.
+            Pass None to have a default client created again on next use. Create it with max_retries=0
+            unless the rate limiter is disabled, or every retry of the limiter repeats the client's own.
+    """
+
+    global client
+    client = new_client
+
+
+def set_completion_cache(cache: Optional[CompletionCache]) -> None:
+    """
+    Install the cache consulted by get_completion and aget_completion.
+
+    Args:
+        cache (CompletionCache, optional): The cache to use, or None to disable caching.
+    """
+
+    global _completion_cache
+    _completion_cache = cache
+
+
+def get_completion_cache() -> Optional[CompletionCache]:
+    """Return the installed completion cache, or None if caching is disabled."""
+
+    return _completion_cache
+
+
+def send_request(
+    create: Callable[[], R], system_message: str, prompt: str
+) -> R:
+    """
+    Send a completion request through the process-wide rate limiter, if one is installed.
+
+    Args:
+        create (Callable[[], R]): Sends the request.
+        system_message (str): The system message of the request, counted against the token budget.
+        prompt (str): The prompt of the request, counted against the token budget.
+
+    Returns:
+        R: The response.
+    """
+
+    rate_limiter = get_rate_limiter()
+    if rate_limiter is None:
+        return create()
+    return rate_limiter.call(
+        create, lambda: count_tokens(system_message) + count_tokens(prompt)
+    )
+
 
 def get_completion(
     prompt: str,
     system_message: str = "You are a helpful assistant.",
-    model: str = "gpt-4-turbo",
+    model: str = DEFAULT_MODEL,
     temperature: float = 0.3,
     json_mode: bool = False,
+    use_cache: bool = True,
 ) -> Union[str, dict]:
     """
-        Generate a completion using the OpenAI API.
+    Generate a completion with the selected completion backend, the OpenAI API by default.
 
     Args:
         prompt (str): The user's prompt or query.
@@ -38,6 +172,8 @@ def get_completion(
             Defaults to 0.3.
         json_mode (bool, optional): Whether to return the response in JSON format.
             Defaults to False.
+        use_cache (bool, optional): Whether to consult and fill the completion cache installed with
+            set_completion_cache. Defaults to True.
 
     Returns:
         Union[str, dict]: The generated completion.
@@ -45,70 +181,321 @@ def get_completion(
             If json_mode is False, returns the generated text as a string.
     """
 
-    if json_mode:
-        response = client.chat.completions.create(
-            model=model,
-            temperature=temperature,
-            top_p=1,
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt},
-            ],
+    timer = CallTimer(model)
+    backend = get_backend()
+    cache = _completion_cache if use_cache else None
+    if cache is not None:
+        cache_key = cache.make_key(
+            cache_model_name(backend, model),
+            temperature,
+            system_message,
+            prompt,
+            json_mode,
         )
-        return response.choices[0].message.content
-    else:
-        response = client.chat.completions.create(
-            model=model,
-            temperature=temperature,
-            top_p=1,
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt},
-            ],
+        completion = cache.get(cache_key)
+        if completion is not None:
+            timer.finish(cache_hit=True)
+            return completion
+
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": prompt},
+    ]
+
+    def create() -> Completion:
+        timer.sending()
+        return backend.complete(messages, model, temperature, json_mode)
+
+    try:
+        response = send_request(create, system_message, prompt)
+    except Exception as error:
+        timer.finish(error=error)
+        raise
+    record_usage(response.usage)
+    timer.finish(response.usage)
+    completion = response.content
+
+    if cache is not None:
+        cache.set(cache_key, completion)
+
+    return completion
+
+
+def get_completion_stream(
+    prompt: str,
+    system_message: str = "You are a helpful assistant.",
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.3,
+    use_cache: bool = True,
+) -> Iterator[str]:
+    """
+    Generate a completion with the selected completion backend, yielding the text as it arrives.
+
+    Args:
+        prompt (str): The user's prompt or query.
+        system_message (str, optional): The system message to set the context for the assistant.
+            Defaults to "You are a helpful assistant.".
+        model (str, optional): The name of the OpenAI model to use for generating the completion.
+            Defaults to "gpt-4-turbo".
+        temperature (float, optional): The sampling temperature for controlling the randomness of the generated text.
+            Defaults to 0.3.
+        use_cache (bool, optional): Whether to consult and fill the completion cache installed with
+            set_completion_cache. A cached completion is yielded in one piece. Defaults to True.
+
+    Yields:
+        str: Consecutive pieces of the generated text.
+    """
+
+    timer = CallTimer(model)
+    backend = get_backend()
+    cache = _completion_cache if use_cache else None
+    if cache is not None:
+        cache_key = cache.make_key(
+            cache_model_name(backend, model),
+            temperature,
+            system_message,
+            prompt,
+            False,
         )
-        return response.choices[0].message.content
+        completion = cache.get(cache_key)
+        if completion is not None:
+            timer.finish(cache_hit=True)
+            yield completion
+            return
+
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": prompt},
+    ]
+
+    def start() -> Iterator[str]:
+        timer.sending()
+        return backend.stream(messages, model, temperature)
+
+    pieces = []
+    try:
+        deltas = send_request(start, system_message, prompt)
+        for delta in deltas:
+            pieces.append(delta)
+            yield delta
+    except Exception as error:
+        timer.finish(error=error)
+        raise
+    # Backends returning a CompletionStream report the usage once it is exhausted
+    usage = getattr(deltas, "usage", None)
+    record_usage(usage)
+    timer.finish(usage)
+
+    if cache is not None:
+        cache.set(cache_key, "".join(pieces))
+
+
+def complete_with_deltas(
+    prompt: str,
+    system_message: str,
+    model: str = DEFAULT_MODEL,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> str:
+    """
+    Generate a completion, streaming it to a callback if one is given.
+
+    Args:
+        prompt (str): The user's prompt or query.
+        system_message (str): The system message to set the context for the assistant.
+        model (str, optional): The model to use for the completion. Defaults to DEFAULT_MODEL.
+        on_delta (Callable[[str], None], optional): Called with each text delta. If None, the
+            completion is requested without streaming.
 
+    Returns:
+        str: The generated text.
+    """
 
-def one_chunk_initial_translation(
-    source_lang: str, target_lang: str, source_text: str
+    if on_delta is None:
+        return get_completion(prompt, system_message, model=model)
+    pieces = []
+    for delta in get_completion_stream(
+        prompt, system_message=system_message, model=model
+    ):
+        pieces.append(delta)
+        on_delta(delta)
+    return "".join(pieces)
+
+
+def map_concurrently(
+    func: Callable[[T], R],
+    items: List[T],
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+) -> List[R]:
+    """
+    Apply a function to every item using a bounded pool of worker threads.
+
+    Args:
+        func (Callable[[T], R]): The function to apply, typically one that issues a completion request.
+        items (List[T]): The items to process.
+        max_workers (int, optional): The maximum number of calls in flight at once.
+            Values below 2 run the calls serially in the calling thread. Defaults to MAX_CONCURRENT_REQUESTS.
+
+    Returns:
+        List[R]: The results, in the same order as the input items regardless of completion order.
+    """
+
+    if max_workers < 2 or len(items) < 2:
+        return [func(item) for item in items]
+
+    with ThreadPoolExecutor(
+        max_workers=min(max_workers, len(items))
+    ) as executor:
+        # Each call runs in a copy of the caller's context, so that the completion backend
+        # selected with backends.use_backend applies in the worker threads too
+        futures = [
+            executor.submit(copy_context().run, func, item) for item in items
+        ]
+        return [future.result() for future in futures]
+
+
+def references_section(
+    source_lang: str,
+    target_lang: str,
+    references: Optional[List[Tuple[str, str]]],
 ) -> str:
     """
-    Translate the entire text as one chunk using an LLM.
+    Format reference translations from a translation memory for an initial translation prompt.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for translation.
+        references (List[Tuple[str, str]], optional): (source, translation) pairs of similar texts.
+
+    Returns:
+        str: The prompt section, or an empty string if there are no references.
+    """
+
+    if not references:
+        return ""
+
+    examples = "\n".join(
+        f"""<REFERENCE>
+<{source_lang.upper()}>{source}</{source_lang.upper()}>
+<{target_lang.upper()}>{translation}</{target_lang.upper()}>
+</REFERENCE>"""
+        for source, translation in references
+    )
+    return f"""Approved translations of similar texts are given below for reference. \
+Reuse their wording and terminology where the texts match, but translate what the text actually says.
+
+{examples}
+
+"""
+
+
+def glossary_section(
+    source_lang: str,
+    target_lang: str,
+    terms: Optional[List[Tuple[str, str]]],
+) -> str:
+    """
+    Format the glossary entries used in a text for a translation or improvement prompt.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for translation.
+        terms (List[Tuple[str, str]], optional): (source, target) glossary entries.
+
+    Returns:
+        str: The prompt section, or an empty string if there are no terms.
+    """
+
+    if not terms:
+        return ""
+
+    entries = "\n".join(f"{source} = {target}" for source, target in terms)
+    return f"""The translation must use the following {source_lang} to {target_lang} glossary, \
+delimited by XML tags <GLOSSARY> and </GLOSSARY>, for the terms it lists:
+
+<GLOSSARY>
+{entries}
+</GLOSSARY>
+
+"""
+
+
+def one_chunk_initial_translation_prompt(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    references: Optional[List[Tuple[str, str]]] = None,
+    terms: Optional[List[Tuple[str, str]]] = None,
+) -> Tuple[str, str]:
+    """
+    Build the system message and prompt for translating the entire text as one chunk.
 
     Args:
         source_lang (str): The source language of the text.
         target_lang (str): The target language for translation.
         source_text (str): The text to be translated.
+        references (List[Tuple[str, str]], optional): (source, translation) pairs of similar texts from a translation memory, shown as examples.
+        terms (List[Tuple[str, str]], optional): (source, target) glossary entries used in the text, which the translation must follow.
 
     Returns:
-        str: The translated text.
+        Tuple[str, str]: The system message and the prompt.
     """
 
     system_message = f"You are an expert linguist, specializing in translation from {source_lang} to {target_lang}."
 
     translation_prompt = f"""This is an {source_lang} to {target_lang} translation, please provide the {target_lang} translation for this text. \
 Do not provide any explanations or text apart from the translation.
-{source_lang}: {source_text}
+{references_section(source_lang, target_lang, references)}{glossary_section(source_lang, target_lang, terms)}{source_lang}: {source_text}
 
 {target_lang}:"""
 
-    prompt = translation_prompt.format(source_text=source_text)
+    prompt = translation_prompt
+
+    return system_message, prompt
+
+
+def one_chunk_initial_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    model: str = DEFAULT_MODEL,
+    references: Optional[List[Tuple[str, str]]] = None,
+    terms: Optional[List[Tuple[str, str]]] = None,
+) -> str:
+    """
+    Translate the entire text as one chunk using an LLM.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for translation.
+        source_text (str): The text to be translated.
+        model (str): The model to use for the completion. Defaults to DEFAULT_MODEL.
+        references (List[Tuple[str, str]], optional): (source, translation) pairs of similar texts from a translation memory, shown as examples.
+        terms (List[Tuple[str, str]], optional): (source, target) glossary entries used in the text, which the translation must follow.
+
+    Returns:
+        str: The translated text.
+    """
+
+    system_message, prompt = one_chunk_initial_translation_prompt(
+        source_lang, target_lang, source_text, references, terms
+    )
 
-    translation = get_completion(prompt, system_message=system_message)
+    translation = get_completion(
+        prompt, system_message=system_message, model=model
+    )
 
     return translation
 
 
-def one_chunk_reflect_on_translation(
+def one_chunk_reflect_on_translation_prompt(
     source_lang: str,
     target_lang: str,
     source_text: str,
     translation_1: str,
     country: str = "",
-) -> str:
+) -> Tuple[str, str]:
     """
-    Use an LLM to reflect on the translation, treating the entire text as one chunk.
+    Build the system message and prompt for reflecting on a one-chunk translation.
 
     Args:
         source_lang (str): The source language of the text.
@@ -118,7 +505,7 @@ def one_chunk_reflect_on_translation(
         country (str): Country specified for target language.
 
     Returns:
-        str: The LLM's reflection on the translation, providing constructive criticism and suggestions for improvement.
+        Tuple[str, str]: The system message and the prompt.
     """
 
     system_message = f"You are an expert linguist specializing in translation from {source_lang} to {target_lang}. \
@@ -177,19 +564,53 @@ Output only the suggestions and nothing else."""
         source_text=source_text,
         translation_1=translation_1,
     )
-    reflection = get_completion(prompt, system_message=system_message)
+
+    return system_message, prompt
+
+
+def one_chunk_reflect_on_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    translation_1: str,
+    country: str = "",
+    model: str = DEFAULT_MODEL,
+) -> str:
+    """
+    Use an LLM to reflect on the translation, treating the entire text as one chunk.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language of the translation.
+        source_text (str): The original text in the source language.
+        translation_1 (str): The initial translation of the source text.
+        country (str): Country specified for target language.
+        model (str): The model to use for the completion. Defaults to DEFAULT_MODEL.
+
+    Returns:
+        str: The LLM's reflection on the translation, providing constructive criticism and suggestions for improvement.
+    """
+
+    system_message, prompt = one_chunk_reflect_on_translation_prompt(
+        source_lang, target_lang, source_text, translation_1, country
+    )
+
+    reflection = get_completion(
+        prompt, system_message=system_message, model=model
+    )
     return reflection
 
 
-def one_chunk_improve_translation(
+def one_chunk_improve_translation_prompt(
     source_lang: str,
     target_lang: str,
     source_text: str,
     translation_1: str,
     reflection: str,
-) -> str:
+    terms: Optional[List[Tuple[str, str]]] = None,
+) -> Tuple[str, str]:
     """
-    Use the reflection to improve the translation, treating the entire text as one chunk.
+    Build the system message and prompt for improving a one-chunk translation.
 
     Args:
         source_lang (str): The source language of the text.
@@ -197,9 +618,10 @@ def one_chunk_improve_translation(
         source_text (str): The original text in the source language.
         translation_1 (str): The initial translation of the source text.
         reflection (str): Expert suggestions and constructive criticism for improving the translation.
+        terms (List[Tuple[str, str]], optional): (source, target) glossary entries used in the text, which the translation must follow.
 
     Returns:
-        str: The improved translation based on the expert suggestions.
+        Tuple[str, str]: The system message and the prompt.
     """
 
     system_message = f"You are an expert linguist, specializing in translation editing from {source_lang} to {target_lang}."
@@ -230,15 +652,64 @@ Please take into account the expert suggestions when editing the translation. Ed
 (iv) terminology (inappropriate for context, inconsistent use), or
 (v) other errors.
 
-Output only the new translation and nothing else."""
+{glossary_section(source_lang, target_lang, terms)}Output only the new translation and nothing else."""
+
+    return system_message, prompt
+
+
+def one_chunk_improve_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    translation_1: str,
+    reflection: str,
+    model: str = DEFAULT_MODEL,
+    terms: Optional[List[Tuple[str, str]]] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> str:
+    """
+    Use the reflection to improve the translation, treating the entire text as one chunk.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for the translation.
+        source_text (str): The original text in the source language.
+        translation_1 (str): The initial translation of the source text.
+        reflection (str): Expert suggestions and constructive criticism for improving the translation.
+        model (str): The model to use for the completion. Defaults to DEFAULT_MODEL.
+        terms (List[Tuple[str, str]], optional): (source, target) glossary entries used in the text, which the translation must follow.
+        on_delta (Callable[[str], None], optional): If set, the improvement is streamed and each text delta is passed to it.
 
-    translation_2 = get_completion(prompt, system_message)
+    Returns:
+        str: The improved translation based on the expert suggestions.
+    """
+
+    system_message, prompt = one_chunk_improve_translation_prompt(
+        source_lang,
+        target_lang,
+        source_text,
+        translation_1,
+        reflection,
+        terms,
+    )
+
+    translation_2 = complete_with_deltas(
+        prompt, system_message, model, on_delta
+    )
 
     return translation_2
 
 
 def one_chunk_translate_text(
-    source_lang: str, target_lang: str, source_text: str, country: str = ""
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    country: str = "",
+    quality_gate: Optional["QualityGate"] = None,
+    model_router: Optional[ModelRouter] = None,
+    translation_memory: Optional["TranslationMemory"] = None,
+    glossary: Optional["Glossary"] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
 ) -> str:
     """
     Translate a single chunk of text from the source language to the target language.
@@ -252,21 +723,70 @@ def one_chunk_translate_text(
         target_lang (str): The target language for the translation.
         source_text (str): The text to be translated.
         country (str): Country specified for target language.
+        quality_gate (QualityGate, optional): Checked after the initial translation. If it passes, the reflect and improve stages are skipped.
+        model_router (ModelRouter, optional): Chooses the model of each stage and records its latency and cost. Defaults to DEFAULT_MODEL for every stage.
+        translation_memory (TranslationMemory, optional): Exact matches are returned without requests, fuzzy matches are shown as references to the initial translation, and new translations are stored.
+        glossary (Glossary, optional): The glossary terms found in each chunk are added to its initial translation and improvement prompts.
+        on_delta (Callable[[str], None], optional): If set, the final translation is passed to it as it is produced, as text deltas of the streamed improvement stage or in one piece when that stage is skipped.
     Returns:
         str: The improved translation of the source text.
     """
-    translation_1 = one_chunk_initial_translation(
-        source_lang, target_lang, source_text
-    )
 
-    reflection = one_chunk_reflect_on_translation(
-        source_lang, target_lang, source_text, translation_1, country
-    )
-    translation_2 = one_chunk_improve_translation(
-        source_lang, target_lang, source_text, translation_1, reflection
+    pipeline = ChunkPipeline(
+        source_lang,
+        target_lang,
+        source_text,
+        country,
+        model_router=model_router,
+        translation_memory=translation_memory,
+        glossary=glossary,
     )
+    if pipeline.stored is not None:
+        return pipeline.deliver(pipeline.stored, on_delta)
+
+    with pipeline.measure("initial"):
+        translation_1 = one_chunk_initial_translation(
+            source_lang,
+            target_lang,
+            source_text,
+            model=pipeline.models["initial"],
+            references=pipeline.references,
+            terms=pipeline.terms,
+        )
 
-    return translation_2
+    reflection = None
+    if quality_gate is not None:
+        verdict = quality_gate.evaluate(
+            source_lang, target_lang, source_text, translation_1, country
+        )
+        if verdict.passed:
+            return pipeline.deliver(pipeline.store(translation_1), on_delta)
+        reflection = verdict.reflection
+
+    if reflection is None:
+        with pipeline.measure("reflect"):
+            reflection = one_chunk_reflect_on_translation(
+                source_lang,
+                target_lang,
+                source_text,
+                translation_1,
+                country,
+                model=pipeline.models["reflect"],
+            )
+
+    with pipeline.measure("improve"):
+        translation_2 = one_chunk_improve_translation(
+            source_lang,
+            target_lang,
+            source_text,
+            translation_1,
+            reflection,
+            model=pipeline.models["improve"],
+            terms=pipeline.terms,
+            on_delta=on_delta,
+        )
+
+    return pipeline.store(translation_2)
 
 
 def num_tokens_in_string(
@@ -289,28 +809,57 @@ def num_tokens_in_string(
         >>> print(num_tokens)
         5
     """
-    encoding = tiktoken.get_encoding(encoding_name)
-    num_tokens = len(encoding.encode(input_str))
+    num_tokens = count_tokens(input_str, encoding_name)
     return num_tokens
 
 
-def multichunk_initial_translation(
-    source_lang: str, target_lang: str, source_text_chunks: List[str]
-) -> List[str]:
+def chunk_initial_translation_prompt(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    chunk_index: int,
+    context_policy: Optional[ContextPolicy] = None,
+    references: Optional[List[Tuple[str, str]]] = None,
+    terms: Optional[List[Tuple[str, str]]] = None,
+) -> Tuple[str, str]:
     """
-    Translate a text in multiple chunks from the source language to the target language.
+    Build the system message and prompt for translating one chunk of a multichunk text.
 
     Args:
         source_lang (str): The source language of the text.
         target_lang (str): The target language for translation.
-        source_text_chunks (List[str]): A list of text chunks to be translated.
+        source_text_chunks (List[str]): The source text divided into chunks.
+        chunk_index (int): The index of the chunk to translate.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context. Defaults to the full document.
+        references (List[Tuple[str, str]], optional): (source, translation) pairs of similar texts from a translation memory, shown as examples.
+        terms (List[Tuple[str, str]], optional): (source, target) glossary entries used in the text, which the translation must follow.
 
     Returns:
-        List[str]: A list of translated text chunks.
+        Tuple[str, str]: The system message and the prompt.
     """
 
     system_message = f"You are an expert linguist, specializing in translation from {source_lang} to {target_lang}."
 
+    policy = context_policy or FULL_DOCUMENT_CONTEXT
+    if policy.stable_prefix:
+        prompt = f"""<SOURCE_TEXT>
+{policy.context_text(source_text_chunks, chunk_index)}
+</SOURCE_TEXT>
+
+Your task is provide a professional translation from {source_lang} to {target_lang} of PART of the source text above, delimited by
+XML tags <SOURCE_TEXT> and </SOURCE_TEXT>. Translate only the part shown below between <TRANSLATE_THIS> and </TRANSLATE_THIS>.
+You can use the rest of the source text as context, but do not translate any of the other text.
+
+<TRANSLATE_THIS>
+{source_text_chunks[chunk_index]}
+</TRANSLATE_THIS>
+
+{references_section(source_lang, target_lang, references)}\
+{glossary_section(source_lang, target_lang, terms)}\
+Output only the translation of the portion you are asked to translate, and nothing else.
+"""
+        return system_message, prompt
+
     translation_prompt = """Your task is provide a professional translation from {source_lang} to {target_lang} of PART of a text.
 
 The source text is below, delimited by XML tags <SOURCE_TEXT> and </SOURCE_TEXT>. Translate only the part within the source text
@@ -326,57 +875,173 @@ To reiterate, you should translate only this part of the text, shown here again
 {chunk_to_translate}
 </TRANSLATE_THIS>
 
-Output only the translation of the portion you are asked to translate, and nothing else.
+{references}{glossary}Output only the translation of the portion you are asked to translate, and nothing else.
 """
 
-    translation_chunks = []
-    for i in range(len(source_text_chunks)):
-        # Will translate chunk i
-        tagged_text = (
-            "".join(source_text_chunks[0:i])
-            + "<TRANSLATE_THIS>"
-            + source_text_chunks[i]
-            + "</TRANSLATE_THIS>"
-            + "".join(source_text_chunks[i + 1 :])
-        )
+    tagged_text = policy.tagged_text(source_text_chunks, chunk_index)
 
-        prompt = translation_prompt.format(
-            source_lang=source_lang,
-            target_lang=target_lang,
-            tagged_text=tagged_text,
-            chunk_to_translate=source_text_chunks[i],
-        )
+    prompt = translation_prompt.format(
+        source_lang=source_lang,
+        target_lang=target_lang,
+        tagged_text=tagged_text,
+        chunk_to_translate=source_text_chunks[chunk_index],
+        references=references_section(source_lang, target_lang, references),
+        glossary=glossary_section(source_lang, target_lang, terms),
+    )
+
+    return system_message, prompt
+
+
+def chunk_initial_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    chunk_index: int,
+    context_policy: Optional[ContextPolicy] = None,
+    model: str = DEFAULT_MODEL,
+    references: Optional[List[Tuple[str, str]]] = None,
+    terms: Optional[List[Tuple[str, str]]] = None,
+) -> str:
+    """
+    Translate one chunk of a multichunk text, using the rest of the text as context.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for translation.
+        source_text_chunks (List[str]): The source text divided into chunks.
+        chunk_index (int): The index of the chunk to translate.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context. Defaults to the full document.
+        model (str): The model to use for the completion. Defaults to DEFAULT_MODEL.
+        references (List[Tuple[str, str]], optional): (source, translation) pairs of similar texts from a translation memory, shown as examples.
+        terms (List[Tuple[str, str]], optional): (source, target) glossary entries used in the text, which the translation must follow.
+
+    Returns:
+        str: The translation of the chunk.
+    """
+
+    system_message, prompt = chunk_initial_translation_prompt(
+        source_lang,
+        target_lang,
+        source_text_chunks,
+        chunk_index,
+        context_policy,
+        references,
+        terms,
+    )
+
+    translation = get_completion(
+        prompt, system_message=system_message, model=model
+    )
+
+    return translation
+
+
+def multichunk_initial_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    context_policy: Optional[ContextPolicy] = None,
+    model: str = DEFAULT_MODEL,
+) -> List[str]:
+    """
+    Translate a text in multiple chunks from the source language to the target language.
+
+    The chunks are independent of each other, so their completions are requested concurrently.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for translation.
+        source_text_chunks (List[str]): A list of text chunks to be translated.
+        max_workers (int): Maximum number of completion requests in flight at once.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context. Defaults to the full document.
+        model (str): The model to use for every completion of the stage. Defaults to DEFAULT_MODEL.
+
+    Returns:
+        List[str]: A list of translated text chunks.
+    """
 
-        translation = get_completion(prompt, system_message=system_message)
-        translation_chunks.append(translation)
+    translation_chunks = map_concurrently(
+        lambda i: chunk_initial_translation(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            i,
+            context_policy,
+            model=model,
+        ),
+        list(range(len(source_text_chunks))),
+        max_workers,
+    )
 
     return translation_chunks
 
 
-def multichunk_reflect_on_translation(
+def chunk_reflect_on_translation_prompt(
     source_lang: str,
     target_lang: str,
     source_text_chunks: List[str],
-    translation_1_chunks: List[str],
+    chunk_index: int,
+    translation_1_chunk: str,
     country: str = "",
-) -> List[str]:
+    context_policy: Optional[ContextPolicy] = None,
+) -> Tuple[str, str]:
     """
-    Provides constructive criticism and suggestions for improving a partial translation.
+    Build the system message and prompt for reflecting on the translation of one chunk.
 
     Args:
         source_lang (str): The source language of the text.
         target_lang (str): The target language of the translation.
         source_text_chunks (List[str]): The source text divided into chunks.
-        translation_1_chunks (List[str]): The translated chunks corresponding to the source text chunks.
+        chunk_index (int): The index of the chunk that was translated.
+        translation_1_chunk (str): The initial translation of the chunk.
         country (str): Country specified for target language.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context. Defaults to the full document.
 
     Returns:
-        List[str]: A list of reflections containing suggestions for improving each translated chunk.
+        Tuple[str, str]: The system message and the prompt.
     """
 
     system_message = f"You are an expert linguist specializing in translation from {source_lang} to {target_lang}. \
 You will be provided with a source text and its translation and your goal is to improve the translation."
 
+    policy = context_policy or FULL_DOCUMENT_CONTEXT
+    if policy.stable_prefix:
+        style = (
+            f"\nThe final style and tone of the translation should match the style of {target_lang} colloquially spoken in {country}."
+            if country != ""
+            else ""
+        )
+        prompt = f"""<SOURCE_TEXT>
+{policy.context_text(source_text_chunks, chunk_index)}
+</SOURCE_TEXT>
+
+Your task is to carefully read the source text above, delimited by XML tags <SOURCE_TEXT> and </SOURCE_TEXT>, and part of a translation
+of that text from {source_lang} to {target_lang}, and then give constructive criticism and helpful suggestions for improving the translation.{style}
+
+The part that has been translated is shown below between <TRANSLATE_THIS> and </TRANSLATE_THIS>. You can use the rest of the
+source text as context for critiquing the translated part.
+
+<TRANSLATE_THIS>
+{source_text_chunks[chunk_index]}
+</TRANSLATE_THIS>
+
+The translation of the indicated part, delimited below by <TRANSLATION> and </TRANSLATION>, is as follows:
+<TRANSLATION>
+{translation_1_chunk}
+</TRANSLATION>
+
+When writing suggestions, pay attention to whether there are ways to improve the translation's:
+(i) accuracy (by correcting errors of addition, mistranslation, omission, or untranslated text),
+(ii) fluency (by applying {target_lang} grammar, spelling and punctuation rules, and ensuring there are no unnecessary repetitions),
+(iii) style (by ensuring the translations reflect the style of the source text and takes into account any cultural context),
+(iv) terminology (by ensuring terminology use is consistent and reflects the source text domain; and by only ensuring you use equivalent idioms {target_lang}).
+
+Write a list of specific, helpful and constructive suggestions for improving the translation.
+Each suggestion should address one specific part of the translation.
+Output only the suggestions and nothing else."""
+        return system_message, prompt
+
     if country != "":
         reflection_prompt = """Your task is to carefully read a source text and part of a translation of that text from {source_lang} to {target_lang}, and then give constructive criticism and helpful suggestions for improving the translation.
 The final style and tone of the translation should match the style of {target_lang} colloquially spoken in {country}.
@@ -440,63 +1105,184 @@ Write a list of specific, helpful and constructive suggestions for improving the
 Each suggestion should address one specific part of the translation.
 Output only the suggestions and nothing else."""
 
-    reflection_chunks = []
-    for i in range(len(source_text_chunks)):
-        # Will translate chunk i
-        tagged_text = (
-            "".join(source_text_chunks[0:i])
-            + "<TRANSLATE_THIS>"
-            + source_text_chunks[i]
-            + "</TRANSLATE_THIS>"
-            + "".join(source_text_chunks[i + 1 :])
+    tagged_text = policy.tagged_text(source_text_chunks, chunk_index)
+
+    if country != "":
+        prompt = reflection_prompt.format(
+            source_lang=source_lang,
+            target_lang=target_lang,
+            tagged_text=tagged_text,
+            chunk_to_translate=source_text_chunks[chunk_index],
+            translation_1_chunk=translation_1_chunk,
+            country=country,
+        )
+    else:
+        prompt = reflection_prompt.format(
+            source_lang=source_lang,
+            target_lang=target_lang,
+            tagged_text=tagged_text,
+            chunk_to_translate=source_text_chunks[chunk_index],
+            translation_1_chunk=translation_1_chunk,
         )
-        if country != "":
-            prompt = reflection_prompt.format(
-                source_lang=source_lang,
-                target_lang=target_lang,
-                tagged_text=tagged_text,
-                chunk_to_translate=source_text_chunks[i],
-                translation_1_chunk=translation_1_chunks[i],
-                country=country,
-            )
-        else:
-            prompt = reflection_prompt.format(
-                source_lang=source_lang,
-                target_lang=target_lang,
-                tagged_text=tagged_text,
-                chunk_to_translate=source_text_chunks[i],
-                translation_1_chunk=translation_1_chunks[i],
-            )
 
-        reflection = get_completion(prompt, system_message=system_message)
-        reflection_chunks.append(reflection)
+    return system_message, prompt
 
-    return reflection_chunks
 
+def chunk_reflect_on_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    chunk_index: int,
+    translation_1_chunk: str,
+    country: str = "",
+    context_policy: Optional[ContextPolicy] = None,
+    model: str = DEFAULT_MODEL,
+) -> str:
+    """
+    Provides constructive criticism and suggestions for improving the translation of one chunk.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language of the translation.
+        source_text_chunks (List[str]): The source text divided into chunks.
+        chunk_index (int): The index of the chunk that was translated.
+        translation_1_chunk (str): The initial translation of the chunk.
+        country (str): Country specified for target language.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context. Defaults to the full document.
+        model (str): The model to use for the completion. Defaults to DEFAULT_MODEL.
 
-def multichunk_improve_translation(
+    Returns:
+        str: Suggestions for improving the translated chunk.
+    """
+
+    system_message, prompt = chunk_reflect_on_translation_prompt(
+        source_lang,
+        target_lang,
+        source_text_chunks,
+        chunk_index,
+        translation_1_chunk,
+        country,
+        context_policy,
+    )
+
+    reflection = get_completion(
+        prompt, system_message=system_message, model=model
+    )
+
+    return reflection
+
+
+def multichunk_reflect_on_translation(
     source_lang: str,
     target_lang: str,
     source_text_chunks: List[str],
     translation_1_chunks: List[str],
-    reflection_chunks: List[str],
+    country: str = "",
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    context_policy: Optional[ContextPolicy] = None,
+    model: str = DEFAULT_MODEL,
 ) -> List[str]:
     """
-    Improves the translation of a text from source language to target language by considering expert suggestions.
+    Provides constructive criticism and suggestions for improving a partial translation.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language of the translation.
+        source_text_chunks (List[str]): The source text divided into chunks.
+        translation_1_chunks (List[str]): The translated chunks corresponding to the source text chunks.
+        country (str): Country specified for target language.
+        max_workers (int): Maximum number of completion requests in flight at once.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context. Defaults to the full document.
+        model (str): The model to use for every completion of the stage. Defaults to DEFAULT_MODEL.
+
+    Returns:
+        List[str]: A list of reflections containing suggestions for improving each translated chunk.
+    """
+
+    reflection_chunks = map_concurrently(
+        lambda i: chunk_reflect_on_translation(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            i,
+            translation_1_chunks[i],
+            country,
+            context_policy,
+            model=model,
+        ),
+        list(range(len(source_text_chunks))),
+        max_workers,
+    )
+
+    return reflection_chunks
+
+
+def chunk_improve_translation_prompt(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    chunk_index: int,
+    translation_1_chunk: str,
+    reflection_chunk: str,
+    context_policy: Optional[ContextPolicy] = None,
+    terms: Optional[List[Tuple[str, str]]] = None,
+) -> Tuple[str, str]:
+    """
+    Build the system message and prompt for improving the translation of one chunk.
 
     Args:
         source_lang (str): The source language of the text.
         target_lang (str): The target language for translation.
         source_text_chunks (List[str]): The source text divided into chunks.
-        translation_1_chunks (List[str]): The initial translation of each chunk.
-        reflection_chunks (List[str]): Expert suggestions for improving each translated chunk.
+        chunk_index (int): The index of the chunk that was translated.
+        translation_1_chunk (str): The initial translation of the chunk.
+        reflection_chunk (str): Expert suggestions for improving the translated chunk.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context. Defaults to the full document.
+        terms (List[Tuple[str, str]], optional): (source, target) glossary entries used in the text, which the translation must follow.
 
     Returns:
-        List[str]: The improved translation of each chunk.
+        Tuple[str, str]: The system message and the prompt.
     """
 
     system_message = f"You are an expert linguist, specializing in translation editing from {source_lang} to {target_lang}."
 
+    policy = context_policy or FULL_DOCUMENT_CONTEXT
+    if policy.stable_prefix:
+        prompt = f"""<SOURCE_TEXT>
+{policy.context_text(source_text_chunks, chunk_index)}
+</SOURCE_TEXT>
+
+Your task is to carefully read, then improve, a translation from {source_lang} to {target_lang} of part of the source text above,
+delimited by XML tags <SOURCE_TEXT> and </SOURCE_TEXT>, taking into account a set of expert suggestions and constructive criticisms.
+You can use the rest of the source text as context, but need to provide a translation only of the part shown below
+between <TRANSLATE_THIS> and </TRANSLATE_THIS>.
+
+<TRANSLATE_THIS>
+{source_text_chunks[chunk_index]}
+</TRANSLATE_THIS>
+
+The translation of the indicated part, delimited below by <TRANSLATION> and </TRANSLATION>, is as follows:
+<TRANSLATION>
+{translation_1_chunk}
+</TRANSLATION>
+
+The expert translations of the indicated part, delimited below by <EXPERT_SUGGESTIONS> and </EXPERT_SUGGESTIONS>, is as follows:
+<EXPERT_SUGGESTIONS>
+{reflection_chunk}
+</EXPERT_SUGGESTIONS>
+
+Taking into account the expert suggestions rewrite the translation to improve it, paying attention
+to whether there are ways to improve the translation's
+
+(i) accuracy (by correcting errors of addition, mistranslation, omission, or untranslated text),
+(ii) fluency (by applying {target_lang} grammar, spelling and punctuation rules and ensuring there are no unnecessary repetitions), \
+(iii) style (by ensuring the translations reflect the style of the source text)
+(iv) terminology (inappropriate for context, inconsistent use), or
+(v) other errors.
+
+{glossary_section(source_lang, target_lang, terms)}Output only the new translation of the indicated part and nothing else."""
+        return system_message, prompt
+
     improvement_prompt = """Your task is to carefully read, then improve, a translation from {source_lang} to {target_lang}, taking into
 account a set of expert suggestions and constructive criticisms. Below, the source text, initial translation, and expert suggestions are provided.
 
@@ -532,72 +1318,478 @@ to whether there are ways to improve the translation's
 (iv) terminology (inappropriate for context, inconsistent use), or
 (v) other errors.
 
-Output only the new translation of the indicated part and nothing else."""
-
-    translation_2_chunks = []
-    for i in range(len(source_text_chunks)):
-        # Will translate chunk i
-        tagged_text = (
-            "".join(source_text_chunks[0:i])
-            + "<TRANSLATE_THIS>"
-            + source_text_chunks[i]
-            + "</TRANSLATE_THIS>"
-            + "".join(source_text_chunks[i + 1 :])
+{glossary}Output only the new translation of the indicated part and nothing else."""
+
+    tagged_text = policy.tagged_text(source_text_chunks, chunk_index)
+
+    prompt = improvement_prompt.format(
+        source_lang=source_lang,
+        target_lang=target_lang,
+        tagged_text=tagged_text,
+        chunk_to_translate=source_text_chunks[chunk_index],
+        translation_1_chunk=translation_1_chunk,
+        reflection_chunk=reflection_chunk,
+        glossary=glossary_section(source_lang, target_lang, terms),
+    )
+
+    return system_message, prompt
+
+
+def chunk_improve_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    chunk_index: int,
+    translation_1_chunk: str,
+    reflection_chunk: str,
+    context_policy: Optional[ContextPolicy] = None,
+    model: str = DEFAULT_MODEL,
+    terms: Optional[List[Tuple[str, str]]] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> str:
+    """
+    Improves the translation of one chunk by considering expert suggestions.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for translation.
+        source_text_chunks (List[str]): The source text divided into chunks.
+        chunk_index (int): The index of the chunk that was translated.
+        translation_1_chunk (str): The initial translation of the chunk.
+        reflection_chunk (str): Expert suggestions for improving the translated chunk.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context. Defaults to the full document.
+        model (str): The model to use for the completion. Defaults to DEFAULT_MODEL.
+        terms (List[Tuple[str, str]], optional): (source, target) glossary entries used in the text, which the translation must follow.
+        on_delta (Callable[[str], None], optional): If set, the improvement is streamed and each text delta is passed to it.
+
+    Returns:
+        str: The improved translation of the chunk.
+    """
+
+    system_message, prompt = chunk_improve_translation_prompt(
+        source_lang,
+        target_lang,
+        source_text_chunks,
+        chunk_index,
+        translation_1_chunk,
+        reflection_chunk,
+        context_policy,
+        terms,
+    )
+
+    translation_2 = complete_with_deltas(
+        prompt, system_message, model, on_delta
+    )
+
+    return translation_2
+
+
+def multichunk_improve_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    translation_1_chunks: List[str],
+    reflection_chunks: List[str],
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    context_policy: Optional[ContextPolicy] = None,
+    model: str = DEFAULT_MODEL,
+) -> List[str]:
+    """
+    Improves the translation of a text from source language to target language by considering expert suggestions.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for translation.
+        source_text_chunks (List[str]): The source text divided into chunks.
+        translation_1_chunks (List[str]): The initial translation of each chunk.
+        reflection_chunks (List[str]): Expert suggestions for improving each translated chunk.
+        max_workers (int): Maximum number of completion requests in flight at once.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context. Defaults to the full document.
+        model (str): The model to use for every completion of the stage. Defaults to DEFAULT_MODEL.
+
+    Returns:
+        List[str]: The improved translation of each chunk.
+    """
+
+    translation_2_chunks = map_concurrently(
+        lambda i: chunk_improve_translation(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            i,
+            translation_1_chunks[i],
+            reflection_chunks[i],
+            context_policy,
+            model=model,
+        ),
+        list(range(len(source_text_chunks))),
+        max_workers,
+    )
+
+    return translation_2_chunks
+
+
+def chunk_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    chunk_index: int,
+    country: str = "",
+    context_policy: Optional[ContextPolicy] = None,
+    quality_gate: Optional["QualityGate"] = None,
+    model_router: Optional[ModelRouter] = None,
+    translation_memory: Optional["TranslationMemory"] = None,
+    glossary: Optional["Glossary"] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> str:
+    """
+    Run one chunk through the translate, reflect and improve stages.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for translation.
+        source_text_chunks (List[str]): The source text divided into chunks.
+        chunk_index (int): The index of the chunk to translate.
+        country (str): Country specified for target language.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context. Defaults to the full document.
+        quality_gate (QualityGate, optional): Checked after the initial translation. If it passes, the reflect and improve stages are skipped.
+        model_router (ModelRouter, optional): Chooses the model of each stage and records its latency and cost. Defaults to DEFAULT_MODEL for every stage.
+        translation_memory (TranslationMemory, optional): Exact matches are returned without requests, fuzzy matches are shown as references to the initial translation, and new translations are stored.
+        glossary (Glossary, optional): The glossary terms found in each chunk are added to its initial translation and improvement prompts.
+        on_delta (Callable[[str], None], optional): If set, the final translation is passed to it as it is produced, as text deltas of the streamed improvement stage or in one piece when that stage is skipped.
+
+    Returns:
+        str: The improved translation of the chunk.
+    """
+
+    source_text_chunk = source_text_chunks[chunk_index]
+    pipeline = ChunkPipeline(
+        source_lang,
+        target_lang,
+        source_text_chunk,
+        country,
+        model_router=model_router,
+        translation_memory=translation_memory,
+        glossary=glossary,
+        chunk_index=chunk_index,
+    )
+    if pipeline.stored is not None:
+        return pipeline.deliver(pipeline.stored, on_delta)
+
+    with pipeline.measure("initial"):
+        translation_1_chunk = chunk_initial_translation(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            chunk_index,
+            context_policy,
+            model=pipeline.models["initial"],
+            references=pipeline.references,
+            terms=pipeline.terms,
         )
 
-        prompt = improvement_prompt.format(
-            source_lang=source_lang,
-            target_lang=target_lang,
-            tagged_text=tagged_text,
-            chunk_to_translate=source_text_chunks[i],
-            translation_1_chunk=translation_1_chunks[i],
-            reflection_chunk=reflection_chunks[i],
+    reflection_chunk = None
+    if quality_gate is not None:
+        verdict = quality_gate.evaluate(
+            source_lang,
+            target_lang,
+            source_text_chunk,
+            translation_1_chunk,
+            country,
         )
+        if verdict.passed:
+            return pipeline.deliver(
+                pipeline.store(translation_1_chunk), on_delta
+            )
+        reflection_chunk = verdict.reflection
+
+    if reflection_chunk is None:
+        with pipeline.measure("reflect"):
+            reflection_chunk = chunk_reflect_on_translation(
+                source_lang,
+                target_lang,
+                source_text_chunks,
+                chunk_index,
+                translation_1_chunk,
+                country,
+                context_policy,
+                model=pipeline.models["reflect"],
+            )
 
-        translation_2 = get_completion(prompt, system_message=system_message)
-        translation_2_chunks.append(translation_2)
+    with pipeline.measure("improve"):
+        translation_2_chunk = chunk_improve_translation(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            chunk_index,
+            translation_1_chunk,
+            reflection_chunk,
+            context_policy,
+            model=pipeline.models["improve"],
+            terms=pipeline.terms,
+            on_delta=on_delta,
+        )
 
-    return translation_2_chunks
+    return pipeline.store(translation_2_chunk)
+
+
+def submit_multichunk_translation(
+    executor: Executor,
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    country: str = "",
+    on_chunk_complete: Optional[Callable[[int, str], None]] = None,
+    context_policy: Optional[ContextPolicy] = None,
+    quality_gate: Optional["QualityGate"] = None,
+    model_router: Optional[ModelRouter] = None,
+    translation_memory: Optional["TranslationMemory"] = None,
+    glossary: Optional["Glossary"] = None,
+) -> List[Future[str]]:
+    """
+    Schedule every chunk's translate, reflect and improve pipeline on an executor.
+
+    Each chunk moves on to its next stage as soon as its own previous stage is done,
+    so no chunk waits for the slowest chunk of a stage.
+
+    Args:
+        executor (Executor): The executor that runs the per-chunk pipelines.
+            Its worker count bounds the number of completion requests in flight.
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for translation.
+        source_text_chunks (List[str]): The source text divided into chunks.
+        country (str): Country specified for target language.
+        on_chunk_complete (Callable[[int, str], None], optional): Called from the worker thread with the
+            chunk index and its improved translation as soon as that chunk is done.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context. Defaults to the full document.
+        quality_gate (QualityGate, optional): Checked after the initial translation. If it passes, the reflect and improve stages are skipped.
+        model_router (ModelRouter, optional): Chooses the model of each stage and records its latency and cost. Defaults to DEFAULT_MODEL for every stage.
+        translation_memory (TranslationMemory, optional): Exact matches are returned without requests, fuzzy matches are shown as references to the initial translation, and new translations are stored.
+        glossary (Glossary, optional): The glossary terms found in each chunk are added to its initial translation and improvement prompts.
+
+    Returns:
+        List[Future[str]]: One future per chunk, in document order, resolving to the improved translation.
+    """
+
+    def run(chunk_index: int) -> str:
+        translation_2_chunk = chunk_translation(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            chunk_index,
+            country,
+            context_policy,
+            quality_gate,
+            model_router,
+            translation_memory,
+            glossary,
+        )
+        if on_chunk_complete is not None:
+            on_chunk_complete(chunk_index, translation_2_chunk)
+        return translation_2_chunk
+
+    return [
+        executor.submit(copy_context().run, run, i)
+        for i in range(len(source_text_chunks))
+    ]
 
 
 def multichunk_translation(
-    source_lang, target_lang, source_text_chunks, country: str = ""
+    source_lang,
+    target_lang,
+    source_text_chunks,
+    country: str = "",
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    on_chunk_complete: Optional[Callable[[int, str], None]] = None,
+    context_policy: Optional[ContextPolicy] = None,
+    quality_gate: Optional["QualityGate"] = None,
+    model_router: Optional[ModelRouter] = None,
+    translation_memory: Optional["TranslationMemory"] = None,
+    glossary: Optional["Glossary"] = None,
 ):
     """
     Improves the translation of multiple text chunks based on the initial translation and reflection.
 
+    Chunks are pipelined: a chunk is reflected on as soon as its own initial translation is done
+    and improved as soon as its own reflection is done.
+
     Args:
         source_lang (str): The source language of the text chunks.
         target_lang (str): The target language for translation.
         source_text_chunks (List[str]): The list of source text chunks to be translated.
-        translation_1_chunks (List[str]): The list of initial translations for each source text chunk.
-        reflection_chunks (List[str]): The list of reflections on the initial translations.
         country (str): Country specified for target language
+        max_workers (int): Maximum number of completion requests in flight at once.
+        on_chunk_complete (Callable[[int, str], None], optional): Called with the chunk index and
+            its improved translation as soon as that chunk is done.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context. Defaults to the full document.
+        quality_gate (QualityGate, optional): Checked after the initial translation. If it passes, the reflect and improve stages are skipped.
+        model_router (ModelRouter, optional): Chooses the model of each stage and records its latency and cost. Defaults to DEFAULT_MODEL for every stage.
+        translation_memory (TranslationMemory, optional): Exact matches are returned without requests, fuzzy matches are shown as references to the initial translation, and new translations are stored.
+        glossary (Glossary, optional): The glossary terms found in each chunk are added to its initial translation and improvement prompts.
     Returns:
         List[str]: The list of improved translations for each source text chunk.
     """
 
-    translation_1_chunks = multichunk_initial_translation(
-        source_lang, target_lang, source_text_chunks
-    )
+    if max_workers < 2 or len(source_text_chunks) < 2:
+        translation_2_chunks = []
+        for i in range(len(source_text_chunks)):
+            translation_2_chunk = chunk_translation(
+                source_lang,
+                target_lang,
+                source_text_chunks,
+                i,
+                country,
+                context_policy,
+                quality_gate,
+                model_router,
+                translation_memory,
+                glossary,
+            )
+            if on_chunk_complete is not None:
+                on_chunk_complete(i, translation_2_chunk)
+            translation_2_chunks.append(translation_2_chunk)
+        return translation_2_chunks
+
+    with ThreadPoolExecutor(
+        max_workers=min(max_workers, len(source_text_chunks))
+    ) as executor:
+        futures = submit_multichunk_translation(
+            executor,
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            country,
+            on_chunk_complete,
+            context_policy,
+            quality_gate,
+            model_router,
+            translation_memory,
+            glossary,
+        )
+        translation_2_chunks = [future.result() for future in futures]
 
-    reflection_chunks = multichunk_reflect_on_translation(
-        source_lang,
-        target_lang,
-        source_text_chunks,
-        translation_1_chunks,
-        country,
-    )
+    return translation_2_chunks
 
-    translation_2_chunks = multichunk_improve_translation(
-        source_lang,
-        target_lang,
-        source_text_chunks,
-        translation_1_chunks,
-        reflection_chunks,
+
+_END_OF_CHUNK = object()
+
+
+def stream_pipelines(
+    pipelines: List[Callable[..., str]],
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    stream_tokens: bool = False,
+    context: Optional[Context] = None,
+) -> Iterator[str]:
+    """
+    Run translation pipelines on a thread pool, yielding their output in order as it becomes available.
+
+    The output of a pipeline is yielded once it and every earlier pipeline are done; the output of
+    later pipelines that finish first is held back until then.
+
+    Args:
+        pipelines (List[Callable[..., str]]): Functions returning a translation, such as partial
+            applications of chunk_translation. With stream_tokens, each is called with an on_delta
+            keyword argument.
+        max_workers (int): Maximum number of pipelines running at once.
+        stream_tokens (bool, optional): Whether to yield the text deltas passed to on_delta instead of
+            one item per pipeline. Defaults to False.
+        context (contextvars.Context, optional): The context each pipeline runs in a copy of. Defaults to the caller's context.
+
+    Yields:
+        str: The output of each pipeline or, with stream_tokens, consecutive pieces of it.
+    """
+
+    outputs = [queue.Queue() for _ in pipelines]
+
+    def run(index: int) -> None:
+        output = outputs[index]
+        try:
+            if stream_tokens:
+                pipelines[index](on_delta=output.put)
+            else:
+                output.put(pipelines[index]())
+        except Exception as error:  # noqa: BLE001 - re-raised by the consumer
+            output.put(error)
+        output.put(_END_OF_CHUNK)
+
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, min(max_workers, len(pipelines)))
     )
+    try:
+        if context is None:
+            context = copy_context()
+        for i in range(len(pipelines)):
+            executor.submit(context.copy().run, run, i)
+        for output in outputs:
+            while True:
+                item = output.get()
+                if item is _END_OF_CHUNK:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+    finally:
+        # Stop scheduling pipelines if the caller abandons the stream
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def multichunk_translation_stream(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    country: str = "",
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    context_policy: Optional[ContextPolicy] = None,
+    stream_tokens: bool = False,
+    quality_gate: Optional["QualityGate"] = None,
+    model_router: Optional[ModelRouter] = None,
+    translation_memory: Optional["TranslationMemory"] = None,
+    glossary: Optional["Glossary"] = None,
+    context: Optional[Context] = None,
+) -> Iterator[str]:
+    """
+    Translate multiple text chunks, yielding the translation in document order as it becomes available.
 
-    return translation_2_chunks
+    Chunks are pipelined as in multichunk_translation. The output of a chunk is yielded once it and
+    every earlier chunk are done; the output of later chunks that finish first is held back until then.
+
+    Args:
+        source_lang (str): The source language of the text chunks.
+        target_lang (str): The target language for translation.
+        source_text_chunks (List[str]): The list of source text chunks to be translated.
+        country (str): Country specified for target language.
+        max_workers (int): Maximum number of completion requests in flight at once.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context. Defaults to the full document.
+        stream_tokens (bool, optional): Whether to stream the improvement stage of every chunk and yield
+            its text deltas, instead of one item per chunk. Defaults to False.
+        quality_gate (QualityGate, optional): Checked after the initial translation. If it passes, the reflect and improve stages are skipped.
+        model_router (ModelRouter, optional): Chooses the model of each stage and records its latency and cost. Defaults to DEFAULT_MODEL for every stage.
+        translation_memory (TranslationMemory, optional): Exact matches are returned without requests, fuzzy matches are shown as references to the initial translation, and new translations are stored.
+        glossary (Glossary, optional): The glossary terms found in each chunk are added to its initial translation and improvement prompts.
+        context (contextvars.Context, optional): The context each pipeline runs in a copy of. Defaults to the caller's context.
+
+    Yields:
+        str: The improved translation of each chunk or, with stream_tokens, consecutive pieces of it.
+            Joined together they give the full translation.
+    """
+
+    pipelines = [
+        partial(
+            chunk_translation,
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            i,
+            country,
+            context_policy,
+            quality_gate=quality_gate,
+            model_router=model_router,
+            translation_memory=translation_memory,
+            glossary=glossary,
+        )
+        for i in range(len(source_text_chunks))
+    ]
+    yield from stream_pipelines(pipelines, max_workers, stream_tokens, context)
 
 
 def calculate_chunk_size(token_count: int, token_limit: int) -> int:
@@ -641,47 +1833,218 @@ def calculate_chunk_size(token_count: int, token_limit: int) -> int:
     return chunk_size
 
 
+def split_text_into_chunks(source_text: str, chunk_size: int) -> List[str]:
+    """
+    Split a text into chunks of at most chunk_size tokens, preferring paragraph and sentence boundaries.
+
+    Args:
+        source_text (str): The text to be split.
+        chunk_size (int): The maximum number of tokens per chunk.
+
+    Returns:
+        List[str]: The chunks of the text, in document order.
+    """
+
+    return split_tokenized_text(TokenizedText(source_text), chunk_size)
+
+
+def split_source_text(
+    tokenized_text: TokenizedText, max_tokens: int
+) -> List[str]:
+    """
+    Split a text that is too long to translate in one go into token-sized chunks.
+
+    Args:
+        tokenized_text (TokenizedText): The tokenized text to be split.
+        max_tokens (int): The maximum number of tokens allowed per chunk.
+
+    Returns:
+        List[str]: The chunks of the text, in document order.
+    """
+
+    token_size = calculate_chunk_size(
+        token_count=len(tokenized_text), token_limit=max_tokens
+    )
+
+    logger.debug("Splitting source text into chunks of %d tokens", token_size)
+
+    return split_tokenized_text(tokenized_text, token_size)
+
+
 def translate(
     source_lang,
     target_lang,
     source_text,
     country,
     max_tokens=MAX_TOKENS_PER_CHUNK,
+    max_workers=MAX_CONCURRENT_REQUESTS,
+    context_policy=None,
+    quality_gate=None,
+    model_router=None,
+    backend=None,
+    translation_memory=None,
+    glossary=None,
+    on_metrics=None,
 ):
     """Translate the source_text from source_lang to target_lang."""
 
-    num_tokens_in_text = num_tokens_in_string(source_text)
+    with use_backend(backend), collect_metrics() as collector:
+        tokenized_text = TokenizedText(source_text)
+        num_tokens_in_text = len(tokenized_text)
 
-    ic(num_tokens_in_text)
+        logger.debug("Source text has %d tokens", num_tokens_in_text)
 
-    if num_tokens_in_text < max_tokens:
-        ic("Translating text as single chunk")
+        if num_tokens_in_text < max_tokens:
+            logger.info("Translating text as a single chunk")
 
-        final_translation = one_chunk_translate_text(
-            source_lang, target_lang, source_text, country
-        )
+            final_translation = one_chunk_translate_text(
+                source_lang,
+                target_lang,
+                source_text,
+                country,
+                quality_gate,
+                model_router,
+                translation_memory,
+                glossary,
+            )
 
-        return final_translation
+        else:
+            logger.info("Translating text as multiple chunks")
+
+            source_text_chunks = split_source_text(tokenized_text, max_tokens)
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Chunk token counts: %s",
+                    tokenized_text.chunk_token_counts(source_text_chunks),
+                )
+
+            translation_2_chunks = multichunk_translation(
+                source_lang,
+                target_lang,
+                source_text_chunks,
+                country,
+                max_workers,
+                context_policy=context_policy,
+                quality_gate=quality_gate,
+                model_router=model_router,
+                translation_memory=translation_memory,
+                glossary=glossary,
+            )
 
-    else:
-        ic("Translating text as multiple chunks")
+            final_translation = "".join(translation_2_chunks)
 
-        token_size = calculate_chunk_size(
-            token_count=num_tokens_in_text, token_limit=max_tokens
-        )
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Translation metrics: %s", collector.to_json())
 
-        ic(token_size)
+    if on_metrics is not None:
+        on_metrics(collector)
 
-        text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            model_name="gpt-4",
-            chunk_size=token_size,
-            chunk_overlap=0,
-        )
+    return final_translation
 
-        source_text_chunks = text_splitter.split_text(source_text)
 
-        translation_2_chunks = multichunk_translation(
-            source_lang, target_lang, source_text_chunks, country
-        )
+def translate_stream(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    country: str,
+    max_tokens: int = MAX_TOKENS_PER_CHUNK,
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    context_policy: Optional[ContextPolicy] = None,
+    stream_tokens: bool = False,
+    quality_gate: Optional["QualityGate"] = None,
+    model_router: Optional[ModelRouter] = None,
+    backend: Optional[CompletionBackend] = None,
+    translation_memory: Optional["TranslationMemory"] = None,
+    glossary: Optional["Glossary"] = None,
+    on_metrics: Optional[Callable[[MetricsCollector], None]] = None,
+) -> Iterator[str]:
+    """
+    Translate the source_text from source_lang to target_lang, yielding the translation as it is produced.
+
+    Joining everything yielded gives the same text translate returns. The first chunk is available
+    after roughly one chunk's pipeline time instead of the whole document's.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for translation.
+        source_text (str): The text to be translated.
+        country (str): Country specified for target language.
+        max_tokens (int): The maximum number of tokens per chunk.
+        max_workers (int): Maximum number of completion requests in flight at once.
+        context_policy (ContextPolicy, optional): How much of the surrounding document to include as context.
+        stream_tokens (bool, optional): Whether to yield the text deltas of the improvement stage as the
+            model generates them, instead of one item per finished chunk. Defaults to False.
+        quality_gate (QualityGate, optional): Checked after the initial translation. If it passes, the reflect and improve stages are skipped.
+        model_router (ModelRouter, optional): Chooses the model of each stage and records its latency and cost. Defaults to DEFAULT_MODEL for every stage.
+        backend (CompletionBackend, optional): The backend of every request. Defaults to get_backend().
+        translation_memory (TranslationMemory, optional): Exact matches are returned without requests, fuzzy matches are shown as references to the initial translation, and new translations are stored.
+        glossary (Glossary, optional): The glossary terms found in each chunk are added to its initial translation and improvement prompts.
+        on_metrics (Callable[[MetricsCollector], None], optional): Called with the metrics of the run once it is done.
+
+    Yields:
+        str: Consecutive parts of the translation, in document order.
+    """
+
+    # The backend and the metrics collector are set in a context of the stream's own,
+    # which its pipelines run in. The stream is suspended between items, and values set
+    # in the caller's context would leak to the caller's code meanwhile.
+    context = copy_context()
+    stack = ExitStack()
+    context.run(stack.enter_context, use_backend(backend))
+    collector = context.run(stack.enter_context, collect_metrics())
+    try:
+        tokenized_text = TokenizedText(source_text)
+        num_tokens_in_text = len(tokenized_text)
+
+        logger.debug("Source text has %d tokens", num_tokens_in_text)
+
+        if num_tokens_in_text < max_tokens:
+            logger.info("Translating text as a single chunk")
+
+            pipeline = partial(
+                one_chunk_translate_text,
+                source_lang,
+                target_lang,
+                source_text,
+                country,
+                quality_gate=quality_gate,
+                model_router=model_router,
+                translation_memory=translation_memory,
+                glossary=glossary,
+            )
+            yield from stream_pipelines([pipeline], 1, stream_tokens, context)
+
+        else:
+            logger.info("Translating text as multiple chunks")
+
+            source_text_chunks = split_source_text(tokenized_text, max_tokens)
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Chunk token counts: %s",
+                    tokenized_text.chunk_token_counts(source_text_chunks),
+                )
+
+            yield from multichunk_translation_stream(
+                source_lang,
+                target_lang,
+                source_text_chunks,
+                country,
+                max_workers,
+                context_policy,
+                stream_tokens,
+                quality_gate=quality_gate,
+                model_router=model_router,
+                translation_memory=translation_memory,
+                glossary=glossary,
+                context=context,
+            )
+    finally:
+        context.run(stack.close)
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Translation metrics: %s", collector.to_json())
 
-        return "".join(translation_2_chunks)
+    if on_metrics is not None:
+        on_metrics(collector)
@@ -0,0 +1,25 @@
+import pytest
+import tiktoken
+
+from translation_agent.tokenizer import get_encoding
+from translation_agent.tokenizer import token_byte_lengths
+
+
+@pytest.fixture
+def byte_encoding(mocker):
+    # One token per byte, so the tests do not download a BPE file
+    encoding = tiktoken.Encoding(
+        name="bytes",
+        pat_str=r"\S+|\s+",
+        mergeable_ranks={bytes([i]): i for i in range(256)},
+        special_tokens={},
+    )
+    get_encoding.cache_clear()
+    token_byte_lengths.cache_clear()
+    mock_get_encoding = mocker.patch(
+        "tiktoken.get_encoding",
+        return_value=encoding,
+    )
+    yield mock_get_encoding
+    get_encoding.cache_clear()
+    token_byte_lengths.cache_clear()
@@ -1,5 +1,7 @@
 import json
 import os
+import threading
+import time
 from unittest.mock import patch
 
 import openai
@@ -8,6 +10,8 @@ from dotenv import load_dotenv
 
 # from translation_agent.utils import find_sentence_starts
 from translation_agent.utils import get_completion
+from translation_agent.utils import multichunk_initial_translation
+from translation_agent.utils import multichunk_translation
 from translation_agent.utils import num_tokens_in_string
 from translation_agent.utils import one_chunk_improve_translation
 from translation_agent.utils import one_chunk_initial_translation
@@ -90,7 +94,9 @@ Do not provide any explanations or text apart from the translation.
 {target_lang}:"""
 
         mock_get_completion.assert_called_once_with(
-            expected_prompt, system_message=expected_system_message
+            expected_prompt,
+            system_message=expected_system_message,
+            model="gpt-4-turbo",
         )
 
 
@@ -145,7 +151,9 @@ Output only the suggestions and nothing else."""
         expected_system_message = f"You are an expert linguist specializing in translation from {source_lang} to {target_lang}. \
 You will be provided with a source text and its translation and your goal is to improve the translation."
         mock_get_completion.assert_called_once_with(
-            expected_prompt, system_message=expected_system_message
+            expected_prompt,
+            system_message=expected_system_message,
+            model="gpt-4-turbo",
         )
 
 
@@ -211,7 +219,7 @@ Output only the new translation and nothing else."""
     expected_system_message = f"You are an expert linguist, specializing in translation editing from English to Spanish."
 
     mock_get_completion.assert_called_once_with(
-        expected_prompt, expected_system_message
+        expected_prompt, expected_system_message, model="gpt-4-turbo"
     )
 
 
@@ -249,13 +257,30 @@ def test_one_chunk_translate_text(mocker):
 
     # Assert that the helper functions were called with the correct arguments
     mock_initial_translation.assert_called_once_with(
-        source_lang, target_lang, source_text
+        source_lang,
+        target_lang,
+        source_text,
+        model="gpt-4-turbo",
+        references=None,
+        terms=None,
     )
     mock_reflect_on_translation.assert_called_once_with(
-        source_lang, target_lang, source_text, translation_1, country
+        source_lang,
+        target_lang,
+        source_text,
+        translation_1,
+        country,
+        model="gpt-4-turbo",
     )
     mock_improve_translation.assert_called_once_with(
-        source_lang, target_lang, source_text, translation_1, reflection
+        source_lang,
+        target_lang,
+        source_text,
+        translation_1,
+        reflection,
+        model="gpt-4-turbo",
+        terms=None,
+        on_delta=None,
     )
 
 
@@ -287,3 +312,66 @@ def test_num_tokens_in_string():
     assert (
         num_tokens_in_string("Hello, world!", encoding_name="p50k_base") == 4
     )
+
+
+def test_multichunk_initial_translation_concurrent_order(mocker):
+    source_text_chunks = ["One. ", "Two. ", "Three. ", "Four. "]
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def fake_completion(prompt, system_message, model):
+        nonlocal in_flight, max_in_flight
+        with lock:
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+        chunk = prompt.split("<TRANSLATE_THIS>\n")[1].split("\n")[0]
+        # Earlier chunks finish last, so order must not follow completion
+        position = source_text_chunks.index(chunk)
+        time.sleep(0.02 * (len(source_text_chunks) - position))
+        with lock:
+            in_flight -= 1
+        return f"translated {chunk.strip()}"
+
+    mocker.patch(
+        "translation_agent.utils.get_completion", side_effect=fake_completion
+    )
+
+    result = multichunk_initial_translation(
+        "English", "Spanish", source_text_chunks, max_workers=2
+    )
+
+    assert result == [
+        "translated One.",
+        "translated Two.",
+        "translated Three.",
+        "translated Four.",
+    ]
+    assert max_in_flight == 2
+
+
+def test_multichunk_translation_pipelines_chunks(mocker):
+    source_text_chunks = ["Slow chunk. ", "Fast chunk. "]
+    completed = []
+
+    def fake_completion(prompt, system_message, model):
+        chunk = prompt.split("<TRANSLATE_THIS>\n")[1].split("\n")[0]
+        if chunk == "Slow chunk. " and "<EXPERT_SUGGESTIONS>" not in prompt:
+            time.sleep(0.2)
+        return f"output for {chunk.strip()}"
+
+    mocker.patch(
+        "translation_agent.utils.get_completion", side_effect=fake_completion
+    )
+
+    result = multichunk_translation(
+        "English",
+        "Spanish",
+        source_text_chunks,
+        on_chunk_complete=lambda i, translation: completed.append(i),
+        max_workers=2,
+    )
+
+    assert result == ["output for Slow chunk.", "output for Fast chunk."]
+    # The fast chunk finishes all three stages without waiting at a barrier
+    assert completed == [1, 0]
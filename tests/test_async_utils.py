@@ -0,0 +1,75 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+from translation_agent.async_utils import amultichunk_translation
+from translation_agent.async_utils import aone_chunk_translate_text
+from translation_agent.async_utils import gather_bounded
+
+
+def test_aone_chunk_translate_text(mocker):
+    mock_aget_completion = mocker.patch(
+        "translation_agent.async_utils.aget_completion",
+        new=AsyncMock(
+            side_effect=["Hola", "Use a warmer greeting.", "¡Hola!"]
+        ),
+    )
+
+    result = asyncio.run(
+        aone_chunk_translate_text("English", "Spanish", "Hello", "Mexico")
+    )
+
+    assert result == "¡Hola!"
+    assert mock_aget_completion.await_count == 3
+    # The reflection and improvement prompts see the earlier outputs
+    reflection_prompt = mock_aget_completion.await_args_list[1].args[0]
+    improvement_prompt = mock_aget_completion.await_args_list[2].args[0]
+    assert "Hola" in reflection_prompt
+    assert "Use a warmer greeting." in improvement_prompt
+
+
+def test_amultichunk_translation_keeps_order(mocker):
+    source_text_chunks = ["Slow. ", "Fast. "]
+    completed = []
+
+    async def fake_completion(prompt, system_message, model):
+        chunk = prompt.split("<TRANSLATE_THIS>\n")[1].split("\n")[0]
+        if chunk == "Slow. ":
+            await asyncio.sleep(0.05)
+        return f"output for {chunk.strip()}"
+
+    mocker.patch(
+        "translation_agent.async_utils.aget_completion",
+        side_effect=fake_completion,
+    )
+
+    result = asyncio.run(
+        amultichunk_translation(
+            "English",
+            "Spanish",
+            source_text_chunks,
+            on_chunk_complete=lambda i, translation: completed.append(i),
+        )
+    )
+
+    assert result == ["output for Slow.", "output for Fast."]
+    assert completed == [1, 0]
+
+
+def test_gather_bounded_limits_concurrency():
+    in_flight = 0
+    max_in_flight = 0
+
+    async def work(value):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return value
+
+    result = asyncio.run(
+        gather_bounded([lambda v=v: work(v) for v in range(6)], max_workers=2)
+    )
+
+    assert result == list(range(6))
+    assert max_in_flight == 2
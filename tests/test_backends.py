@@ -0,0 +1,187 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+from unittest.mock import MagicMock
+
+import pytest
+
+from translation_agent.async_utils import aget_completion_stream
+from translation_agent.backends import BackendHTTPError
+from translation_agent.backends import Completion
+from translation_agent.backends import CompletionBackend
+from translation_agent.backends import FakeBackend
+from translation_agent.backends import OpenAICompatibleBackend
+from translation_agent.backends import use_backend
+from translation_agent.metrics import collect_metrics
+from translation_agent.ratelimit import is_retryable
+from translation_agent.utils import get_completion
+from translation_agent.utils import get_completion_stream
+from translation_agent.utils import translate
+
+
+class ChatHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.bodies.append(body)
+        if body["model"] == "busy":
+            self.send_response(429)
+            self.send_header("retry-after", "1")
+            self.end_headers()
+            self.wfile.write(b"slow down")
+            return
+
+        self.send_response(200)
+        if body.get("stream"):
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for piece in ("Ho", "la"):
+                event = {"choices": [{"delta": {"content": piece}}]}
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            if body.get("stream_options", {}).get("include_usage"):
+                event = {
+                    "choices": [],
+                    "usage": {"prompt_tokens": 12, "completion_tokens": 2},
+                }
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+
+        response = {
+            "choices": [{"message": {"content": "Hola"}}],
+            "usage": {"prompt_tokens": 12, "completion_tokens": 2},
+        }
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(response).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def chat_server():
+    server = HTTPServer(("127.0.0.1", 0), ChatHandler)
+    server.bodies = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_openai_compatible_backend(chat_server):
+    backend = OpenAICompatibleBackend(
+        f"http://127.0.0.1:{chat_server.server_port}/v1", api_key="local"
+    )
+
+    completion = backend.complete(
+        [{"role": "user", "content": "Hello"}], "llama-3", 0.3, json_mode=True
+    )
+    assert completion.content == "Hola"
+    assert completion.usage.total_tokens == 14
+    assert chat_server.bodies[0]["response_format"] == {"type": "json_object"}
+
+    with use_backend(backend), collect_metrics() as collector:
+        assert list(get_completion_stream("Hello", use_cache=False)) == [
+            "Ho",
+            "la",
+        ]
+    (record,) = collector.records
+    assert (record.prompt_tokens, record.completion_tokens) == (12, 2)
+
+    with pytest.raises(BackendHTTPError) as error:
+        backend.complete([{"role": "user", "content": "Hello"}], "busy", 0.3)
+    assert error.value.status_code == 429
+    assert error.value.response.headers["retry-after"] == "1"
+    assert is_retryable(error.value)
+
+
+def test_translate_uses_backend_in_worker_threads(mocker, byte_encoding):
+    client = MagicMock()
+    mocker.patch("translation_agent.utils.client", client)
+    backend = FakeBackend(respond=lambda messages, model: "T")
+
+    translation = translate(
+        "English",
+        "Spanish",
+        "One sentence. " * 20,
+        "",
+        max_tokens=100,
+        max_workers=4,
+        backend=backend,
+    )
+
+    num_chunks = len(translation)
+    assert num_chunks > 1
+    assert translation == "T" * num_chunks
+    assert len(backend.requests) == 3 * num_chunks
+    client.chat.completions.create.assert_not_called()
+
+
+def test_fake_backend_streams_and_reports_usage():
+    backend = FakeBackend(respond=lambda messages, model: "Hola a todos")
+
+    with use_backend(backend), collect_metrics() as collector:
+        assert get_completion("Hello", use_cache=False) == "Hola a todos"
+        assert list(get_completion_stream("Hello", use_cache=False)) == [
+            "Hola",
+            " a",
+            " todos",
+        ]
+
+        async def collect():
+            return [
+                delta
+                async for delta in aget_completion_stream(
+                    "Hello", use_cache=False
+                )
+            ]
+
+        assert asyncio.run(collect()) == ["Hola", " a", " todos"]
+
+    assert [
+        (record.prompt_tokens, record.completion_tokens)
+        for record in collector.records
+    ] == [(9, 3)] * 3
+
+    completion = backend.complete(
+        [{"role": "user", "content": "Hello"}], "m", 0
+    )
+    assert completion.usage.prompt_tokens == 2
+    assert completion.usage.completion_tokens == 3
+
+
+def test_fake_backend_simulates_latency_and_errors(mocker):
+    sleep = mocker.patch("translation_agent.backends.time.sleep")
+    backend = FakeBackend(
+        respond=lambda messages, model: "x" * 40,
+        latency=lambda: 0.25,
+        tokens_per_second=20,
+        error_rate=0.5,
+        seed=1,
+    )
+
+    outcomes = []
+    for _ in range(20):
+        try:
+            backend.complete([{"role": "user", "content": "Hi"}], "m", 0)
+            outcomes.append("ok")
+        except BackendHTTPError as error:
+            assert is_retryable(error)
+            outcomes.append("error")
+
+    assert 0 < outcomes.count("error") < 20
+    assert len(backend.requests) == 20
+    sleep.assert_called_with(0.25 + 10 / 20)
+
+
+def test_backends_must_implement_complete():
+    class EchoBackend(CompletionBackend):
+        def complete(self, messages, model, temperature, json_mode=False):
+            return Completion(messages[-1]["content"])
+
+    with pytest.raises(TypeError):
+        CompletionBackend()
+    assert list(EchoBackend().stream([{"content": "Hi"}], "m", 0.3)) == ["Hi"]
@@ -0,0 +1,203 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from translation_agent.batch import BatchBackend
+from translation_agent.batch import LocalBatchBackend
+from translation_agent.batch import OpenAIBatchBackend
+from translation_agent.batch import batch_translate
+
+
+def source_text_of(prompt):
+    if "<SOURCE_TEXT>" in prompt:
+        return prompt.split("<SOURCE_TEXT>\n")[1].split("\n</SOURCE_TEXT>")[0]
+    return prompt.split("English: ")[1].split("\n")[0]
+
+
+def fake_complete(body):
+    system_message = body["messages"][0]["content"]
+    source_text = source_text_of(body["messages"][1]["content"])
+    if "translation editing" in system_message:
+        return f"final {source_text}"
+    if "improve the translation" in system_message:
+        return f"notes on {source_text}"
+    return f"draft {source_text}"
+
+
+def write_documents(path, texts):
+    with open(path, "w", encoding="utf-8") as file:
+        for text in texts:
+            file.write(json.dumps({"text": text}) + "\n")
+
+
+def read_results(path):
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+@pytest.fixture
+def paths(tmp_path):
+    input_path = tmp_path / "documents.jsonl"
+    write_documents(input_path, ["one", "two", "three"])
+    return str(input_path), str(tmp_path / "translations.jsonl")
+
+
+def test_batch_translate_runs_three_bulk_stages(tmp_path, paths):
+    input_path, output_path = paths
+    complete = MagicMock(side_effect=fake_complete)
+    backend = LocalBatchBackend(str(tmp_path / "batches"), complete)
+
+    stats = batch_translate(
+        input_path, output_path, "English", "Spanish", backend=backend
+    )
+
+    assert stats == {
+        "documents": 3,
+        "translated": 3,
+        "failed": 0,
+        "batches": 3,
+    }
+    assert [result["translation"] for result in read_results(output_path)] == [
+        "final one",
+        "final two",
+        "final three",
+    ]
+    assert complete.call_count == 9
+
+
+def test_batch_translate_reports_failed_requests(tmp_path, paths):
+    input_path, output_path = paths
+
+    def complete(body):
+        if source_text_of(body["messages"][1]["content"]) == "two":
+            raise ValueError("rejected")
+        return fake_complete(body)
+
+    backend = LocalBatchBackend(str(tmp_path / "batches"), complete)
+
+    stats = batch_translate(
+        input_path, output_path, "English", "Spanish", backend=backend
+    )
+
+    results = read_results(output_path)
+    assert stats["failed"] == 1
+    assert results[1] == {
+        "text": "two",
+        "id": "1",
+        "error": "translation_1: rejected",
+    }
+    assert results[2]["translation"] == "final three"
+
+
+def test_batch_translate_resumes_after_interruption(tmp_path, paths):
+    input_path, output_path = paths
+    complete = MagicMock(side_effect=fake_complete)
+    backend = LocalBatchBackend(str(tmp_path / "batches"), complete)
+    submit = backend.submit
+    submitted = []
+
+    def interrupted_submit(requests_path):
+        if submitted:
+            raise KeyboardInterrupt
+        submitted.append(requests_path)
+        return submit(requests_path)
+
+    backend.submit = interrupted_submit
+    with pytest.raises(KeyboardInterrupt):
+        batch_translate(
+            input_path, output_path, "English", "Spanish", backend=backend
+        )
+    assert complete.call_count == 3
+
+    backend.submit = submit
+    stats = batch_translate(
+        input_path, output_path, "English", "Spanish", backend=backend
+    )
+
+    # The finished initial translation batch is not submitted again
+    assert complete.call_count == 9
+    assert stats["translated"] == 3
+
+
+def test_batch_translate_resumes_between_batches_of_a_stage(tmp_path):
+    input_path = str(tmp_path / "documents.jsonl")
+    output_path = str(tmp_path / "translations.jsonl")
+    write_documents(input_path, ["one", "two", "three", "four"])
+    complete = MagicMock(side_effect=fake_complete)
+    backend = LocalBatchBackend(str(tmp_path / "batches"), complete)
+    submit = backend.submit
+    submitted = []
+
+    def interrupted_submit(requests_path):
+        if submitted:
+            raise KeyboardInterrupt
+        submitted.append(requests_path)
+        return submit(requests_path)
+
+    backend.submit = interrupted_submit
+    with pytest.raises(KeyboardInterrupt):
+        batch_translate(
+            input_path,
+            output_path,
+            "English",
+            "Spanish",
+            backend=backend,
+            max_batch_requests=2,
+        )
+    assert complete.call_count == 2
+
+    backend.submit = submit
+    stats = batch_translate(
+        input_path,
+        output_path,
+        "English",
+        "Spanish",
+        backend=backend,
+        max_batch_requests=2,
+    )
+
+    # Only the second slice of the initial translations is submitted on resume
+    assert complete.call_count == 12
+    assert stats["translated"] == 4
+    assert stats["batches"] == 6
+    assert [result["translation"] for result in read_results(output_path)] == [
+        "final one",
+        "final two",
+        "final three",
+        "final four",
+    ]
+
+
+def test_batch_backends_must_implement_every_method():
+    class SubmitOnlyBackend(BatchBackend):
+        def submit(self, requests_path):
+            return "batch-1"
+
+    with pytest.raises(TypeError):
+        BatchBackend()
+    with pytest.raises(TypeError):
+        SubmitOnlyBackend()
+
+
+def test_openai_batch_backend_uses_files_and_batches_api(tmp_path):
+    requests_path = tmp_path / "requests.jsonl"
+    requests_path.write_text('{"custom_id": "0"}\n')
+    client = MagicMock()
+    client.files.create.return_value.id = "file-in"
+    client.batches.create.return_value.id = "batch-1"
+    client.batches.retrieve.return_value.output_file_id = "file-out"
+    client.batches.retrieve.return_value.error_file_id = None
+    client.files.content.return_value.text = '{"custom_id": "0"}\n'
+    backend = OpenAIBatchBackend(client)
+
+    assert backend.submit(str(requests_path)) == "batch-1"
+    backend.download("batch-1", str(tmp_path / "out.jsonl"))
+
+    client.batches.create.assert_called_once_with(
+        input_file_id="file-in",
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    client.files.content.assert_called_once_with("file-out")
+    assert (tmp_path / "out.jsonl").read_text() == '{"custom_id": "0"}\n'
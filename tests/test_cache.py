@@ -0,0 +1,98 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from translation_agent.cache import CompletionCache
+from translation_agent.utils import get_completion
+from translation_agent.utils import set_completion_cache
+
+
+def test_make_key_depends_on_every_field():
+    key = CompletionCache.make_key("gpt-4-turbo", 0.3, "sys", "prompt", False)
+
+    assert key == CompletionCache.make_key(
+        "gpt-4-turbo", 0.3, "sys", "prompt", False
+    )
+    assert key != CompletionCache.make_key(
+        "gpt-4-turbo", 0.3, "sys", "prompt", True
+    )
+    assert key != CompletionCache.make_key(
+        "gpt-4o", 0.3, "sys", "prompt", False
+    )
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = CompletionCache(max_memory_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.stats()["memory_entries"] == 2
+
+
+def test_disk_tier_persists_and_evicts(tmp_path):
+    path = str(tmp_path / "completions.sqlite")
+    cache = CompletionCache(path, max_disk_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.set("c", "3")
+    cache.close()
+
+    reopened = CompletionCache(path)
+
+    assert reopened.get("a") is None
+    assert reopened.get("c") == "3"
+    assert reopened.stats() == {
+        "hits": 1,
+        "misses": 1,
+        "memory_entries": 1,
+        "disk_entries": 2,
+    }
+
+
+def test_ttl_expires_entries(mocker, tmp_path):
+    clock = mocker.patch("translation_agent.cache.time.time", return_value=0)
+    cache = CompletionCache(str(tmp_path / "completions.sqlite"), ttl=10)
+    cache.set("a", "1")
+
+    clock.return_value = 5
+    assert cache.get("a") == "1"
+
+    clock.return_value = 11
+    assert cache.get("a") is None
+    assert cache.stats()["disk_entries"] == 0
+
+
+def test_invalidate_removes_entry():
+    cache = CompletionCache()
+    cache.set("a", "1")
+    cache.invalidate("a")
+
+    assert cache.get("a") is None
+
+
+@pytest.fixture
+def fake_client(mocker):
+    client = MagicMock()
+    client.chat.completions.create.return_value.choices[
+        0
+    ].message.content = "Bonjour"
+    mocker.patch("translation_agent.utils.client", client)
+    return client
+
+
+def test_get_completion_uses_cache(fake_client):
+    cache = CompletionCache()
+    set_completion_cache(cache)
+    try:
+        assert get_completion("Hello") == "Bonjour"
+        assert get_completion("Hello") == "Bonjour"
+        assert get_completion("Hello", use_cache=False) == "Bonjour"
+    finally:
+        set_completion_cache(None)
+
+    assert fake_client.chat.completions.create.call_count == 2
+    assert cache.stats()["hits"] == 1
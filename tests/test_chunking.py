@@ -0,0 +1,35 @@
+from translation_agent.chunking import split_tokenized_text
+from translation_agent.tokenizer import TokenizedText
+from translation_agent.utils import split_text_into_chunks
+
+
+def test_chunks_join_back_to_the_original_text(byte_encoding):
+    text = "First paragraph. It has two sentences.\n\nSecond one.\nA line."
+
+    chunks = split_text_into_chunks(text, 20)
+
+    assert "".join(chunks) == text
+    assert all(len(chunk.encode("utf-8")) <= 20 for chunk in chunks)
+
+
+def test_prefers_paragraph_then_sentence_boundaries(byte_encoding):
+    text = "Aaaa bbbb cccc.\n\nDddd eeee. Ffff gggg hhhh."
+
+    chunks = split_tokenized_text(TokenizedText(text), 20)
+
+    assert chunks == ["Aaaa bbbb cccc.\n\n", "Dddd eeee. ", "Ffff gggg hhhh."]
+
+
+def test_cuts_at_chunk_size_without_boundaries(byte_encoding):
+    chunks = split_tokenized_text(TokenizedText("x" * 25), 10)
+
+    assert chunks == ["x" * 10, "x" * 10, "x" * 5]
+
+
+def test_does_not_split_multibyte_characters(byte_encoding):
+    text = "ééééé"  # two tokens per character
+
+    chunks = split_tokenized_text(TokenizedText(text), 3)
+
+    assert "".join(chunks) == text
+    assert all(chunk for chunk in chunks)
@@ -0,0 +1,144 @@
+import pytest
+
+from translation_agent.context import _chunk_tokens
+from translation_agent.context import ContextPolicy
+from translation_agent.context import FullDocumentContext
+from translation_agent.context import NeighbourChunksContext
+from translation_agent.context import PrefixCachingContext
+from translation_agent.context import SummaryContext
+from translation_agent.context import TokenBudgetContext
+from translation_agent.context import context_token_savings
+from translation_agent.utils import chunk_improve_translation_prompt
+from translation_agent.utils import chunk_initial_translation_prompt
+from translation_agent.utils import chunk_reflect_on_translation_prompt
+
+
+@pytest.fixture
+def source_text_chunks():
+    return ["a a. ", "b b. ", "c c. ", "d d. ", "e e. "]
+
+
+@pytest.fixture(autouse=True)
+def word_count_tokens(mocker):
+    # Count words instead of tiktoken tokens so the tests run offline
+    _chunk_tokens.cache_clear()
+    mocker.patch(
+        "translation_agent.context.count_tokens",
+        side_effect=lambda text: len(text.split()),
+    )
+    yield
+    _chunk_tokens.cache_clear()
+
+
+def test_full_document_context_matches_original_tagging(source_text_chunks):
+    tagged_text = FullDocumentContext().tagged_text(source_text_chunks, 2)
+
+    assert tagged_text == (
+        "a a. b b. <TRANSLATE_THIS>c c. </TRANSLATE_THIS>d d. e e. "
+    )
+
+
+def test_neighbour_chunks_context(source_text_chunks):
+    policy = NeighbourChunksContext(before=1)
+
+    assert policy.tagged_text(source_text_chunks, 2) == (
+        "[...]\nb b. <TRANSLATE_THIS>c c. </TRANSLATE_THIS>d d. \n[...]"
+    )
+    assert policy.window(source_text_chunks, 0) == (0, 2)
+
+
+def test_token_budget_context(source_text_chunks):
+    # Each chunk is two "tokens", so a budget of 5 fits two neighbours
+    policy = TokenBudgetContext(max_context_tokens=5)
+
+    assert policy.window(source_text_chunks, 2) == (1, 4)
+    assert policy.window(source_text_chunks, 0) == (0, 3)
+
+
+def test_summary_context_and_savings(source_text_chunks):
+    policy = SummaryContext("Five letters.", before=0)
+
+    assert policy.tagged_text(source_text_chunks, 4).startswith(
+        "[Summary of the whole document: Five letters.]\n\n[...]\n"
+    )
+
+    savings = context_token_savings(source_text_chunks, policy)
+
+    # Full context: 5 chunks x 10 tokens; policy: summary (7) + own chunk (2)
+    assert savings["full_context_tokens"] == 3 * 5 * 10
+    assert savings["policy_context_tokens"] == 3 * 5 * 9
+    assert savings["saved_tokens"] == 15
+
+
+def test_prompt_uses_context_policy(source_text_chunks):
+    _, prompt = chunk_initial_translation_prompt(
+        "English",
+        "Spanish",
+        source_text_chunks,
+        0,
+        context_policy=NeighbourChunksContext(before=0),
+    )
+
+    assert "<TRANSLATE_THIS>a a. </TRANSLATE_THIS>\n[...]" in prompt
+    assert "b b." not in prompt
+
+
+def test_prefix_caching_context_puts_shared_document_first(source_text_chunks):
+    policy = PrefixCachingContext()
+    document = "".join(source_text_chunks)
+
+    prompts = [
+        chunk_initial_translation_prompt(
+            "English", "Spanish", source_text_chunks, i, policy
+        )[1]
+        for i in range(len(source_text_chunks))
+    ] + [
+        chunk_reflect_on_translation_prompt(
+            "English",
+            "Spanish",
+            source_text_chunks,
+            1,
+            "B B.",
+            "Mexico",
+            policy,
+        )[1],
+        chunk_improve_translation_prompt(
+            "English",
+            "Spanish",
+            source_text_chunks,
+            1,
+            "B B.",
+            "Fix it.",
+            policy,
+        )[1],
+    ]
+
+    prefix = f"<SOURCE_TEXT>\n{document}\n</SOURCE_TEXT>\n"
+    for prompt in prompts:
+        assert prompt.startswith(prefix)
+    assert "<TRANSLATE_THIS>\nb b. \n</TRANSLATE_THIS>" in prompts[1]
+    assert "colloquially spoken in Mexico" in prompts[-2]
+
+
+def test_prefix_caching_context_keeps_window_of_inner_policy(
+    source_text_chunks,
+):
+    policy = PrefixCachingContext(NeighbourChunksContext(before=1))
+
+    assert policy.context_text(source_text_chunks, 2) == (
+        "[...]\nb b. c c. d d. \n[...]"
+    )
+
+
+def test_policies_must_choose_a_window(source_text_chunks):
+    class ChunkOnlyContext(ContextPolicy):
+        def window(self, source_text_chunks, chunk_index):
+            return chunk_index, chunk_index + 1
+
+    with pytest.raises(TypeError):
+        ContextPolicy()
+    assert (
+        ChunkOnlyContext()
+        .tagged_text(source_text_chunks, 2)
+        .startswith("[...]")
+    )
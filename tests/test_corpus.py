@@ -0,0 +1,108 @@
+import time
+
+from joblib import parallel_config
+
+from translation_agent.backends import FakeBackend
+from translation_agent.corpus import prepare_document
+from translation_agent.corpus import translate_corpus
+from translation_agent.utils import split_text_into_chunks
+from translation_agent.utils import translate
+
+
+LONG_TEXT = "One sentence. " * 20
+
+
+def test_prepare_document_splits_like_translate(byte_encoding):
+    short = prepare_document("Hello.", max_tokens=100)
+    long = prepare_document(LONG_TEXT, max_tokens=100)
+
+    assert short.single_chunk
+    assert short.source_text_chunks == ["Hello."]
+    assert not long.single_chunk
+    assert long.num_tokens == len(LONG_TEXT)
+    assert "".join(long.source_text_chunks) == LONG_TEXT
+    assert len(long.source_text_chunks) > 1
+
+
+def test_translate_corpus_matches_translate(byte_encoding):
+    def respond(messages, model):
+        return str(len(messages[-1]["content"]))
+
+    source_texts = ["Hello.", LONG_TEXT, "Goodbye."]
+    completed = []
+    collectors = []
+    backend = FakeBackend(respond=respond)
+
+    # Threads share the mocked encoding with the test, unlike worker processes
+    with parallel_config(backend="threading"):
+        translations = translate_corpus(
+            "English",
+            "Spanish",
+            iter(source_texts),
+            max_tokens=100,
+            max_workers=4,
+            n_jobs=2,
+            on_document_complete=lambda index, translation: completed.append(
+                index
+            ),
+            backend=backend,
+            on_metrics=collectors.append,
+        )
+
+    expected = [
+        translate(
+            "English",
+            "Spanish",
+            source_text,
+            "",
+            max_tokens=100,
+            backend=FakeBackend(respond=respond),
+        )
+        for source_text in source_texts
+    ]
+    assert translations == expected
+    assert completed == [0, 1, 2]
+    num_chunks = len(split_text_into_chunks(LONG_TEXT, 100))
+    assert len(backend.requests) == 3 * (2 + num_chunks)
+    assert collectors[0].summary()["calls"] == len(backend.requests)
+
+
+def test_translate_corpus_reports_documents_while_preparing(
+    mocker, byte_encoding
+):
+    backend = FakeBackend(respond=lambda messages, model: "Hola.")
+    completed = []
+    reported_while_preparing = []
+
+    def fake_prepare_corpus(source_texts, max_tokens, n_jobs):
+        for index, source_text in enumerate(source_texts):
+            if index == 2:
+                # With one worker, a request for document 1 means document 0 is done
+                deadline = time.monotonic() + 5
+                while (
+                    len(backend.requests) < 4 and time.monotonic() < deadline
+                ):
+                    time.sleep(0.001)
+            if index == 3:
+                reported_while_preparing.extend(completed)
+            yield prepare_document(source_text, max_tokens)
+
+    mocker.patch(
+        "translation_agent.corpus.prepare_corpus",
+        side_effect=fake_prepare_corpus,
+    )
+
+    translations = translate_corpus(
+        "English",
+        "Spanish",
+        ["One.", "Two.", "Three.", "Four."],
+        max_workers=1,
+        on_document_complete=lambda index, translation: completed.append(
+            index
+        ),
+        backend=backend,
+    )
+
+    assert reported_while_preparing in ([0], [0, 1])
+    assert completed == [0, 1, 2, 3]
+    assert translations == ["Hola."] * 4
@@ -0,0 +1,96 @@
+from translation_agent.documents import parse_html
+from translation_agent.documents import parse_markdown
+from translation_agent.documents import restore_placeholders
+from translation_agent.documents import translate_document
+
+
+MARKDOWN = """# Install the `agent`
+
+Run this, then read [the docs](https://example.com/docs "Docs")
+for more.
+
+```bash
+pip install translation-agent
+```
+
+- First item
+- [ ] Second item
+
+| Name | Value |
+|------|-------|
+| Size | 10 |
+
+[ref]: https://example.com
+"""
+
+
+def test_parse_markdown_sends_only_text():
+    document = parse_markdown(MARKDOWN)
+
+    assert document.render() == MARKDOWN
+    assert [segment.text for segment in document.segments] == [
+        "Install the ⟦1⟧",
+        "Run this, then read ⟦1⟧the docs⟦2⟧\nfor more.",
+        "First item",
+        "Second item",
+        "Name",
+        "Value",
+        "Size",
+    ]
+    assert document.segments[1].placeholders == {
+        "⟦1⟧": "[",
+        "⟦2⟧": '](https://example.com/docs "Docs")',
+    }
+
+
+def test_parse_html_keeps_tags_and_attributes():
+    document = parse_html(
+        '<h1 class="title">Hi <b>there</b> &amp; you</h1>'
+        "<p>Run <code>pip</code> now.</p><pre>print(1)</pre>"
+    )
+
+    assert [segment.text for segment in document.segments] == [
+        "Hi ⟦1⟧there⟦2⟧ & you",
+        "Run ⟦1⟧ now.",
+    ]
+    assert document.render(["¡Hola ⟦1⟧tú⟦2⟧ & tú!", "Ejecuta ⟦1⟧."]) == (
+        '<h1 class="title">¡Hola <b>tú</b> &amp; tú!</h1>'
+        "<p>Ejecuta <code>pip</code>.</p><pre>print(1)</pre>"
+    )
+
+
+def test_restore_placeholders_never_loses_markup():
+    placeholders = {"⟦1⟧": "<b>", "⟦2⟧": "</b>"}
+
+    assert restore_placeholders("⟦1⟧a⟦1⟧ b ⟦7⟧", placeholders) == "<b>a b </b>"
+
+
+def test_translate_document_retranslates_damaged_segments(mocker):
+    def fake_translate(source_lang, target_lang, source_text, *args, **kwargs):
+        # Upper-cases every segment but drops the placeholders of the second one
+        return source_text.upper().replace("⟦1⟧THE DOCS⟦2⟧", "THE DOCS")
+
+    mock_translate = mocker.patch(
+        "translation_agent.documents.translate", side_effect=fake_translate
+    )
+    mock_one_chunk = mocker.patch(
+        "translation_agent.documents.one_chunk_translate_text",
+        side_effect=lambda source_lang, target_lang, text, country: (
+            "RETRANSLATED ⟦1⟧DOCS⟦2⟧"
+        ),
+    )
+
+    translation = translate_document(
+        "English", "Spanish", MARKDOWN, max_workers=1
+    )
+
+    source_text = mock_translate.call_args.args[2]
+    assert "pip install" not in source_text
+    assert "https://example.com" not in source_text
+    mock_one_chunk.assert_called_once()
+    assert translation.startswith("# INSTALL THE `agent`\n\n")
+    assert (
+        'RETRANSLATED [DOCS](https://example.com/docs "Docs")' in translation
+    )
+    assert "```bash\npip install translation-agent\n```" in translation
+    assert "| SIZE | 10 |" in translation
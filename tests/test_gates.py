@@ -0,0 +1,119 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock
+
+import pytest
+
+from translation_agent.async_utils import aone_chunk_translate_text
+from translation_agent.gates import GateVerdict
+from translation_agent.gates import LengthRatioGate
+from translation_agent.gates import QualityGate
+from translation_agent.gates import ReflectionVerdictGate
+from translation_agent.gates import parse_verdict
+from translation_agent.utils import chunk_translation
+from translation_agent.utils import one_chunk_translate_text
+
+
+def test_length_ratio_gate():
+    gate = LengthRatioGate()
+
+    assert gate.check(
+        "English", "Spanish", "I have 3 cats.", "Tengo 3 gatos."
+    ).passed
+    # Dropped number, copied source and implausible length all fail
+    assert not gate.check(
+        "English", "Spanish", "I have 3 cats.", "Tengo gatos."
+    ).passed
+    assert not gate.check("English", "Spanish", "OK", "OK").passed
+    assert not gate.check(
+        "English", "Spanish", "Hello there", "Hola" * 10
+    ).passed
+
+
+def test_parse_verdict():
+    assert parse_verdict('{"needs_changes": false, "suggestions": ""}') == (
+        GateVerdict(passed=True, calls=1)
+    )
+    assert parse_verdict(
+        json.dumps({"needs_changes": True, "suggestions": "Use tú."})
+    ) == GateVerdict(passed=False, reflection="Use tú.", calls=1)
+    assert parse_verdict("no idea") == GateVerdict(passed=False, calls=1)
+
+
+def test_passing_gate_skips_reflection_and_improvement(mocker):
+    mock_get_completion = mocker.patch(
+        "translation_agent.utils.get_completion", return_value="Hola."
+    )
+    gate = LengthRatioGate()
+
+    assert (
+        one_chunk_translate_text("English", "Spanish", "Hello.", "", gate)
+        == "Hola."
+    )
+    assert mock_get_completion.call_count == 1
+    assert gate.stats() == {
+        "chunks": 1,
+        "passed": 1,
+        "gate_calls": 0,
+        "calls_saved": 2,
+    }
+
+
+def test_verdict_suggestions_replace_reflection(mocker):
+    mocker.patch(
+        "translation_agent.gates.get_completion",
+        return_value=json.dumps(
+            {"needs_changes": True, "suggestions": "Be warmer."}
+        ),
+    )
+    mock_get_completion = mocker.patch(
+        "translation_agent.utils.get_completion",
+        side_effect=["Hola", "¡Hola!"],
+    )
+    gate = ReflectionVerdictGate()
+
+    translation = chunk_translation(
+        "English", "Spanish", ["Hi. ", "Bye."], 0, quality_gate=gate
+    )
+
+    assert translation == "¡Hola!"
+    improvement_prompt = mock_get_completion.call_args_list[1].args[0]
+    assert "Be warmer." in improvement_prompt
+    assert gate.stats()["calls_saved"] == 0
+
+
+def test_async_gate_short_circuits(mocker):
+    mock_aget_completion = mocker.patch(
+        "translation_agent.async_utils.aget_completion",
+        new=AsyncMock(
+            side_effect=["Hola", '{"needs_changes": false, "suggestions": ""}']
+        ),
+    )
+    gate = ReflectionVerdictGate()
+
+    result = asyncio.run(
+        aone_chunk_translate_text("English", "Spanish", "Hello", "", gate)
+    )
+
+    assert result == "Hola"
+    assert mock_aget_completion.await_count == 2
+    assert gate.stats()["calls_saved"] == 1
+
+
+def test_gates_must_implement_check():
+    class PassingGate(QualityGate):
+        def check(
+            self,
+            source_lang,
+            target_lang,
+            source_text,
+            translation_1,
+            country="",
+        ):
+            return GateVerdict(passed=True)
+
+    with pytest.raises(TypeError):
+        QualityGate()
+    assert asyncio.run(
+        PassingGate().acheck("English", "Spanish", "Hi.", "Hola.")
+    ).passed
@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+from translation_agent.async_utils import atranslate
+from translation_agent.async_utils import atranslate_stream
+from translation_agent.backends import FakeBackend
+from translation_agent.gates import GateVerdict
+from translation_agent.gates import LengthRatioGate
+from translation_agent.glossary import Glossary
+from translation_agent.glossary import GlossaryGate
+from translation_agent.glossary import TermMatcher
+from translation_agent.utils import chunk_translation
+
+
+def test_term_matcher_prefers_leftmost_longest_whole_words():
+    matcher = TermMatcher(["open source", "source code", "source", "gpu"])
+
+    assert matcher.find("open source code, sourced gpus and a gpu.") == [
+        (0, 11, 0),
+        (37, 40, 3),
+    ]
+    assert (1, 4, 0) in TermMatcher(["abc"]).find_all("xabc")
+
+
+def test_glossary_finds_terms_and_violations():
+    glossary = Glossary(
+        {"open source": "código abierto", "GPU": "GPU", "C++": "C++"}
+    )
+
+    assert glossary.terms_in("We love GPUs, Open Source and C++ and gpu.") == [
+        ("open source", "código abierto"),
+        ("C++", "C++"),
+        ("GPU", "GPU"),
+    ]
+    assert (
+        glossary.violations(
+            "Open source runs on the GPU.", "El Código abierto usa la GPU."
+        )
+        == []
+    )
+    assert glossary.violations(
+        "Open source runs on the GPU.", "La fuente abierta usa la GPU."
+    ) == [("open source", "código abierto")]
+    with pytest.raises(ValueError):
+        Glossary({"term": " "})
+
+
+def test_glossary_gate_turns_violations_into_reflection(mocker):
+    mock_get_completion = mocker.patch(
+        "translation_agent.utils.get_completion",
+        side_effect=["Fuente abierta.", "Código abierto."],
+    )
+    glossary = Glossary({"open source": "código abierto"})
+    gate = GlossaryGate(glossary)
+
+    translation = chunk_translation(
+        "English",
+        "Spanish",
+        ["Open source. ", "Bye."],
+        0,
+        quality_gate=gate,
+        glossary=glossary,
+    )
+
+    assert translation == "Código abierto."
+    initial_prompt, improvement_prompt = (
+        call.args[0] for call in mock_get_completion.call_args_list
+    )
+    assert "<GLOSSARY>\nopen source = código abierto\n" in initial_prompt
+    assert '"código abierto"' in improvement_prompt
+    assert gate.stats() == {
+        "chunks": 1,
+        "passed": 0,
+        "gate_calls": 0,
+        "calls_saved": 1,
+    }
+
+
+def test_glossary_gate_defers_to_follow_up_gate():
+    gate = GlossaryGate(Glossary({"cat": "gato"}), then=LengthRatioGate())
+
+    assert asyncio.run(
+        gate.acheck("English", "Spanish", "I have 3 cats.", "Tengo 3 gatos.")
+    ) == GateVerdict(passed=True)
+    assert not gate.check("English", "Spanish", "A cat.", "Un gatito.").passed
+
+
+def test_translate_adds_only_terms_in_chunk(byte_encoding):
+    backend = FakeBackend(respond=lambda messages, model: "T")
+    glossary = Glossary({"invoice": "factura", "refund": "reembolso"})
+
+    asyncio.run(
+        atranslate(
+            "English",
+            "Spanish",
+            "Send the invoice.",
+            "",
+            backend=backend,
+            glossary=glossary,
+        )
+    )
+
+    initial_prompt = backend.requests[0]["messages"][-1]["content"]
+    assert "invoice = factura" in initial_prompt
+    assert "reembolso" not in initial_prompt
+
+
+def test_translate_stream_adds_terms_to_prompts(byte_encoding):
+    backend = FakeBackend(respond=lambda messages, model: "T")
+    glossary = Glossary({"invoice": "factura"})
+
+    async def collect():
+        return [
+            delta
+            async for delta in atranslate_stream(
+                "English",
+                "Spanish",
+                "Send the invoice.",
+                "",
+                stream_tokens=True,
+                backend=backend,
+                glossary=glossary,
+            )
+        ]
+
+    assert asyncio.run(collect()) == ["T"]
+    initial_prompt, _, improvement_prompt = (
+        request["messages"][-1]["content"] for request in backend.requests
+    )
+    assert "invoice = factura" in initial_prompt
+    assert "invoice = factura" in improvement_prompt
@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+from unittest.mock import MagicMock
+
+from translation_agent import utils
+
+
+def run_python(code):
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    ).stdout.split()
+
+
+def test_import_does_not_load_heavy_dependencies():
+    loaded = run_python(
+        "import sys, translation_agent\n"
+        "print(*[m for m in ('openai', 'tiktoken', 'dotenv') "
+        "if m in sys.modules])"
+    )
+
+    assert loaded == []
+
+
+def test_translate_imports_without_api_key():
+    loaded = run_python(
+        "import sys\n"
+        "from translation_agent import translate\n"
+        "print(*[m for m in ('openai', 'tiktoken') if m in sys.modules])"
+    )
+
+    assert loaded == []
+
+
+def test_set_client_replaces_shared_client(mocker):
+    mocker.patch("translation_agent.utils.client", None)
+    fake_client = MagicMock()
+    fake_client.chat.completions.create.return_value.choices[
+        0
+    ].message.content = "Hola"
+
+    utils.set_client(fake_client)
+
+    assert utils.get_client() is fake_client
+    assert utils.get_completion("Hello", use_cache=False) == "Hola"
@@ -0,0 +1,150 @@
+import pytest
+
+from translation_agent.incremental import TranslationAlignment
+from translation_agent.incremental import align_chunks
+from translation_agent.incremental import incremental_translate
+from translation_agent.utils import split_text_into_chunks
+
+
+@pytest.fixture(autouse=True)
+def offline_tokens(byte_encoding):
+    # One token per byte, so the tests run offline
+    return byte_encoding
+
+
+@pytest.fixture
+def previous():
+    return TranslationAlignment(
+        source_lang="English",
+        target_lang="Spanish",
+        country="",
+        chunk_size=30,
+        source_chunks=[
+            "One two.\n\n",
+            "Three four.\n\n",
+            "Five six.\n\n",
+            "Seven.",
+        ],
+        translation_chunks=[
+            "Uno dos.\n\n",
+            "Tres cuatro.\n\n",
+            "Cinco seis.\n\n",
+            "Siete.",
+        ],
+    )
+
+
+def test_align_chunks_reuses_unchanged_chunks(previous):
+    source_text = (
+        "One two.\n\nThree FOUR.\n\nFive six.\n\nSeven.\n\nEight nine."
+    )
+
+    aligned = align_chunks(previous.source_chunks, source_text, 30)
+
+    assert aligned == [
+        ("One two.\n\n", 0),
+        ("Three FOUR.\n\n", None),
+        ("Five six.\n\n", 2),
+        ("Seven.", 3),
+        ("\n\nEight nine.", None),
+    ]
+    assert "".join(chunk for chunk, _ in aligned) == source_text
+
+
+def test_align_chunks_keeps_separators_of_real_chunks():
+    source_chunks = split_text_into_chunks(
+        "Para one is here.\n\nPara two is here.\n\nPara three here.\n\n", 20
+    )
+    assert source_chunks == [
+        "Para one is here.\n\n",
+        "Para two is here.\n\n",
+        "Para three here.\n\n",
+    ]
+    source_text = (
+        "Para one is here.\n\nPara TWO is here.\n\nPara three here.\n\n"
+    )
+
+    aligned = align_chunks(source_chunks, source_text, 20)
+
+    assert [previous_index for _, previous_index in aligned] == [0, None, 2]
+    assert "".join(chunk for chunk, _ in aligned) == source_text
+
+
+def test_incremental_translate_only_reruns_changed_chunks(mocker, previous):
+    mock_chunk_translation = mocker.patch(
+        "translation_agent.incremental.chunk_translation",
+        side_effect=lambda source_lang, target_lang, chunks, i, *args: (
+            f"new {chunks[i]}"
+        ),
+    )
+    source_text = "One two.\n\nThree four.\n\nFive SIX.\n\nSeven."
+
+    result = incremental_translate(previous, source_text, neighbourhood=0)
+
+    assert result.retranslated_chunks == [2]
+    assert result.translation_chunks == [
+        "Uno dos.\n\n",
+        "Tres cuatro.\n\n",
+        "new Five SIX.\n\n",
+        "Siete.",
+    ]
+    assert "".join(result.source_chunks) == source_text
+    assert mock_chunk_translation.call_count == 1
+
+    mock_chunk_translation.reset_mock()
+    result = incremental_translate(previous, source_text, neighbourhood=1)
+
+    assert result.retranslated_chunks == [1, 2, 3]
+    assert mock_chunk_translation.call_count == 3
+
+
+def test_incremental_translate_reruns_neighbours_of_deleted_chunk(
+    mocker, previous
+):
+    mocker.patch(
+        "translation_agent.incremental.chunk_translation",
+        side_effect=lambda source_lang, target_lang, chunks, i, *args: (
+            f"new {chunks[i]}"
+        ),
+    )
+    source_text = "One two.\n\nFive six.\n\nSeven."
+
+    result = incremental_translate(previous, source_text, neighbourhood=1)
+
+    assert result.source_chunks == ["One two.\n\n", "Five six.\n\n", "Seven."]
+    assert result.retranslated_chunks == [0, 1]
+    assert result.translation == "new One two.\n\nnew Five six.\n\nSiete."
+
+
+def test_incremental_translate_shows_only_the_neighbourhood(mocker, previous):
+    mock_chunk_translation = mocker.patch(
+        "translation_agent.incremental.chunk_translation",
+        side_effect=lambda source_lang, target_lang, chunks, i, *args: (
+            f"new {chunks[i]}"
+        ),
+    )
+
+    result = incremental_translate(
+        previous, "One two.\n\nThree four.\n\nFive SIX.\n\nSeven.", 1
+    )
+
+    # Chunks outside the neighbourhood keep the same prompts, and cache keys, after the edit
+    for call in mock_chunk_translation.call_args_list:
+        chunks, i, _country, context_policy = call.args[2:]
+        assert context_policy.window(chunks, i) == (
+            max(0, i - 1),
+            min(len(chunks), i + 2),
+        )
+    assert result.retranslated_chunks == [1, 2, 3]
+
+
+def test_alignment_round_trip(tmp_path, previous):
+    path = str(tmp_path / "alignment.json")
+    previous.save(path)
+
+    loaded = TranslationAlignment.load(path)
+
+    assert loaded == previous
+    assert loaded.translation == (
+        "Uno dos.\n\nTres cuatro.\n\nCinco seis.\n\nSiete."
+    )
@@ -0,0 +1,114 @@
+import pytest
+
+from translation_agent.jobs import COMPLETED
+from translation_agent.jobs import FAILED
+from translation_agent.jobs import PAUSED
+from translation_agent.jobs import JobStore
+from translation_agent.jobs import TranslationJob
+
+
+SOURCE_TEXT = "First paragraph.\n\nSecond paragraph.\n\nThird paragraph."
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def stages(mocker):
+    def chunk_text(chunks, chunk_index):
+        return chunks[chunk_index].strip()
+
+    return {
+        "initial": mocker.patch(
+            "translation_agent.jobs.chunk_initial_translation",
+            side_effect=lambda s, t, chunks, i, policy: (
+                f"draft {chunk_text(chunks, i)}"
+            ),
+        ),
+        "reflect": mocker.patch(
+            "translation_agent.jobs.chunk_reflect_on_translation",
+            side_effect=lambda s, t, chunks, i, draft, country, policy: (
+                "notes"
+            ),
+        ),
+        "improve": mocker.patch(
+            "translation_agent.jobs.chunk_improve_translation",
+            side_effect=lambda s, t, chunks, i, draft, notes, policy: f"<{i}>",
+        ),
+    }
+
+
+def make_job(store, source_text=SOURCE_TEXT):
+    return TranslationJob(
+        store,
+        "book-1",
+        "English",
+        "Spanish",
+        source_text,
+        max_tokens=20,
+        max_workers=1,
+    )
+
+
+def test_job_checkpoints_every_stage(byte_encoding, store, stages):
+    job = make_job(store)
+
+    assert job.run() == "<0><1><2>"
+    assert job.status == COMPLETED
+    assert job.progress() == {
+        "chunks": 3,
+        "completed_chunks": 3,
+        "completed_stages": 9,
+        "stages": 9,
+    }
+
+    # A rerun of a finished job makes no requests
+    assert make_job(store).run() == "<0><1><2>"
+    assert stages["initial"].call_count == 3
+
+
+def test_job_resumes_after_a_crash(byte_encoding, store, stages):
+    stages["improve"].side_effect = [
+        "<0>",
+        RuntimeError("connection lost"),
+    ]
+    job = make_job(store)
+
+    with pytest.raises(RuntimeError):
+        job.run()
+    assert job.status == FAILED
+
+    stages["improve"].side_effect = lambda *args: f"<{args[3]}>"
+    assert make_job(store).run() == "<0><1><2>"
+    # Only the unfinished stages were requested again
+    assert stages["initial"].call_count == 3
+    assert stages["reflect"].call_count == 3
+    assert stages["improve"].call_count == 4
+
+
+def test_job_pauses_and_resumes(byte_encoding, store, stages):
+    job = make_job(store)
+
+    def pause_after_first_draft(s, t, chunks, i, policy):
+        job.pause()
+        return f"draft {i}"
+
+    stages["initial"].side_effect = pause_after_first_draft
+
+    assert job.run() is None
+    assert job.status == PAUSED
+    assert job.progress()["completed_stages"] == 1
+
+    assert make_job(store).run() == "<0><1><2>"
+    assert stages["initial"].call_count == 3
+
+
+def test_job_rejects_a_different_text(byte_encoding, store, stages):
+    make_job(store)
+
+    with pytest.raises(ValueError):
+        make_job(store, SOURCE_TEXT + " Edited.")
@@ -0,0 +1,154 @@
+import asyncio
+
+from translation_agent.async_utils import atranslate
+from translation_agent.backends import FakeBackend
+from translation_agent.memory import TranslationMemory
+from translation_agent.utils import translate
+from translation_agent.utils import translate_stream
+
+
+SENTENCE = (
+    "The quick brown fox jumps over the lazy dog near the river bank today."
+)
+
+
+def test_lookup_ignores_whitespace_and_separates_pairs(tmp_path):
+    path = str(tmp_path / "memory.sqlite")
+    memory = TranslationMemory(path)
+    memory.add("English", "Spanish", "Hello  world\n", "Hola mundo", "Mexico")
+
+    reopened = TranslationMemory(path)
+
+    assert reopened.lookup("English", "Spanish", " Hello world", "Mexico") == (
+        "Hola mundo"
+    )
+    assert reopened.lookup("English", "Spanish", "Hello world") is None
+    assert (
+        reopened.lookup("English", "French", "Hello world", "Mexico") is None
+    )
+    assert reopened.stats() == {
+        "exact_hits": 1,
+        "fuzzy_hits": 0,
+        "misses": 0,
+        "segments": 1,
+    }
+
+
+def test_fuzzy_matches_rank_similar_segments():
+    memory = TranslationMemory(min_similarity=0.4)
+    memory.add_many(
+        "English",
+        "Spanish",
+        [
+            (SENTENCE, "El rápido zorro marrón..."),
+            ("Invoices are payable within thirty days.", "Las facturas..."),
+        ],
+    )
+
+    matches = memory.fuzzy_matches(
+        "English", "Spanish", SENTENCE.replace("today", "yesterday")
+    )
+
+    assert [match.translation for match in matches] == [
+        "El rápido zorro marrón..."
+    ]
+    assert 0.4 <= matches[0].similarity < 1.0
+    assert memory.fuzzy_matches("English", "Spanish", SENTENCE) == []
+    assert (
+        memory.references("English", "Spanish", "Completely unrelated words.")
+        == []
+    )
+    assert memory.misses == 1
+
+
+def test_translate_reuses_memory(byte_encoding):
+    backend = FakeBackend(respond=lambda messages, model: "Traducción")
+    memory = TranslationMemory(min_similarity=0.4)
+
+    translate(
+        "English",
+        "Spanish",
+        SENTENCE,
+        "",
+        backend=backend,
+        translation_memory=memory,
+    )
+    assert len(backend.requests) == 3
+
+    translation = translate(
+        "English",
+        "Spanish",
+        f"  {SENTENCE}\n",
+        "",
+        backend=backend,
+        translation_memory=memory,
+    )
+    assert translation == "Traducción"
+    assert len(backend.requests) == 3
+
+    asyncio.run(
+        atranslate(
+            "English",
+            "Spanish",
+            SENTENCE.replace("today", "yesterday"),
+            "",
+            backend=backend,
+            translation_memory=memory,
+        )
+    )
+    initial_prompt = backend.requests[3]["messages"][-1]["content"]
+    assert "<REFERENCE>" in initial_prompt
+    assert f"<ENGLISH>{SENTENCE}</ENGLISH>" in initial_prompt
+    assert "<SPANISH>Traducción</SPANISH>" in initial_prompt
+    assert len(memory) == 2
+
+
+def test_multichunk_translation_stores_chunks(byte_encoding):
+    backend = FakeBackend(respond=lambda messages, model: "T")
+    memory = TranslationMemory()
+    source_text = "".join(f"Sentence number {i}. " for i in range(20))
+
+    first = translate(
+        "English",
+        "Spanish",
+        source_text,
+        "",
+        max_tokens=100,
+        backend=backend,
+        translation_memory=memory,
+    )
+    num_requests = len(backend.requests)
+    second = translate(
+        "English",
+        "Spanish",
+        source_text,
+        "",
+        max_tokens=100,
+        backend=backend,
+        translation_memory=memory,
+    )
+
+    assert second == first
+    assert len(backend.requests) == num_requests
+    assert memory.exact_hits == len(first)
+
+
+def test_translate_stream_reuses_memory(byte_encoding):
+    backend = FakeBackend(respond=lambda messages, model: "Traducción")
+    memory = TranslationMemory()
+    memory.add("English", "Spanish", SENTENCE, "El rápido zorro...")
+
+    deltas = list(
+        translate_stream(
+            "English",
+            "Spanish",
+            SENTENCE,
+            "",
+            stream_tokens=True,
+            backend=backend,
+            translation_memory=memory,
+        )
+    )
+
+    assert deltas == ["El rápido zorro..."]
+    assert backend.requests == []
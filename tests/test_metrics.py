@@ -0,0 +1,179 @@
+import json
+import logging
+
+import pytest
+
+from translation_agent.backends import FakeBackend
+from translation_agent.backends import use_backend
+from translation_agent.metrics import add_callback
+from translation_agent.metrics import collect_metrics
+from translation_agent.metrics import remove_callback
+from translation_agent.metrics import set_tracer
+from translation_agent.routing import ModelRouter
+from translation_agent.utils import chunk_translation
+from translation_agent.utils import get_completion
+from translation_agent.utils import translate
+from translation_agent.utils import translate_stream
+
+
+class FakeSpan:
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = dict(attributes)
+        self.ended = False
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def end(self):
+        self.ended = True
+
+
+class FakeTracer:
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, attributes=None):
+        span = FakeSpan(name, attributes or {})
+        self.spans.append(span)
+        return span
+
+
+def test_callback_receives_labelled_records():
+    records = []
+    add_callback(records.append)
+    try:
+        with use_backend(FakeBackend(respond=lambda messages, model: "Hola")):
+            chunk_translation("English", "Spanish", ["Hello. ", "Bye."], 1)
+    finally:
+        remove_callback(records.append)
+
+    assert [record.stage for record in records] == [
+        "initial",
+        "reflect",
+        "improve",
+    ]
+    assert {record.chunk_index for record in records} == {1}
+    assert all(record.model == "gpt-4-turbo" for record in records)
+    assert all(record.prompt_tokens > 0 for record in records)
+    assert all(record.completion_tokens == 1 for record in records)
+
+
+def test_tracer_opens_span_per_call():
+    tracer = FakeTracer()
+    set_tracer(tracer)
+    try:
+        with use_backend(FakeBackend(respond=lambda messages, model: "Hola")):
+            get_completion("Hello", model="local", use_cache=False)
+    finally:
+        set_tracer(None)
+
+    (span,) = tracer.spans
+    assert span.name == "translation_agent.completion"
+    assert span.attributes["model"] == "local"
+    assert span.attributes["completion_tokens"] == 1
+    assert span.attributes["cache_hit"] is False
+    assert span.ended
+
+
+def test_collect_metrics_summarizes_nested_calls():
+    backend = FakeBackend(respond=lambda messages, model: "Hola a todos")
+
+    with use_backend(backend), collect_metrics() as outer:
+        get_completion("Hello", model="gpt-4o", use_cache=False)
+        with collect_metrics() as inner:
+            get_completion("Bye", model="gpt-4o-mini", use_cache=False)
+
+    assert len(inner.records) == 1
+    summary = json.loads(outer.to_json(include_calls=True))
+    assert summary["calls"] == 2
+    assert summary["completion_tokens"] == 6
+    assert set(summary["models"]) == {"gpt-4o", "gpt-4o-mini"}
+    assert summary["stages"]["None"]["calls"] == 2
+    assert summary["wall_seconds"] >= summary["latency_p50_seconds"]
+    assert [record["model"] for record in summary["call_records"]] == [
+        "gpt-4o",
+        "gpt-4o-mini",
+    ]
+
+
+def test_translate_stream_logs_its_metrics(byte_encoding, caplog):
+    backend = FakeBackend(respond=lambda messages, model: "Hola. ")
+    collectors = []
+
+    with caplog.at_level(logging.INFO, logger="translation_agent.utils"):
+        "".join(
+            translate_stream(
+                "English",
+                "Spanish",
+                "Hello.",
+                "",
+                stream_tokens=True,
+                backend=backend,
+                on_metrics=collectors.append,
+            )
+        )
+
+    (record,) = [
+        record
+        for record in caplog.records
+        if record.msg == "Translation metrics: %s"
+    ]
+    summary = json.loads(record.args[0])
+    assert summary["calls"] == 3
+    assert set(summary["stages"]) == {"initial", "reflect", "improve"}
+    assert collectors[0].summary()["calls"] == 3
+
+
+def test_suspended_translate_stream_collects_only_its_own_calls(byte_encoding):
+    backend = FakeBackend(respond=lambda messages, model: "Hola. ")
+    collectors = []
+
+    with use_backend(backend), collect_metrics() as outer:
+        stream = translate_stream(
+            "English",
+            "Spanish",
+            "Hello world. " * 10,
+            "",
+            max_tokens=100,
+            on_metrics=collectors.append,
+        )
+        items = [next(stream)]
+        get_completion("Bye", use_cache=False)
+        items.extend(stream)
+
+    assert collectors[0].summary()["calls"] == len(backend.requests) - 1
+    assert outer.summary()["calls"] == len(backend.requests)
+
+
+def test_call_costs_use_the_router_prices(byte_encoding):
+    backend = FakeBackend(respond=lambda messages, model: "Hola")
+    router = ModelRouter(
+        initial="local",
+        reflect="local",
+        improve="gpt-4o",
+        prices={"local": (1.0, 2.0), "gpt-4o": (0.0, 0.0)},
+    )
+
+    collectors = []
+    translate(
+        "English",
+        "Spanish",
+        "Hello.",
+        "",
+        model_router=router,
+        backend=backend,
+        on_metrics=collectors.append,
+    )
+    (collector,) = collectors
+
+    initial, reflect, improve = collector.records
+    assert (
+        initial.cost_usd
+        == (initial.prompt_tokens * 1.0 + initial.completion_tokens * 2.0)
+        / 1e6
+    )
+    assert improve.cost_usd == 0.0
+    assert collector.summary()["cost_usd"] == pytest.approx(
+        sum(stage["cost_usd"] for stage in router.report().values())
+    )
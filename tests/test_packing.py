@@ -0,0 +1,93 @@
+import json
+
+from translation_agent.packing import pack_texts
+from translation_agent.packing import packed_translate_text
+from translation_agent.packing import parse_packed_completion
+from translation_agent.packing import translate_many
+
+
+def test_pack_texts_respects_token_and_item_budgets(byte_encoding):
+    texts = ["aaaa", "bbbb", "cc", "dddddddddd", "e"]
+
+    assert pack_texts(texts, max_pack_tokens=8) == [[0, 1], [2], [3], [4]]
+    assert pack_texts(texts, max_pack_tokens=100, max_pack_items=2) == [
+        [0, 1],
+        [2, 3],
+        [4],
+    ]
+
+
+def test_parse_packed_completion_keeps_only_valid_ids():
+    completion = json.dumps({"0": "uno", "1": ["dos"], "9": "nueve"})
+
+    assert parse_packed_completion(completion, ["0", "1", "2"]) == {"0": "uno"}
+    assert parse_packed_completion("not json", ["0"]) == {}
+    assert parse_packed_completion('["uno"]', ["0"]) == {}
+
+
+def test_packed_translate_text_uses_one_completion_per_stage(mocker):
+    mock_get_completion = mocker.patch(
+        "translation_agent.packing.get_completion",
+        side_effect=[
+            json.dumps({"0": "uno", "1": "dos"}),
+            json.dumps({"0": "ok", "1": "ok"}),
+            json.dumps({"0": "Uno", "1": "Dos"}),
+        ],
+    )
+
+    translations = packed_translate_text(
+        "English", "Spanish", ["one", "two"], "Mexico"
+    )
+
+    assert translations == ["Uno", "Dos"]
+    assert mock_get_completion.call_count == 3
+    assert all(
+        call.kwargs["json_mode"] for call in mock_get_completion.call_args_list
+    )
+    improvement_prompt = mock_get_completion.call_args_list[2].args[0]
+    assert '"expert_suggestions": "ok"' in improvement_prompt
+
+
+def test_packed_translate_text_falls_back_per_item(mocker):
+    mocker.patch(
+        "translation_agent.packing.get_completion",
+        side_effect=[
+            json.dumps({"0": "uno"}),
+            "not json",
+            json.dumps({"0": "Uno", "1": "Dos"}),
+        ],
+    )
+    mock_initial = mocker.patch(
+        "translation_agent.packing.one_chunk_initial_translation",
+        return_value="dos",
+    )
+    mock_reflect = mocker.patch(
+        "translation_agent.packing.one_chunk_reflect_on_translation",
+        return_value="ok",
+    )
+
+    translations = packed_translate_text("English", "Spanish", ["one", "two"])
+
+    assert translations == ["Uno", "Dos"]
+    mock_initial.assert_called_once_with("English", "Spanish", "two")
+    assert mock_reflect.call_count == 2
+
+
+def test_translate_many_sends_long_texts_to_translate(byte_encoding, mocker):
+    mock_packed = mocker.patch(
+        "translation_agent.packing.packed_translate_text",
+        side_effect=lambda source_lang, target_lang, texts, country: [
+            text.upper() for text in texts
+        ],
+    )
+    mock_translate = mocker.patch(
+        "translation_agent.packing.translate", return_value="LONG"
+    )
+
+    translations = translate_many(
+        "English", "Spanish", ["a", "long text", "b"], max_tokens=5
+    )
+
+    assert translations == ["A", "LONG", "B"]
+    mock_packed.assert_called_once_with("English", "Spanish", ["a", "b"], "")
+    assert mock_translate.call_args.args[2] == "long text"
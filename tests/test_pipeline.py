@@ -0,0 +1,59 @@
+from translation_agent.glossary import Glossary
+from translation_agent.memory import TranslationMemory
+from translation_agent.pipeline import ChunkPipeline
+from translation_agent.routing import ModelRouter
+
+
+def test_chunk_pipeline_prepares_a_new_chunk_and_stores_it(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "memory.sqlite"))
+    router = ModelRouter(initial="gpt-4o-mini")
+    deltas = []
+
+    pipeline = ChunkPipeline(
+        "English",
+        "Spanish",
+        "Open source wins.",
+        model_router=router,
+        translation_memory=memory,
+        glossary=Glossary({"open source": "código abierto"}),
+        chunk_index=2,
+    )
+
+    assert pipeline.stored is None
+    assert pipeline.references == []
+    assert pipeline.terms == [("open source", "código abierto")]
+    assert pipeline.models["initial"] == "gpt-4o-mini"
+    with pipeline.measure("initial"):
+        pass
+    assert router.report()["initial"]["calls"] == 1
+    assert (
+        pipeline.deliver(
+            pipeline.store("Gana el código abierto."), deltas.append
+        )
+        == "Gana el código abierto."
+    )
+    assert deltas == ["Gana el código abierto."]
+    assert (
+        memory.lookup("English", "Spanish", "Open source wins.")
+        == "Gana el código abierto."
+    )
+
+
+def test_chunk_pipeline_skips_preparation_of_a_stored_chunk(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "memory.sqlite"))
+    memory.add("English", "Spanish", "Hello.", "Hola.")
+
+    class FailingRouter(ModelRouter):
+        def route(self, source_lang, target_lang, source_text):
+            raise AssertionError("a stored chunk is not routed")
+
+    pipeline = ChunkPipeline(
+        "English",
+        "Spanish",
+        "Hello.",
+        model_router=FailingRouter(),
+        translation_memory=memory,
+    )
+
+    assert pipeline.stored == "Hola."
+    assert pipeline.references is None
@@ -0,0 +1,215 @@
+import asyncio
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+
+import pytest
+
+from translation_agent.ratelimit import RateLimiter
+from translation_agent.ratelimit import parse_duration
+from translation_agent.utils import get_client
+from translation_agent.utils import get_completion
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = MagicMock(headers=headers or {})
+
+
+@pytest.fixture
+def sleeps(mocker):
+    sleeps = []
+    mocker.patch(
+        "translation_agent.ratelimit.time.sleep", side_effect=sleeps.append
+    )
+    return sleeps
+
+
+def test_parse_duration():
+    assert parse_duration("20ms") == pytest.approx(0.02)
+    assert parse_duration("6m0s") == 360
+    assert parse_duration("1.5") == 1.5
+    assert parse_duration("soon") is None
+
+
+def test_call_retries_rate_limits_and_halves_concurrency(sleeps):
+    rate_limiter = RateLimiter(max_concurrency=8, initial_backoff=0.01)
+    func = MagicMock(
+        side_effect=[
+            FakeAPIError(429, {"retry-after": "2"}),
+            FakeAPIError(503),
+            "ok",
+        ]
+    )
+
+    assert rate_limiter.call(func) == "ok"
+
+    stats = rate_limiter.stats()
+    assert stats["retries"] == 2
+    assert stats["rate_limited"] == 1
+    # Halved by the rate limit, then grown back a little by the success
+    assert 4 < stats["concurrency_limit"] < 5
+    assert sleeps[1] == 2  # the server's retry-after wins over the jitter
+
+
+def test_call_does_not_retry_client_errors(sleeps):
+    rate_limiter = RateLimiter()
+    func = MagicMock(side_effect=FakeAPIError(400))
+
+    with pytest.raises(FakeAPIError):
+        rate_limiter.call(func)
+
+    assert func.call_count == 1
+    assert rate_limiter.stats()["failures"] == 1
+
+
+def test_call_gives_up_after_max_retries(sleeps):
+    rate_limiter = RateLimiter(max_retries=2, initial_backoff=0.01)
+    func = MagicMock(side_effect=FakeAPIError(500))
+
+    with pytest.raises(FakeAPIError):
+        rate_limiter.call(func)
+
+    assert func.call_count == 3
+
+
+def test_token_budget_delays_requests(sleeps):
+    rate_limiter = RateLimiter(tokens_per_minute=600)
+
+    rate_limiter.call(lambda: "first", num_tokens=600)
+    rate_limiter.call(lambda: "second", num_tokens=60)
+
+    assert sleeps[0] == 0
+    assert sleeps[1] == pytest.approx(6, abs=0.1)
+
+
+def test_usage_replaces_token_estimate(sleeps):
+    rate_limiter = RateLimiter(tokens_per_minute=600)
+    response = MagicMock()
+    response.usage.total_tokens = 100
+
+    rate_limiter.call(lambda: response, num_tokens=500)
+
+    assert rate_limiter.tokens.level == pytest.approx(500, abs=1)
+
+
+def test_budgets_are_learned_from_headers():
+    rate_limiter = RateLimiter()
+
+    rate_limiter.update_from_headers(
+        {
+            "x-ratelimit-limit-requests": "500",
+            "x-ratelimit-remaining-requests": "499",
+            "x-ratelimit-limit-tokens": "30000",
+            "x-ratelimit-remaining-tokens": "100",
+        }
+    )
+
+    assert rate_limiter.requests.per_minute == 500
+    assert rate_limiter.tokens.per_minute == 30000
+    assert rate_limiter.tokens.level == 100
+
+
+def test_get_completion_survives_a_rate_limit(mocker, sleeps):
+    client = MagicMock()
+    response = MagicMock()
+    response.choices[0].message.content = "Hola"
+    client.chat.completions.create.side_effect = [FakeAPIError(429), response]
+    mocker.patch("translation_agent.utils.client", client)
+    mocker.patch(
+        "translation_agent.ratelimit._rate_limiter",
+        RateLimiter(initial_backoff=0.01),
+    )
+
+    assert get_completion("Hello", use_cache=False) == "Hola"
+    assert client.chat.completions.create.call_count == 2
+
+
+def test_acall_retries(mocker):
+    mocker.patch("translation_agent.ratelimit.asyncio.sleep", new=AsyncMock())
+    rate_limiter = RateLimiter(initial_backoff=0.01)
+    func = AsyncMock(side_effect=[FakeAPIError(429), "ok"])
+
+    assert asyncio.run(rate_limiter.acall(func)) == "ok"
+    assert func.await_count == 2
+
+
+def test_acall_waits_for_a_released_slot():
+    rate_limiter = RateLimiter(max_concurrency=1)
+    order = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def first():
+            order.append("first")
+            await release.wait()
+            return "first"
+
+        async def second():
+            order.append("second")
+            return "second"
+
+        tasks = [
+            asyncio.ensure_future(rate_limiter.acall(first)),
+            asyncio.ensure_future(rate_limiter.acall(second)),
+        ]
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert order == ["first"]
+        # The second call waits to be woken by the release instead of polling
+        assert len(rate_limiter._async_waiters) == 1
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(main()) == ["first", "second"]
+    assert rate_limiter._async_waiters == []
+
+
+def test_default_client_leaves_retries_to_the_rate_limiter(mocker):
+    openai_client = mocker.patch("openai.OpenAI")
+    mocker.patch("translation_agent.utils.client", None)
+
+    get_client()
+
+    assert openai_client.call_args.kwargs["max_retries"] == 0
+
+
+def test_cancelled_acall_releases_its_slot():
+    rate_limiter = RateLimiter(max_concurrency=1)
+
+    async def main():
+        started = asyncio.Event()
+
+        async def request():
+            started.set()
+            await asyncio.Event().wait()
+
+        task = asyncio.ensure_future(rate_limiter.acall(request))
+        await started.wait()
+        assert rate_limiter.in_flight == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The slot is free again for the next request
+        return await asyncio.wait_for(
+            rate_limiter.acall(AsyncMock(return_value="ok")), timeout=5
+        )
+
+    assert asyncio.run(main()) == "ok"
+    assert rate_limiter.in_flight == 0
+
+
+def test_interrupted_budget_wait_releases_its_slot(mocker):
+    mocker.patch(
+        "translation_agent.ratelimit.time.sleep", side_effect=KeyboardInterrupt
+    )
+    rate_limiter = RateLimiter(requests_per_minute=1)
+    func = MagicMock()
+
+    with pytest.raises(KeyboardInterrupt):
+        rate_limiter.call(func)
+
+    func.assert_not_called()
+    assert rate_limiter.in_flight == 0
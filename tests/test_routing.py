@@ -0,0 +1,107 @@
+import asyncio
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+
+from translation_agent.async_utils import achunk_translation
+from translation_agent.backends import PromptTokensDetails
+from translation_agent.backends import Usage
+from translation_agent.routing import ModelRouter
+from translation_agent.routing import RoutingRule
+from translation_agent.routing import prompt_cache_stats
+from translation_agent.routing import record_usage
+from translation_agent.routing import reset_prompt_cache_stats
+from translation_agent.utils import one_chunk_translate_text
+
+
+def test_route_picks_first_matching_rule_per_stage(byte_encoding):
+    router = ModelRouter(
+        initial="gpt-4o",
+        rules=[
+            RoutingRule(initial="gpt-4o-mini", max_tokens=10),
+            RoutingRule(reflect="gpt-4o", target_lang="Japanese"),
+        ],
+    )
+
+    assert router.route("English", "Japanese", "Short.") == {
+        "initial": "gpt-4o-mini",
+        "reflect": "gpt-4o",
+        "improve": "gpt-4-turbo",
+    }
+    assert router.route("English", "Spanish", "A much longer text.") == {
+        "initial": "gpt-4o",
+        "reflect": "gpt-4-turbo",
+        "improve": "gpt-4-turbo",
+    }
+
+
+def test_router_reports_usage_and_cost_per_stage(mocker):
+    client = MagicMock()
+    response = client.chat.completions.create.return_value
+    response.choices[0].message.content = "Hola."
+    response.usage.prompt_tokens = 1000
+    response.usage.completion_tokens = 100
+    mocker.patch("translation_agent.utils.client", client)
+    router = ModelRouter(initial="gpt-4o-mini", reflect="gpt-4o")
+
+    assert (
+        one_chunk_translate_text(
+            "English", "Spanish", "Hello.", model_router=router
+        )
+        == "Hola."
+    )
+
+    models = [
+        call.kwargs["model"]
+        for call in client.chat.completions.create.call_args_list
+    ]
+    assert models == ["gpt-4o-mini", "gpt-4o", "gpt-4-turbo"]
+
+    report = router.report()
+    assert report["initial"]["calls"] == 1
+    assert report["initial"]["prompt_tokens"] == 1000
+    assert report["initial"]["models"] == {"gpt-4o-mini": 1}
+    assert report["initial"]["cost_usd"] == (1000 * 0.15 + 100 * 0.6) / 1e6
+    assert report["improve"]["cost_usd"] == (1000 * 10.0 + 100 * 30.0) / 1e6
+
+    router.reset_report()
+    assert router.report()["reflect"]["calls"] == 0
+
+
+def test_achunk_translation_routes_stages(mocker):
+    mock_aget_completion = mocker.patch(
+        "translation_agent.async_utils.aget_completion",
+        new=AsyncMock(return_value="Hola."),
+    )
+    router = ModelRouter(
+        rules=[RoutingRule(improve="gpt-4o", source_lang="English")]
+    )
+
+    asyncio.run(
+        achunk_translation(
+            "English", "Spanish", ["Hello. ", "Bye."], 0, model_router=router
+        )
+    )
+
+    assert [
+        call.kwargs["model"] for call in mock_aget_completion.await_args_list
+    ] == ["gpt-4-turbo", "gpt-4-turbo", "gpt-4o"]
+    assert router.report()["improve"]["models"] == {"gpt-4o": 1}
+
+
+def test_prompt_cache_stats_count_cached_prompt_tokens():
+    reset_prompt_cache_stats()
+    usage = Usage(1000, 10, 1010, PromptTokensDetails(cached_tokens=768))
+    router = ModelRouter()
+
+    with router.measure("initial", "gpt-4o"):
+        record_usage(usage)
+    record_usage(Usage(500, 10, 510))
+
+    assert prompt_cache_stats() == {
+        "requests": 2,
+        "prompt_tokens": 1500,
+        "cached_tokens": 768,
+        "cached_ratio": 768 / 1500,
+    }
+    assert router.report()["initial"]["cached_tokens"] == 768
+    reset_prompt_cache_stats()
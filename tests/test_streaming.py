@@ -0,0 +1,343 @@
+import asyncio
+import re
+import threading
+import time
+from unittest.mock import MagicMock
+
+from translation_agent import utils
+from translation_agent.async_utils import amultichunk_translation_stream
+from translation_agent.async_utils import atranslate_stream
+from translation_agent.backends import FakeBackend
+from translation_agent.backends import get_backend
+from translation_agent.backends import use_backend
+from translation_agent.cache import CompletionCache
+from translation_agent.gates import LengthRatioGate
+from translation_agent.metrics import collect_metrics
+from translation_agent.routing import ModelRouter
+from translation_agent.routing import measure_stage
+from translation_agent.utils import get_completion_stream
+from translation_agent.utils import multichunk_translation_stream
+from translation_agent.utils import translate
+from translation_agent.utils import translate_stream
+
+
+def test_multichunk_translation_stream_yields_in_document_order(mocker):
+    first_chunk_released = threading.Event()
+
+    def fake_chunk_translation(
+        source_lang,
+        target_lang,
+        chunks,
+        chunk_index,
+        country,
+        context_policy,
+        **options,
+    ):
+        if chunk_index == 0:
+            first_chunk_released.wait(5)
+        return f"T{chunk_index} "
+
+    mocker.patch(
+        "translation_agent.utils.chunk_translation",
+        side_effect=fake_chunk_translation,
+    )
+
+    stream = multichunk_translation_stream(
+        "English", "Spanish", ["a ", "b ", "c "], max_workers=3
+    )
+    # Later chunks are done first but are held back until chunk 0 is
+    time.sleep(0.05)
+    first_chunk_released.set()
+
+    assert list(stream) == ["T0 ", "T1 ", "T2 "]
+
+
+def test_multichunk_translation_stream_tokens(mocker):
+    mocker.patch(
+        "translation_agent.utils.chunk_initial_translation",
+        return_value="draft",
+    )
+    mocker.patch(
+        "translation_agent.utils.chunk_reflect_on_translation",
+        return_value="notes",
+    )
+
+    def fake_stream(prompt, system_message, model):
+        chunk = re.search(r"<TRANSLATE_THIS>(\w+)<", prompt).group(1)
+        yield from [chunk.upper(), "!"]
+
+    mocker.patch(
+        "translation_agent.utils.get_completion_stream",
+        side_effect=fake_stream,
+    )
+
+    deltas = list(
+        multichunk_translation_stream(
+            "English", "Spanish", ["ab", "cd"], stream_tokens=True
+        )
+    )
+
+    assert deltas == ["AB", "!", "CD", "!"]
+
+
+def test_multichunk_translation_stream_reraises_chunk_errors(mocker):
+    mocker.patch(
+        "translation_agent.utils.chunk_translation",
+        side_effect=[RuntimeError("boom")] * 2,
+    )
+
+    stream = multichunk_translation_stream(
+        "English", "Spanish", ["a", "b"], max_workers=1
+    )
+
+    try:
+        next(stream)
+    except RuntimeError as error:
+        assert str(error) == "boom"
+    else:
+        raise AssertionError("expected the chunk error")
+
+
+def test_get_completion_stream_fills_cache(mocker):
+    def event(content):
+        return MagicMock(choices=[MagicMock(delta=MagicMock(content=content))])
+
+    fake_client = MagicMock()
+    fake_client.chat.completions.create.return_value = iter(
+        [event("Ho"), event(None), event("la")]
+    )
+    mocker.patch("translation_agent.utils.client", fake_client)
+    mocker.patch(
+        "translation_agent.utils._completion_cache", CompletionCache()
+    )
+
+    assert list(get_completion_stream("Hello")) == ["Ho", "la"]
+    assert list(get_completion_stream("Hello")) == ["Hola"]
+    assert fake_client.chat.completions.create.call_count == 1
+    assert utils.get_completion_cache().stats()["hits"] == 1
+
+
+def test_get_completion_stream_records_the_usage_of_the_last_chunk(mocker):
+    def event(content):
+        return MagicMock(
+            choices=[MagicMock(delta=MagicMock(content=content))], usage=None
+        )
+
+    usage = MagicMock(prompt_tokens=12, completion_tokens=2, total_tokens=14)
+    fake_client = MagicMock()
+    fake_client.chat.completions.create.return_value = iter(
+        [event("Ho"), event("la"), MagicMock(choices=[], usage=usage)]
+    )
+    mocker.patch("translation_agent.utils.client", fake_client)
+    router = ModelRouter()
+
+    with (
+        collect_metrics() as collector,
+        measure_stage(router, "improve", "gpt-4o"),
+    ):
+        assert list(
+            get_completion_stream("Hello", model="gpt-4o", use_cache=False)
+        ) == ["Ho", "la"]
+
+    _, options = fake_client.chat.completions.create.call_args
+    assert options["stream_options"] == {"include_usage": True}
+    (record,) = collector.records
+    assert (record.prompt_tokens, record.completion_tokens) == (12, 2)
+    assert record.cost_usd > 0
+    assert router.report()["improve"]["completion_tokens"] == 2
+
+
+def test_amultichunk_translation_stream_yields_in_document_order(mocker):
+    async def fake_achunk_translation(
+        source_lang,
+        target_lang,
+        chunks,
+        chunk_index,
+        country,
+        context_policy,
+        **options,
+    ):
+        await asyncio.sleep(0.03 if chunk_index == 0 else 0)
+        return f"T{chunk_index} "
+
+    mocker.patch(
+        "translation_agent.async_utils.achunk_translation",
+        side_effect=fake_achunk_translation,
+    )
+
+    async def collect():
+        return [
+            item
+            async for item in amultichunk_translation_stream(
+                "English", "Spanish", ["a ", "b ", "c "]
+            )
+        ]
+
+    assert asyncio.run(collect()) == ["T0 ", "T1 ", "T2 "]
+
+
+def test_translate_stream_tokens_matches_translate(byte_encoding):
+    backend = FakeBackend(
+        respond=lambda messages, model: "Hola, mundo. Adiós."
+    )
+    long_text = "Hello world. " * 10
+
+    async def collect(source_text):
+        return [
+            delta
+            async for delta in atranslate_stream(
+                "English", "Spanish", source_text, "", 100, stream_tokens=True
+            )
+        ]
+
+    with use_backend(backend):
+        for source_text in ["Hello world.", long_text]:
+            expected = translate(
+                "English", "Spanish", source_text, "", max_tokens=100
+            )
+            deltas = list(
+                translate_stream(
+                    "English",
+                    "Spanish",
+                    source_text,
+                    "",
+                    max_tokens=100,
+                    stream_tokens=True,
+                )
+            )
+            # The improvement stage is yielded as it streams, not per chunk
+            assert len(deltas) > expected.count("Adiós")
+            assert "".join(deltas) == expected
+            assert "".join(asyncio.run(collect(source_text))) == expected
+
+
+def test_translate_stream_skips_stages_the_gate_passes(byte_encoding):
+    backend = FakeBackend(respond=lambda messages, model: "Hola, mundo.")
+
+    with use_backend(backend):
+        deltas = list(
+            translate_stream(
+                "English",
+                "Spanish",
+                "Hello, world.",
+                "",
+                stream_tokens=True,
+                quality_gate=LengthRatioGate(),
+            )
+        )
+
+    # A translation that passes is yielded whole, without reflect and improve requests
+    assert deltas == ["Hola, mundo."]
+    assert len(backend.requests) == 1
+
+
+def test_translate_stream_routes_stages(byte_encoding):
+    backend = FakeBackend(respond=lambda messages, model: "Hola.")
+    router = ModelRouter(initial="gpt-4o-mini", improve="gpt-4o")
+
+    async def collect():
+        return [
+            delta
+            async for delta in atranslate_stream(
+                "English",
+                "Spanish",
+                "Hello.",
+                "",
+                stream_tokens=True,
+                model_router=router,
+            )
+        ]
+
+    with use_backend(backend):
+        assert "".join(asyncio.run(collect())) == "Hola."
+
+    assert [request["model"] for request in backend.requests] == [
+        "gpt-4o-mini",
+        "gpt-4-turbo",
+        "gpt-4o",
+    ]
+    assert router.report()["improve"]["models"] == {"gpt-4o": 1}
+
+
+def test_translate_stream_uses_the_given_backend(byte_encoding):
+    backend = FakeBackend(respond=lambda messages, model: "Hola. ")
+
+    translation = "".join(
+        translate_stream(
+            "English",
+            "Spanish",
+            "Hello world. " * 10,
+            "",
+            max_tokens=100,
+            backend=backend,
+        )
+    )
+
+    num_chunks = len(translation) // len("Hola. ")
+    assert num_chunks > 1
+    assert len(backend.requests) == 3 * num_chunks
+
+
+def test_suspended_translate_streams_keep_their_backends_to_themselves(
+    byte_encoding,
+):
+    caller_backend = FakeBackend()
+    first_backend = FakeBackend(respond=lambda messages, model: "Uno. ")
+    second_backend = FakeBackend(respond=lambda messages, model: "Dos. ")
+
+    with use_backend(caller_backend):
+        first = translate_stream(
+            "English",
+            "Spanish",
+            "Hello world. " * 10,
+            "",
+            max_tokens=100,
+            backend=first_backend,
+        )
+        second = translate_stream(
+            "English",
+            "Spanish",
+            "Hello world. " * 10,
+            "",
+            max_tokens=100,
+            backend=second_backend,
+        )
+        first_items = [next(first)]
+        assert get_backend() is caller_backend
+        second_items = [next(second)]
+        assert get_backend() is caller_backend
+        first_items.extend(first)
+        second_items.extend(second)
+        assert get_backend() is caller_backend
+
+    assert set(first_items) == {"Uno. "}
+    assert set(second_items) == {"Dos. "}
+    assert not caller_backend.requests
+
+
+def test_suspended_atranslate_stream_keeps_its_backend_to_itself(
+    byte_encoding,
+):
+    caller_backend = FakeBackend()
+    stream_backend = FakeBackend(respond=lambda messages, model: "Hola. ")
+
+    async def main():
+        stream = atranslate_stream(
+            "English",
+            "Spanish",
+            "Hello world. " * 10,
+            "",
+            max_tokens=100,
+            backend=stream_backend,
+        )
+        items = [await stream.__anext__()]
+        assert get_backend() is caller_backend
+        items.extend([item async for item in stream])
+        return items
+
+    with use_backend(caller_backend):
+        items = asyncio.run(main())
+        assert get_backend() is caller_backend
+
+    assert set(items) == {"Hola. "}
+    assert not caller_backend.requests
@@ -0,0 +1,103 @@
+import json
+import re
+
+import pysrt
+
+from translation_agent.backends import FakeBackend
+from translation_agent.backends import use_backend
+from translation_agent.subtitles import pack_cues
+from translation_agent.subtitles import translate_srt_file
+from translation_agent.subtitles import translate_subtitles
+
+
+SRT = """1
+00:00:01,000 --> 00:00:02,500
+Hello.
+
+2
+00:00:03,000 --> 00:00:04,000
+<i>Where are you going?</i>
+
+3
+00:00:04,200 --> 00:00:06,000
+Home,
+it is late.
+"""
+
+
+def respond_by_id(messages, model):
+    # Answer every cue id of the packed JSON object with a marked copy of the cue
+    items = json.loads(
+        re.search(r"^\{.*?^\}", messages[-1]["content"], re.M | re.S).group()
+    )
+    return json.dumps(
+        {
+            cue_id: "ES "
+            + (item if isinstance(item, str) else item["source_text"])
+            for cue_id, item in items.items()
+        }
+    )
+
+
+def test_pack_cues_reads_lazily(byte_encoding):
+    read = []
+
+    def cues():
+        for i in range(5):
+            read.append(i)
+            yield pysrt.SubRipItem(index=i + 1, text="abcd")
+
+    packs = pack_cues(cues(), max_pack_tokens=8)
+
+    assert [cue.index for cue in next(packs)] == [1, 2]
+    assert read == [0, 1, 2]
+    assert [[cue.index for cue in pack] for pack in packs] == [[3, 4], [5]]
+
+
+def test_translate_subtitles_keeps_timing(byte_encoding):
+    backend = FakeBackend(respond=respond_by_id)
+
+    with use_backend(backend):
+        cues = list(
+            translate_subtitles(
+                "English",
+                "Spanish",
+                pysrt.from_string(SRT),
+                max_pack_items=2,
+                max_workers=2,
+            )
+        )
+
+    assert [cue.index for cue in cues] == [1, 2, 3]
+    assert [cue.text for cue in cues] == [
+        "ES Hello.",
+        "ES <i>Where are you going?</i>",
+        "ES Home,\nit is late.",
+    ]
+    assert str(cues[2].start) == "00:00:04,200"
+    assert str(cues[2].end) == "00:00:06,000"
+    # Two packs, three stages each
+    assert len(backend.requests) == 6
+    # The second pack shows the last cue of the first one as context
+    assert any(
+        "For context only" in prompt and "Where are you going?" in prompt
+        for prompt in (
+            request["messages"][-1]["content"] for request in backend.requests
+        )
+    )
+
+
+def test_translate_srt_file(tmp_path, byte_encoding):
+    input_path = tmp_path / "film.en.srt"
+    output_path = tmp_path / "film.es.srt"
+    input_path.write_text(SRT, encoding="utf-8")
+
+    with use_backend(FakeBackend(respond=respond_by_id)):
+        num_cues = translate_srt_file(
+            "English", "Spanish", str(input_path), str(output_path)
+        )
+
+    assert num_cues == 3
+    translated = pysrt.open(str(output_path))
+    assert [cue.text for cue in translated][0] == "ES Hello."
+    assert str(translated[1].start) == "00:00:03,000"
@@ -0,0 +1,23 @@
+from translation_agent.tokenizer import TokenizedText
+from translation_agent.tokenizer import count_tokens
+
+
+def test_get_encoding_is_memoized(byte_encoding):
+    assert count_tokens("abc") == 3
+    assert count_tokens("de") == 2
+
+    byte_encoding.assert_called_once_with("cl100k_base")
+
+
+def test_tokenized_text_counts_spans_from_one_encoding(byte_encoding):
+    tokenized_text = TokenizedText("héllo world")
+
+    assert len(tokenized_text) == 12
+    assert tokenized_text.count_tokens(0, 5) == 6
+    assert tokenized_text.chunk_token_counts(["héllo", " world"]) == [6, 6]
+
+
+def test_chunk_token_counts_falls_back_for_unknown_chunks(byte_encoding):
+    tokenized_text = TokenizedText("abc def")
+
+    assert tokenized_text.chunk_token_counts(["abc", "xyz!"]) == [3, 4]